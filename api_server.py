@@ -1,35 +1,82 @@
 from __future__ import annotations
 
 import asyncio
+import gzip
+import hashlib
 import json
+import logging
+import os
+import re
 import shutil
 import sys
 import tempfile
+import uuid
 from pathlib import Path
-from typing import Dict, List, Optional
-
-import pandas as pd
+from typing import TYPE_CHECKING, Dict, List, Optional, Set
 
 ROOT = Path(__file__).parent.resolve()
 SRC = ROOT / "src"
 if str(SRC) not in sys.path:
     sys.path.insert(0, str(SRC))
 
-from fastapi import FastAPI, File, HTTPException, UploadFile
+from fastapi import FastAPI, File, HTTPException, Query, Request, UploadFile
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
-
-from ip_summary.config import Settings, load_settings
-from ip_summary.pipeline import aggregate_to_outputs, load_headers, process_contracts
+from pydantic import BaseModel
+
+from ip_summary.config import Settings, get_settings
+from ip_summary.config_registry import registry
+from ip_summary.contract_types import get_contract_types
+from ip_summary.document_loader import PARSE_CACHE_DIR, load_document
+from ip_summary.pipeline import (
+    NOTE_TEMPLATES_PATH,
+    aggregate_to_outputs,
+    load_headers,
+    prompt_version_inventory,
+    select_headers,
+)
 from ip_summary.storage import (
     load_intermediate_folder,
     aggregate_results,
     aggregate_results_for_database,
+    result_key,
     write_database_outputs,
+    write_json_atomic,
 )
-from ip_summary.field_converter import FieldConverter
+from ip_summary.exports import FinalManifest, build_archive, frame_rows, render, write_xlsx
+from ip_summary.field_converter import get_field_converter
+from ip_summary.llm_client import single_flight_stats
+from ip_summary.models import HeaderDefinition
+from ip_summary.job_queue import JobActive, JobQueue
+from ip_summary.result_edits import apply_field_patches, sheet_patches
+from ip_summary.results_index import ResultsIndex, search_indexes
+from ip_summary.run_control import RunControl
+from ip_summary.task_runner import execute_task_job, settings_for_task
 from ip_summary.tasks import Task, TaskManager
+from ip_summary.tracing import TRACE_FILE, contract_spans, list_runs, read_spans, summarize
+from ip_summary.uploads import UploadRejected, extract_archive, safe_filename, stream_to_file
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+
+class ResultUpdate(BaseModel):
+    filename: str
+    fields: Dict[str, object]
+
+
+class BulkUpdateRequest(BaseModel):
+    updates: List[ResultUpdate]
+
+
+class ReextractRequest(BaseModel):
+    filenames: List[str]
+    headers: List[str]
+    include_reviewed: bool = False
+
 
 DEFAULT_CONFIG_PATH = Path("config/deepseek_config.yaml")
 UPSTREAM_HEADERS_PATH = Path("表头字段/版权授权链-上游类-表头信息.xlsx")
@@ -46,19 +93,88 @@ app.add_middleware(
 )
 
 task_manager = TaskManager(TASK_ROOT)
-headers_def = load_headers(UPSTREAM_HEADERS_PATH, DOWNSTREAM_HEADERS_PATH)
+# With IP_SUMMARY_WORKER_QUEUE=1 runs are queued for `main.py worker` processes
+# instead of executing inside this server's event loop.
+USE_WORKER_QUEUE = os.getenv("IP_SUMMARY_WORKER_QUEUE", "") == "1"
+job_queue = JobQueue(TASK_ROOT / "jobs.sqlite3")
+# Seconds between job-status checks of an event stream while a worker runs the job.
+EVENTS_JOB_POLL_SECONDS = 2.0
+# Per-file upload limit (zip archives count their compressed size).
+MAX_UPLOAD_BYTES = int(os.getenv("IP_SUMMARY_MAX_UPLOAD_MB", "200")) * 1024 * 1024
+
+
+def _headers() -> HeaderDefinition:
+    # Parsed on first use and re-parsed only when a workbook changes.
+    return load_headers(UPSTREAM_HEADERS_PATH, DOWNSTREAM_HEADERS_PATH)
+
+
+# Controls of runs executing inside this server (in-process mode).
+_run_controls: Dict[str, RunControl] = {}
+# Fire-and-forget tasks (pre-parsing uploads) kept referenced until done.
+_background_tasks: Set[asyncio.Task] = set()
+# Live progress subscribers per task (one queue per open event stream).
+_event_subscribers: Dict[str, List[asyncio.Queue]] = {}
+
+
+def _publish_event(task_id: str, event: Dict[str, object]) -> None:
+    for queue in _event_subscribers.get(task_id, []):
+        queue.put_nowait(event)
+
+
+def _has_active_job(task_id: str) -> bool:
+    """Whether a run of the task is executing here or queued / running on a worker."""
+    if task_id in _run_controls:
+        return True
+    return USE_WORKER_QUEUE and job_queue.active_job(task_id) is not None
+
+
+def _ensure_idle(task_id: str) -> None:
+    """Reject result edits while a run may rewrite the same result files."""
+    if _has_active_job(task_id):
+        raise HTTPException(status_code=409, detail="Task is running; edit results after it finishes")
 
 
 def _load_settings_for_task(task: Task) -> Settings:
-    settings = load_settings(DEFAULT_CONFIG_PATH)
-    pipeline = settings.pipeline.model_copy(
-        update={
-            "input_dir": task.input_dir,
-            "intermediate_dir": task.intermediate_dir,
-            "final_dir": task.final_dir,
-        }
-    )
-    return Settings(llm=settings.llm, pipeline=pipeline)
+    return settings_for_task(DEFAULT_CONFIG_PATH, task)
+
+
+def _start_job(task_id: str, kind: str, params: Dict[str, object]) -> Dict[str, str]:
+    """Queue the job for a worker, or run it in this event loop when no workers are used."""
+    if USE_WORKER_QUEUE:
+        try:
+            job = job_queue.enqueue(task_id, kind, params)
+        except JobActive:
+            raise HTTPException(status_code=409, detail="Task is already running")
+        task_manager.update_status(task_id, "queued", "排队等待处理")
+        return {"status": "accepted", "message": "已加入处理队列", "job_id": job.id}
+
+    if task_id in _run_controls:
+        raise HTTPException(status_code=409, detail="Task is already running")
+    control = RunControl()
+    _run_controls[task_id] = control
+
+    async def _job():
+        try:
+            await execute_task_job(
+                task_manager,
+                task_id,
+                kind,
+                params,
+                DEFAULT_CONFIG_PATH,
+                UPSTREAM_HEADERS_PATH,
+                DOWNSTREAM_HEADERS_PATH,
+                on_event=lambda event: _publish_event(task_id, event),
+                control=control,
+            )
+            status = "cancelled" if control.cancelled else "completed"
+            _publish_event(task_id, {"event": "finished", "status": status})
+        except Exception as exc:
+            _publish_event(task_id, {"event": "finished", "status": "failed", "message": str(exc)})
+        finally:
+            _run_controls.pop(task_id, None)
+
+    asyncio.create_task(_job())
+    return {"status": "accepted", "message": "已进入后台处理"}
 
 
 @app.get("/health")
@@ -66,6 +182,31 @@ def health():
     return {"status": "ok"}
 
 
+@app.get("/llm/stats")
+def llm_stats():
+    """LLM request counters; ``coalesced`` requests shared another identical in-flight call."""
+    return single_flight_stats()
+
+
+@app.post("/config/reload")
+def reload_config():
+    """
+    Drop the parsed settings, header workbooks, note templates and value mappings
+    and parse them again (they are otherwise re-read only when a file's content
+    changes). A file that fails to parse is reported and retried on next use.
+    """
+    registry.reload()
+    try:
+        get_settings(DEFAULT_CONFIG_PATH)
+        _headers()
+        if NOTE_TEMPLATES_PATH.exists():
+            get_contract_types(NOTE_TEMPLATES_PATH)
+        get_field_converter()
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Failed to reload configuration: {e}")
+    return {"status": "ok", "entries": registry.entries()}
+
+
 @app.post("/tasks", response_model=Task)
 def create_task(name: str, my_party: str):
     return task_manager.create_task(name=name, my_party=my_party)
@@ -84,21 +225,79 @@ def get_task(task_id: str):
         raise HTTPException(status_code=404, detail="Task not found")
 
 
+def _parse_in_background(path: Path, cache_dir: Path) -> None:
+    """Parse PDF/DOCX into the task's parse cache while the rest of the upload arrives."""
+    if path.suffix.lower() not in {".pdf", ".docx"}:
+        return
+
+    async def _parse():
+        try:
+            await asyncio.to_thread(load_document, path, cache_dir)
+        except Exception as exc:
+            # The pipeline parses the file again and reports the error there.
+            logger.warning("Pre-parse failed for %s: %s", path.name, exc)
+
+    task = asyncio.create_task(_parse())
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+
 @app.post("/tasks/{task_id}/upload")
 async def upload_files(task_id: str, files: List[UploadFile] = File(...)):
+    """
+    Save uploads to the task's input folder in chunks, hashing on the fly.
+
+    ``.zip`` archives are extracted (in a thread) with their folder structure;
+    unsupported entries are listed under ``skipped``. Files over the size limit or
+    unsafe archives are listed under ``rejected`` without failing the others.
+    """
     try:
         task = task_manager.get_task(task_id)
     except KeyError:
         raise HTTPException(status_code=404, detail="Task not found")
 
+    input_dir = Path(task.input_dir)
+    cache_dir = Path(task.intermediate_dir) / PARSE_CACHE_DIR
     saved: List[str] = []
+    details: List[Dict[str, object]] = []
+    skipped: List[str] = []
+    rejected: List[Dict[str, str]] = []
     for f in files:
-        dest = Path(task.input_dir) / f.filename
-        with dest.open("wb") as out:
-            content = await f.read()
-            out.write(content)
-        saved.append(f.filename)
-    return {"saved": saved, "input_dir": str(task.input_dir)}
+        try:
+            name = safe_filename(f.filename)
+            if name.lower().endswith(".zip"):
+                archive = input_dir.parent / "_uploads" / f"{uuid.uuid4().hex}.zip"
+                await stream_to_file(f, archive, MAX_UPLOAD_BYTES, display_name=name)
+                try:
+                    paths, skipped_entries = await asyncio.to_thread(
+                        extract_archive, archive, input_dir, display_name=name
+                    )
+                finally:
+                    archive.unlink(missing_ok=True)
+                root = input_dir.resolve()
+                for path in paths:
+                    relative = path.relative_to(root).as_posix()
+                    saved.append(relative)
+                    details.append({"name": relative, "size": path.stat().st_size, "archive": name})
+                    _parse_in_background(path, cache_dir)
+                skipped.extend(f"{name}/{entry}" for entry in skipped_entries)
+            else:
+                dest = input_dir / name
+                size, digest = await stream_to_file(f, dest, MAX_UPLOAD_BYTES)
+                saved.append(name)
+                details.append({"name": name, "size": size, "sha256": digest})
+                _parse_in_background(dest, cache_dir)
+        except UploadRejected as exc:
+            rejected.append({"name": f.filename or "", "reason": str(exc)})
+        finally:
+            await f.close()
+    return {
+        "saved": saved,
+        "files": details,
+        "skipped": skipped,
+        "rejected": rejected,
+        "input_dir": str(task.input_dir),
+    }
 
 
 @app.get("/tasks/{task_id}/files")
@@ -114,10 +313,11 @@ def list_uploaded_files(task_id: str):
         return {"files": [], "count": 0}
 
     files = []
-    for f in sorted(input_dir.iterdir()):
-        if f.is_file():
+    # Recursive: extracted archives keep their folder structure.
+    for f in sorted(input_dir.rglob("*")):
+        if f.is_file() and not f.name.startswith("."):
             files.append({
-                "name": f.name,
+                "name": f.relative_to(input_dir).as_posix(),
                 "size": f.stat().st_size,
                 "modified": f.stat().st_mtime,
             })
@@ -136,55 +336,383 @@ async def run_task(
     except KeyError:
         raise HTTPException(status_code=404, detail="Task not found")
 
-    task_manager.update_status(task_id, "running", "LLM处理中")
-    settings = _load_settings_for_task(task)
-    pipeline = settings.pipeline.model_copy(update={"concurrent_requests": concurrency})
-    settings = Settings(llm=settings.llm, pipeline=pipeline)
+    params = {
+        "my_party": my_party or task.my_party,
+        "concurrency": concurrency,
+        "force_direction": force_direction,
+    }
+    return _start_job(task_id, "run", params)
 
-    async def _job():
+
+@app.get("/tasks/{task_id}/events")
+async def stream_events(task_id: str):
+    """
+    Server-sent events for a running task: classified/extracted/note/completed per
+    contract, then ``finished``. Per-contract events only exist for runs executing
+    in this process; for worker jobs (and runs that already ended) the stream sends
+    ``finished`` once the task has no active job.
+    """
+    try:
+        task_manager.get_task(task_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Task not found")
+    queue: asyncio.Queue = asyncio.Queue()
+    _event_subscribers.setdefault(task_id, []).append(queue)
+    # Worker jobs are only visible through the queue, so check it more often.
+    idle_timeout = EVENTS_JOB_POLL_SECONDS if USE_WORKER_QUEUE else 15
+
+    async def _stream():
         try:
-            results = await process_contracts(
-                settings=settings,
-                my_party=my_party or task.my_party,
-                upstream_header_path=UPSTREAM_HEADERS_PATH,
-                downstream_header_path=DOWNSTREAM_HEADERS_PATH,
-                force_direction=force_direction if force_direction in {"upstream", "downstream"} else None,
-            )
-            summary = {"upstream": 0, "downstream": 0}
-            for r in results:
-                summary[r.direction] += 1
-            task_manager.update_summary(task_id, summary)
-            task_manager.update_status(task_id, "completed", f"处理完成 {len(results)} 份合同")
-        except Exception as exc:
-            task_manager.update_status(task_id, "failed", str(exc))
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=idle_timeout)
+                except asyncio.TimeoutError:
+                    if not await asyncio.to_thread(_has_active_job, task_id):
+                        task = task_manager.get_task(task_id)
+                        event = {"event": "finished", "status": task.status, "message": task.message}
+                    else:
+                        # Comment line keeps proxies from closing an idle connection.
+                        yield ": keep-alive\n\n"
+                        continue
+                yield f"event: {event['event']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+                if event["event"] == "finished":
+                    break
+        finally:
+            _event_subscribers[task_id].remove(queue)
+            if not _event_subscribers[task_id]:
+                del _event_subscribers[task_id]
+
+    return StreamingResponse(
+        _stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
-    asyncio.create_task(_job())
-    return {"status": "accepted", "message": "已进入后台处理"}
+
+@app.get("/tasks/{task_id}/versions")
+def get_prompt_versions(task_id: str):
+    """Per-prompt-version inventory of the task's results, with stale stages."""
+    try:
+        task = task_manager.get_task(task_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Task not found")
+    return prompt_version_inventory(Path(task.intermediate_dir), _headers())
+
+
+@app.post("/tasks/{task_id}/reprocess")
+async def reprocess_task(task_id: str, concurrency: int = 3):
+    """Re-run only the stages made stale by a prompt or header change."""
+    try:
+        task_manager.get_task(task_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Task not found")
+    return _start_job(task_id, "reprocess", {"concurrency": concurrency})
+
+
+def _control_task(task_id: str, action: str):
+    try:
+        task_manager.get_task(task_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Task not found")
+
+    if USE_WORKER_QUEUE:
+        jobs = job_queue.request_control(task_id, action)
+        if not jobs:
+            raise HTTPException(status_code=409, detail="Task has no queued or running job")
+        if all(job.status == "cancelled" for job in jobs):
+            task_manager.update_status(task_id, "cancelled", "已取消")
+        return {"status": "ok", "message": f"{action} requested", "jobs": [job.id for job in jobs]}
+
+    control = _run_controls.get(task_id)
+    if control is None:
+        raise HTTPException(status_code=409, detail="Task is not running")
+    if action == "pause":
+        control.pause()
+        task_manager.update_status(task_id, "paused", "已暂停")
+    elif action == "resume":
+        control.resume()
+        task_manager.update_status(task_id, "running", "继续处理中")
+    else:
+        control.cancel()
+    return {"status": "ok", "state": control.state}
+
+
+@app.post("/tasks/{task_id}/cancel")
+def cancel_task(task_id: str):
+    """Cancel a running task; finished results are kept and LLM slots are released at once."""
+    return _control_task(task_id, "cancel")
+
+
+@app.post("/tasks/{task_id}/pause")
+def pause_task(task_id: str):
+    """Stop sending new LLM calls for the task until it is resumed."""
+    return _control_task(task_id, "pause")
+
+
+@app.post("/tasks/{task_id}/resume")
+def resume_task(task_id: str):
+    return _control_task(task_id, "resume")
+
+
+@app.get("/tasks/{task_id}/jobs")
+def list_task_jobs(task_id: str):
+    """Queued/running/finished worker jobs for a task (worker queue mode)."""
+    try:
+        task_manager.get_task(task_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Task not found")
+    return {"items": [job.model_dump() for job in job_queue.list_jobs(task_id)]}
+
+
+def _results_index(task: Task) -> ResultsIndex:
+    return ResultsIndex(Path(task.intermediate_dir))
+
+
+def _json_response(request: Request, payload: object, etag: str) -> Response:
+    """JSON with a weak ETag (304 on If-None-Match) and gzip when the client accepts it."""
+    headers = {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+    if len(body) > 1024 and "gzip" in request.headers.get("accept-encoding", ""):
+        body = gzip.compress(body, compresslevel=5)
+        headers["Content-Encoding"] = "gzip"
+    return Response(content=body, media_type="application/json", headers=headers)
 
 
 @app.get("/tasks/{task_id}/results")
-def get_results(task_id: str, direction: str):
+def get_results(
+    request: Request,
+    task_id: str,
+    direction: str,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+    max_confidence: Optional[float] = None,
+    empty_field: Optional[str] = None,
+    contract_type: Optional[str] = None,
+    cluster_id: Optional[str] = None,
+    completed: Optional[bool] = None,
+    fields: Optional[str] = None,
+):
+    """
+    Results of one direction from the task's results index.
+
+    Without ``limit`` every matching result is returned; with it, pass the returned
+    ``next_cursor`` to get the next page. ``fields`` is a comma-separated list of
+    headers to include (default: all).
+    """
     if direction not in {"upstream", "downstream"}:
         raise HTTPException(status_code=400, detail="direction must be upstream or downstream")
+    if limit is not None and not 1 <= limit <= 1000:
+        raise HTTPException(status_code=400, detail="limit must be between 1 and 1000")
     try:
         task = task_manager.get_task(task_id)
     except KeyError:
         raise HTTPException(status_code=404, detail="Task not found")
 
-    folder = Path(task.intermediate_dir) / direction
-    results = load_intermediate_folder(folder, direction=direction) if folder.exists() else []
-    # Only expose fields & metadata needed for editing.
-    payload = []
-    for r in results:
-        payload.append(
-            {
-                "contract_path": str(r.contract_path),
-                "direction": r.direction,
-                "fields": r.fields,
-                "classification": r.classification.model_dump(),
-            }
+    index = _results_index(task)
+    index.refresh(direction)
+    query_key = json.dumps(sorted(request.query_params.multi_items()), ensure_ascii=False)
+    etag = 'W/"{}-{}"'.format(
+        index.generation(), hashlib.sha1(query_key.encode("utf-8")).hexdigest()[:16]
+    )
+    if request.headers.get("if-none-match") == etag:
+        return _json_response(request, None, etag)
+    try:
+        items, total, next_cursor = index.query(
+            direction,
+            cursor=cursor,
+            limit=limit,
+            max_confidence=max_confidence,
+            empty_field=empty_field,
+            contract_type=contract_type,
+            cluster_id=cluster_id,
+            completed=completed,
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    if fields:
+        selected = [h for h in fields.split(",") if h]
+        for item in items:
+            item["fields"] = {h: item["fields"].get(h) for h in selected}
+    payload = {"count": total, "items": items, "next_cursor": next_cursor}
+    return _json_response(request, payload, etag)
+
+
+_DATE_BOUND = re.compile(r"^\d{4}(-\d{2}(-\d{2})?)?$")
+
+
+@app.get("/search")
+def search_results(
+    q: Optional[str] = None,
+    task_id: Optional[str] = None,
+    direction: Optional[str] = None,
+    field: Optional[List[str]] = Query(default=None),
+    date_field: Optional[str] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = 50,
+):
+    """
+    Search the results of every task (or only ``task_id``), newest task first.
+
+    ``q`` terms must all appear in the contract path, a field value or the
+    contract text; each ``field`` is ``header=substring``; ``date_from``/``date_to``
+    (``YYYY``, ``YYYY-MM`` or ``YYYY-MM-DD``, inclusive) filter on dates found in
+    ``date_field`` (any header when omitted). Pass ``next_cursor`` for the next page.
+    """
+    if direction is not None and direction not in {"upstream", "downstream"}:
+        raise HTTPException(status_code=400, detail="direction must be upstream or downstream")
+    if not 1 <= limit <= 1000:
+        raise HTTPException(status_code=400, detail="limit must be between 1 and 1000")
+    for bound in (date_from, date_to):
+        if bound is not None and not _DATE_BOUND.match(bound):
+            raise HTTPException(status_code=400, detail="dates must be YYYY, YYYY-MM or YYYY-MM-DD")
+    fields: Dict[str, str] = {}
+    for spec in field or []:
+        header, sep, value = spec.partition("=")
+        if not sep or not header:
+            raise HTTPException(status_code=400, detail="field must be header=value")
+        fields[header] = value
+    if task_id is not None:
+        try:
+            tasks = [task_manager.get_task(task_id)]
+        except KeyError:
+            raise HTTPException(status_code=404, detail="Task not found")
+    else:
+        tasks = sorted(task_manager.list_tasks(), key=lambda t: (t.created_at, t.id), reverse=True)
+    names = {task.id: task.name for task in tasks}
+    try:
+        items, total, next_cursor = search_indexes(
+            [(task.id, _results_index(task)) for task in tasks],
+            cursor=cursor,
+            limit=limit,
+            text=q,
+            direction=direction,
+            fields=fields,
+            date_field=date_field,
+            date_from=date_from,
+            date_to=date_to,
         )
-    return {"count": len(payload), "items": payload}
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    for item in items:
+        item["task_id"] = item.pop("source")
+        item["task_name"] = names.get(item["task_id"])
+    return {"count": total, "items": items, "next_cursor": next_cursor}
+
+
+def _trace_file(task_id: str) -> Path:
+    try:
+        task = task_manager.get_task(task_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Task not found")
+    return Path(task.intermediate_dir) / TRACE_FILE
+
+
+def _trace_spans(task_id: str, run_id: Optional[str]) -> tuple[List[Dict], List[Dict]]:
+    """Recorded runs and the spans of ``run_id`` (default: the latest run)."""
+    spans = read_spans(_trace_file(task_id), "*")
+    runs = list_runs(spans)
+    if run_id is None:
+        run_id = runs[-1]["run_id"] if runs else None
+    elif run_id not in {run["run_id"] for run in runs}:
+        raise HTTPException(status_code=404, detail="Run not found")
+    return runs, [s for s in spans if s["run_id"] == run_id]
+
+
+@app.get("/tasks/{task_id}/traces")
+def get_traces(task_id: str, run_id: Optional[str] = None, top: int = 10):
+    """
+    Where a run's time went (latest run by default): per-stage count / total /
+    mean / p95 / max milliseconds and the ``top`` slowest contracts with their
+    time per stage, plus the list of recorded runs.
+    """
+    runs, spans = _trace_spans(task_id, run_id)
+    return {"runs": runs, **summarize(spans, top)}
+
+
+@app.get("/tasks/{task_id}/traces/spans")
+def get_trace_spans(
+    task_id: str, run_id: Optional[str] = None, contract: Optional[str] = None, name: Optional[str] = None
+):
+    """
+    Spans of a run, optionally only those of contracts whose path contains
+    ``contract`` and / or with the given span ``name``.
+    """
+    _, spans = _trace_spans(task_id, run_id)
+    if contract:
+        spans = contract_spans(spans, contract)
+    if name:
+        spans = [s for s in spans if s["name"] == name]
+    return {"count": len(spans), "items": spans}
+
+
+@app.get("/tasks/{task_id}/traces/otlp")
+def download_traces(task_id: str):
+    """The task's trace file as OTLP/JSON lines, for OpenTelemetry tooling."""
+    path = _trace_file(task_id)
+    if not path.exists():
+        raise HTTPException(status_code=404, detail="no traces recorded for this task")
+    return FileResponse(path=path, filename=f"{task_id}_traces.jsonl", media_type="application/x-ndjson")
+
+
+def _cluster_members(task: Task) -> Dict[str, List[Dict[str, str]]]:
+    clusters: Dict[str, List[Dict[str, str]]] = {}
+    for direction in ("upstream", "downstream"):
+        folder = Path(task.intermediate_dir) / direction
+        if not folder.exists():
+            continue
+        for path in sorted(folder.glob("*.json")):
+            payload = json.loads(path.read_text(encoding="utf-8"))
+            cluster_id = payload.get("cluster_id")
+            if not cluster_id:
+                continue
+            clusters.setdefault(cluster_id, []).append(
+                {
+                    "direction": direction,
+                    "filename": path.name,
+                    "contract_path": payload.get("contract_path"),
+                    "duplicate_of": payload.get("duplicate_of"),
+                }
+            )
+    return clusters
+
+
+@app.get("/tasks/{task_id}/clusters")
+def list_clusters(task_id: str):
+    """List template clusters (near-duplicate contracts) with their members."""
+    try:
+        task = task_manager.get_task(task_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Task not found")
+    clusters = _cluster_members(task)
+    items = [
+        {"cluster_id": cluster_id, "size": len(members), "members": members}
+        for cluster_id, members in sorted(clusters.items(), key=lambda kv: -len(kv[1]))
+    ]
+    return {"count": len(items), "items": items}
+
+
+@app.patch("/tasks/{task_id}/clusters/{cluster_id}")
+def update_cluster(task_id: str, cluster_id: str, fields: Dict[str, object]):
+    """Apply the same field edits to every contract in a template cluster."""
+    try:
+        task = task_manager.get_task(task_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Task not found")
+    _ensure_idle(task_id)
+    members = _cluster_members(task).get(cluster_id)
+    if not members:
+        raise HTTPException(status_code=404, detail="cluster not found")
+    for direction in ("upstream", "downstream"):
+        filenames = [m["filename"] for m in members if m["direction"] == direction]
+        if filenames:
+            apply_field_patches(
+                Path(task.intermediate_dir), direction, {name: fields or {} for name in filenames}
+            )
+    return {"status": "ok", "updated": len(members)}
 
 
 @app.patch("/tasks/{task_id}/results/{direction}/{filename}")
@@ -195,15 +723,35 @@ def update_result(task_id: str, direction: str, filename: str, fields: Dict[str,
         task = task_manager.get_task(task_id)
     except KeyError:
         raise HTTPException(status_code=404, detail="Task not found")
-    target = Path(task.intermediate_dir) / direction / filename
-    if not target.exists():
+    _ensure_idle(task_id)
+    report = apply_field_patches(Path(task.intermediate_dir), direction, {filename: fields or {}})
+    if report[0]["status"] == "missing":
         raise HTTPException(status_code=404, detail="file not found")
-    payload = json.loads(target.read_text(encoding="utf-8"))
-    payload["fields"].update(fields or {})
-    target.write_text(json.dumps(payload, ensure_ascii=False, indent=2), encoding="utf-8")
     return {"status": "ok"}
 
 
+@app.patch("/tasks/{task_id}/results/{direction}")
+def bulk_update_results(task_id: str, direction: str, request: BulkUpdateRequest):
+    """
+    Apply many field edits in one batch (all files are written only after every
+    patch was prepared). Returns a per-file diff; unknown files are reported as
+    ``missing`` without failing the rest.
+    """
+    if direction not in {"upstream", "downstream"}:
+        raise HTTPException(status_code=400, detail="direction must be upstream or downstream")
+    try:
+        task = task_manager.get_task(task_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Task not found")
+    _ensure_idle(task_id)
+    patches: Dict[str, Dict[str, object]] = {}
+    for update in request.updates:
+        patches.setdefault(update.filename, {}).update(update.fields)
+    report = apply_field_patches(Path(task.intermediate_dir), direction, patches)
+    counts = {status: sum(1 for r in report if r["status"] == status) for status in ("updated", "unchanged", "missing")}
+    return {"status": "ok", **counts, "results": report}
+
+
 @app.post("/tasks/{task_id}/results/move")
 def move_direction(task_id: str, filename: str, direction_from: str, direction_to: str):
     if direction_from not in {"upstream", "downstream"} or direction_to not in {
@@ -217,6 +765,7 @@ def move_direction(task_id: str, filename: str, direction_from: str, direction_t
         task = task_manager.get_task(task_id)
     except KeyError:
         raise HTTPException(status_code=404, detail="Task not found")
+    _ensure_idle(task_id)
     src = Path(task.intermediate_dir) / direction_from / filename
     if not src.exists():
         raise HTTPException(status_code=404, detail="file not found")
@@ -225,11 +774,54 @@ def move_direction(task_id: str, filename: str, direction_from: str, direction_t
     payload = json.loads(src.read_text(encoding="utf-8"))
     payload["direction"] = direction_to
     dst = dst_dir / filename
-    dst.write_text(json.dumps(payload, ensure_ascii=False, indent=2), encoding="utf-8")
+    write_json_atomic(dst, payload)
     src.unlink(missing_ok=True)
+    index = _results_index(task)
+    index.remove(direction_from, filename)
+    index.upsert(direction_to, filename)
     return {"status": "ok", "message": f"moved to {direction_to}"}
 
 
+@app.post("/tasks/{task_id}/results/{direction}/reextract")
+async def reextract_results(task_id: str, direction: str, request: ReextractRequest):
+    """
+    Re-extract selected headers for selected contracts, keeping reviewed fields.
+
+    Runs as a task job like ``run`` (409 while another job is active; pausable and
+    cancellable); the updated headers per file are in the task's ``last_result``.
+    """
+    if direction not in {"upstream", "downstream"}:
+        raise HTTPException(status_code=400, detail="direction must be upstream or downstream")
+    try:
+        task = task_manager.get_task(task_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Task not found")
+    if not request.filenames or not request.headers:
+        raise HTTPException(status_code=400, detail="filenames and headers must not be empty")
+    headers_def = _headers()
+    available = headers_def.upstream_headers if direction == "upstream" else headers_def.downstream_headers
+    try:
+        select_headers(request.headers, available)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    folder = Path(task.intermediate_dir) / direction
+    missing = [name for name in request.filenames if not (folder / Path(name).name).exists()]
+    if missing:
+        raise HTTPException(
+            status_code=404, detail=f"Intermediate results not found: {', '.join(missing)}"
+        )
+    return _start_job(
+        task_id,
+        "reextract",
+        {
+            "direction": direction,
+            "filenames": [Path(name).name for name in request.filenames],
+            "headers": request.headers,
+            "include_reviewed": request.include_reviewed,
+        },
+    )
+
+
 @app.get("/tasks/{task_id}/results/{direction}/export")
 def export_for_editing(task_id: str, direction: str):
     """Export current results as Excel for editing."""
@@ -241,23 +833,28 @@ def export_for_editing(task_id: str, direction: str):
         raise HTTPException(status_code=404, detail="Task not found")
 
     # Get headers for this direction
+    headers_def = _headers()
     headers = headers_def.upstream_headers if direction == "upstream" else headers_def.downstream_headers
 
     # Aggregate results into DataFrame
     intermediate_dir = Path(task.intermediate_dir)
-    df = aggregate_results(intermediate_dir, headers, direction)
-
-    if df.empty:
-        raise HTTPException(status_code=404, detail="No results to export")
-
-    # Write to temp file
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".xlsx") as tmp:
-        df.to_excel(tmp.name, index=False)
-        return FileResponse(
-            path=tmp.name,
-            filename=f"{task.id}_{direction}_edit.xlsx",
-            media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-        )
+    index = _results_index(task)
+    index.refresh(direction)
+    # Reuse the workbook until the results change; older versions are removed.
+    export_dir = intermediate_dir / "_exports"
+    target = export_dir / f"{direction}_edit_{index.generation()}.xlsx"
+    if not target.exists():
+        df = aggregate_results(intermediate_dir, headers, direction)
+        if df.empty:
+            raise HTTPException(status_code=404, detail="No results to export")
+        for stale in export_dir.glob(f"{direction}_edit_*.xlsx"):
+            stale.unlink(missing_ok=True)
+        write_xlsx(target, list(df.columns), frame_rows(df))
+    return FileResponse(
+        path=target,
+        filename=f"{task.id}_{direction}_edit.xlsx",
+        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+    )
 
 
 @app.post("/tasks/{task_id}/results/{direction}/import")
@@ -269,91 +866,85 @@ async def import_from_excel(task_id: str, direction: str, file: UploadFile = Fil
         task = task_manager.get_task(task_id)
     except KeyError:
         raise HTTPException(status_code=404, detail="Task not found")
+    await asyncio.to_thread(_ensure_idle, task_id)
 
-    # Read uploaded Excel
-    content = await file.read()
+    # Stream the upload to a temp file, then parse and apply it off the event loop.
     with tempfile.NamedTemporaryFile(delete=False, suffix=".xlsx") as tmp:
-        tmp.write(content)
-        tmp_path = tmp.name
-
+        tmp_path = Path(tmp.name)
     try:
-        df = pd.read_excel(tmp_path)
+        await stream_to_file(file, tmp_path, MAX_UPLOAD_BYTES, display_name=file.filename)
+        import pandas as pd
+
+        df = await asyncio.to_thread(pd.read_excel, tmp_path)
+    except UploadRejected as e:
+        raise HTTPException(status_code=413, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Failed to read Excel: {str(e)}")
     finally:
-        Path(tmp_path).unlink(missing_ok=True)
+        tmp_path.unlink(missing_ok=True)
 
     if "合同源文件" not in df.columns:
         raise HTTPException(status_code=400, detail="Excel must contain '合同源文件' column")
 
     # Get headers for this direction
+    headers_def = _headers()
     headers = headers_def.upstream_headers if direction == "upstream" else headers_def.downstream_headers
+    report = await asyncio.to_thread(_apply_sheet, task, direction, df, headers)
 
-    # Load existing intermediate files to preserve metadata
-    intermediate_dir = Path(task.intermediate_dir) / direction
-    intermediate_dir.mkdir(parents=True, exist_ok=True)
-
-    updated_count = 0
-    created_count = 0
+    counts = {status: sum(1 for r in report if r["status"] == status) for status in ("updated", "unchanged", "created")}
+    return {
+        "status": "ok",
+        **counts,
+        "results": report,
+        "message": (
+            f"Updated {counts['updated']} records ({counts['unchanged']} unchanged), "
+            f"created {counts['created']} new records"
+        ),
+    }
 
-    for _, row in df.iterrows():
-        contract_path = row.get("合同源文件", "")
-        if not contract_path:
-            continue
 
-        # Derive JSON filename from contract path
-        contract_stem = Path(contract_path).stem
-        json_filename = f"{contract_stem}.json"
-        json_path = intermediate_dir / json_filename
-
-        # Extract field values from Excel row
-        new_fields = {}
-        for h in headers:
-            if h in df.columns:
-                val = row.get(h)
-                # Handle NaN values
-                if pd.isna(val):
-                    new_fields[h] = None
-                else:
-                    new_fields[h] = str(val) if val is not None else None
-
-        if json_path.exists():
-            # Update existing file
-            with json_path.open("r", encoding="utf-8") as f:
-                payload = json.load(f)
-            payload["fields"].update(new_fields)
-            # Ensure direction matches
-            payload["direction"] = direction
-            with json_path.open("w", encoding="utf-8") as f:
-                json.dump(payload, f, ensure_ascii=False, indent=2)
-            updated_count += 1
-        else:
-            # Create new file with minimal structure
-            payload = {
-                "contract_path": contract_path,
+def _apply_sheet(task: Task, direction: str, df: pd.DataFrame, headers: List[str]) -> List[Dict[str, object]]:
+    by_source = sheet_patches(df, headers)
+    # Rows are matched to results by contract path; unknown contracts become
+    # minimal new results named like pipeline results.
+    known = {
+        item["contract_path"]: Path(item["filename"]).stem
+        for item in _results_index(task).items(direction)
+    }
+    keys = {
+        source: known.get(source) or result_key(Path(source), Path(task.input_dir))
+        for source in by_source
+    }
+    patches = {f"{keys[source]}.json": fields for source, fields in by_source.items()}
+    new_results = {
+        f"{keys[source]}.json": {
+            "contract_path": source,
+            "direction": direction,
+            "my_party": task.my_party,
+            "fields": fields,
+            "raw_extraction": None,
+            "classification": {
                 "direction": direction,
-                "my_party": task.my_party,
-                "fields": new_fields,
-                "raw_extraction": None,
-                "classification": {
-                    "direction": direction,
-                    "confidence": 0.0,
-                    "reason": "Imported from Excel",
-                    "raw_response": ""
-                },
-                "prompt_version": "excel_import",
-                "notes": "Imported from user-edited Excel"
-            }
-            with json_path.open("w", encoding="utf-8") as f:
-                json.dump(payload, f, ensure_ascii=False, indent=2)
-            created_count += 1
-
-    return {
-        "status": "ok",
-        "updated": updated_count,
-        "created": created_count,
-        "message": f"Updated {updated_count} records, created {created_count} new records"
+                "confidence": 0.0,
+                "reason": "Imported from Excel",
+                "raw_response": ""
+            },
+            "prompt_version": "excel_import",
+            "notes": "Imported from user-edited Excel",
+            "reviewed_fields": list(fields),
+            "storage_key": keys[source],
+        }
+        for source, fields in by_source.items()
+        if source not in known
     }
+    return apply_field_patches(
+        Path(task.intermediate_dir),
+        direction,
+        patches,
+        new_results=new_results,
+        review="changed",
+        set_direction=True,
+    )
 
 
 @app.post("/tasks/{task_id}/finalize")
@@ -369,16 +960,45 @@ def finalize_task(task_id: str, directions: Optional[List[str]] = None):
         outputs[d] = {}
         paths = aggregate_to_outputs(
             settings=settings,
-            headers=headers_def,
+            headers=_headers(),
             direction=d,
             basename=f"{task.id}_{d}",
+            # CSV/XLSX are rendered on first download.
+            formats=(),
         )
         outputs[d] = {k: str(v) for k, v in paths.items()}
     return {"status": "ok", "outputs": outputs}
 
 
+def _file_response(request: Request, path: Path, filename: str, etag: str, media_type: str) -> Response:
+    """File download with a strong ETag: 304 on If-None-Match, Range/If-Range via FileResponse."""
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    return FileResponse(path=path, filename=filename, media_type=media_type, headers={"ETag": etag})
+
+
+def _serve_final(
+    request: Request, final_dir: Path, pattern: str, fmt: str, missing_detail: str
+) -> Response:
+    """Serve the latest finalized snapshot matching ``pattern``, rendering ``fmt`` on first request."""
+    if not final_dir.exists():
+        raise HTTPException(status_code=404, detail=missing_detail)
+    manifest = FinalManifest(final_dir)
+    entry = manifest.latest(pattern)
+    if entry is not None:
+        target = render(entry["path"], "excel" if fmt == "xlsx" else "csv")
+    else:
+        # Files finalized before snapshots existed.
+        entry = manifest.latest(f"{pattern}*", suffix=f".{fmt}")
+        if entry is None:
+            raise HTTPException(status_code=404, detail=missing_detail)
+        target = entry["path"]
+    etag = f'"{entry["sha256"][:32]}-{fmt}"'
+    return _file_response(request, target, target.name, etag, "application/octet-stream")
+
+
 @app.get("/tasks/{task_id}/final/{direction}/{fmt}")
-def download_final(task_id: str, direction: str, fmt: str):
+def download_final(request: Request, task_id: str, direction: str, fmt: str):
     if direction not in {"upstream", "downstream"}:
         raise HTTPException(status_code=400, detail="direction must be upstream or downstream")
     if fmt not in {"csv", "xlsx"}:
@@ -387,18 +1007,21 @@ def download_final(task_id: str, direction: str, fmt: str):
         task = task_manager.get_task(task_id)
     except KeyError:
         raise HTTPException(status_code=404, detail="Task not found")
-    final_dir = Path(task.final_dir)
-    candidates = sorted(
-        final_dir.glob(f"*{direction}*.{fmt}"), key=lambda p: p.stat().st_mtime, reverse=True
+    return _serve_final(
+        request,
+        Path(task.final_dir),
+        f"*{direction}",
+        fmt,
+        "no finalized file found, please finalize first",
     )
-    if not candidates:
-        raise HTTPException(status_code=404, detail="no finalized file found, please finalize first")
-    target = candidates[0]
-    return FileResponse(path=target, filename=target.name, media_type="application/octet-stream")
 
 
 @app.get("/tasks/{task_id}/final/archive")
-def download_archive(task_id: str):
+def download_archive(request: Request, task_id: str):
+    """
+    Zip of every finalized CSV/Excel, built once per finalized content (see
+    ``build_archive``) and reused; the ETag is the manifest digest.
+    """
     try:
         task = task_manager.get_task(task_id)
     except KeyError:
@@ -406,10 +1029,8 @@ def download_archive(task_id: str):
     final_dir = Path(task.final_dir)
     if not final_dir.exists():
         raise HTTPException(status_code=404, detail="final dir not found, please finalize first")
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".zip") as tmp:
-        shutil.make_archive(tmp.name.replace(".zip", ""), "zip", root_dir=final_dir)
-        zip_path = tmp.name
-    return FileResponse(path=zip_path, filename=f"{task.id}_final.zip", media_type="application/zip")
+    archive, digest = build_archive(final_dir, f"{task.id}_final")
+    return _file_response(request, archive, f"{task.id}_final.zip", f'"{digest}"', "application/zip")
 
 
 @app.post("/tasks/{task_id}/finalize-db")
@@ -422,12 +1043,13 @@ def finalize_for_database(task_id: str, directions: Optional[List[str]] = None):
 
     dirs = directions or ["upstream", "downstream"]
     settings = _load_settings_for_task(task)
-    converter = FieldConverter()
+    converter = get_field_converter()
     outputs: Dict[str, Dict[str, str]] = {}
+    unmapped: Dict[str, Dict[str, List[str]]] = {}
 
     for d in dirs:
         outputs[d] = {}
-        headers = headers_def.upstream_headers if d == "upstream" else headers_def.downstream_headers
+        headers = _headers().upstream_headers if d == "upstream" else _headers().downstream_headers
         df = aggregate_results_for_database(
             settings.pipeline.intermediate_dir,
             headers,
@@ -435,14 +1057,20 @@ def finalize_for_database(task_id: str, directions: Optional[List[str]] = None):
             converter,
         )
         if not df.empty:
-            paths = write_database_outputs(df, settings.pipeline.final_dir, f"{task.id}_{d}")
+            paths = write_database_outputs(df, settings.pipeline.final_dir, f"{task.id}_{d}", formats=())
             outputs[d] = {k: str(v) for k, v in paths.items()}
+            unmapped[d] = df.attrs.get("unmapped", {})
 
-    return {"status": "ok", "outputs": outputs, "message": "Database-ready files generated with codes"}
+    return {
+        "status": "ok",
+        "outputs": outputs,
+        "unmapped": unmapped,
+        "message": "Database-ready files generated with codes",
+    }
 
 
 @app.get("/tasks/{task_id}/final/{direction}/db/{fmt}")
-def download_database_file(task_id: str, direction: str, fmt: str):
+def download_database_file(request: Request, task_id: str, direction: str, fmt: str):
     """Download database-ready file with codes instead of text values."""
     if direction not in {"upstream", "downstream"}:
         raise HTTPException(status_code=400, detail="direction must be upstream or downstream")
@@ -453,14 +1081,13 @@ def download_database_file(task_id: str, direction: str, fmt: str):
     except KeyError:
         raise HTTPException(status_code=404, detail="Task not found")
 
-    final_dir = Path(task.final_dir)
-    candidates = sorted(
-        final_dir.glob(f"*{direction}*_db.{fmt}"), key=lambda p: p.stat().st_mtime, reverse=True
+    return _serve_final(
+        request,
+        Path(task.final_dir),
+        f"*{direction}_db",
+        fmt,
+        "no database file found, please run finalize-db first",
     )
-    if not candidates:
-        raise HTTPException(status_code=404, detail="no database file found, please run finalize-db first")
-    target = candidates[0]
-    return FileResponse(path=target, filename=target.name, media_type="application/octet-stream")
 
 
 @app.delete("/tasks/{task_id}")
@@ -471,9 +1098,7 @@ def delete_task(task_id: str):
         raise HTTPException(status_code=404, detail="Task not found")
     shutil.rmtree(Path(task.input_dir).parent, ignore_errors=True)
     # remove from index
-    data = task_manager._load_index()
-    data.pop(task_id, None)
-    task_manager._save_index(data)
+    task_manager.delete_task(task_id)
     return {"status": "ok"}
 
 
@@ -499,10 +1124,7 @@ def reset_task(task_id: str):
     # Reset task status
     task_manager.update_status(task_id, "created", None)
     # Clear summary
-    data = task_manager._load_index()
-    if task_id in data:
-        data[task_id].summary = None
-        task_manager._save_index(data)
+    task_manager.update_summary(task_id, None)
     return {"status": "ok", "message": "Task reset, ready for re-processing"}
 
 
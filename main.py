@@ -2,6 +2,7 @@ from __future__ import annotations
 
 import argparse
 import asyncio
+import tempfile
 from datetime import datetime
 from pathlib import Path
 import sys
@@ -12,11 +13,24 @@ if str(SRC) not in sys.path:
     sys.path.insert(0, str(SRC))
 
 from ip_summary.config import Settings, load_settings
+from ip_summary.contract_types import load_contract_types
+from ip_summary.diagnostics import benchmark_keyword_matching, benchmark_startup, profile_imports
+from ip_summary.document_loader import load_document, scan_documents
+from ip_summary.direction_rules import evaluate_on_cases
+from ip_summary.history_store import HistoryStore
+from ip_summary.job_queue import JobQueue
 from ip_summary.pipeline import (
     aggregate_to_outputs,
     load_headers,
     process_contracts,
+    prompt_version_inventory,
+    reextract_fields,
+    reprocess_stale,
 )
+from ip_summary.sharding import merge_shards, parse_shard, select_shard, write_shard_manifest
+from ip_summary.task_runner import run_worker
+from ip_summary.tasks import TaskManager
+from ip_summary.watcher import watch_folder
 
 
 def parse_args() -> argparse.Namespace:
@@ -37,6 +51,11 @@ def parse_args() -> argparse.Namespace:
     run_parser.add_argument(
         "--intermediate-dir", default=None, help="Override intermediate output folder"
     )
+    run_parser.add_argument(
+        "--shard",
+        default=None,
+        help="Process only shard i of N (format i/N, 0 <= i < N), e.g. 0/4",
+    )
     run_parser.add_argument(
         "--concurrency",
         type=int,
@@ -88,6 +107,259 @@ def parse_args() -> argparse.Namespace:
         help="Path to downstream header Excel",
     )
 
+    reextract_parser = subparsers.add_parser(
+        "reextract", help="Re-extract selected headers for selected intermediate results"
+    )
+    reextract_parser.add_argument(
+        "--direction",
+        choices=["upstream", "downstream"],
+        required=True,
+        help="Direction folder containing the results",
+    )
+    reextract_parser.add_argument(
+        "--headers", nargs="+", required=True, help="Header names (or unique prefixes) to re-extract"
+    )
+    reextract_parser.add_argument(
+        "--files",
+        nargs="+",
+        default=None,
+        help="Intermediate JSON filenames (default: every file in the direction folder)",
+    )
+    reextract_parser.add_argument(
+        "--include-reviewed",
+        action="store_true",
+        help="Also overwrite fields that a reviewer has edited",
+    )
+    reextract_parser.add_argument(
+        "--intermediate-dir", default=None, help="Override intermediate folder"
+    )
+    reextract_parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=None,
+        help="Max concurrent LLM calls (default from config)",
+    )
+    reextract_parser.add_argument(
+        "--upstream-headers",
+        default="表头字段/版权授权链-上游类-表头信息.xlsx",
+        help="Path to upstream header Excel",
+    )
+    reextract_parser.add_argument(
+        "--downstream-headers",
+        default="表头字段/版权授权链-下游类-表头信息.xlsx",
+        help="Path to downstream header Excel",
+    )
+
+    reprocess_parser = subparsers.add_parser(
+        "reprocess", help="Re-run stages whose prompt version or header file changed"
+    )
+    reprocess_parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Only print the per-version inventory and stale stages",
+    )
+    reprocess_parser.add_argument(
+        "--intermediate-dir", default=None, help="Override intermediate folder"
+    )
+    reprocess_parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=None,
+        help="Max concurrent LLM calls (default from config)",
+    )
+    reprocess_parser.add_argument(
+        "--upstream-headers",
+        default="表头字段/版权授权链-上游类-表头信息.xlsx",
+        help="Path to upstream header Excel",
+    )
+    reprocess_parser.add_argument(
+        "--downstream-headers",
+        default="表头字段/版权授权链-下游类-表头信息.xlsx",
+        help="Path to downstream header Excel",
+    )
+
+    eval_parser = subparsers.add_parser(
+        "eval-direction",
+        help="Measure rule-based direction classification against labelled test cases",
+    )
+    eval_parser.add_argument("--my-party", required=True, help="我方主体，例如：深圳腾讯")
+    eval_parser.add_argument(
+        "--cases-dir",
+        default="测试用例",
+        help="Folder whose sub-folder names contain 上游/下游 as labels",
+    )
+    eval_parser.add_argument(
+        "--threshold",
+        type=float,
+        default=None,
+        help="Confidence needed to skip the LLM (default from config)",
+    )
+
+    bench_parser = subparsers.add_parser(
+        "bench-keywords", help="Micro-benchmark contract type keyword pre-screening"
+    )
+    bench_parser.add_argument(
+        "--input-dir", default=None, help="Folder of contracts to scan (default from config)"
+    )
+    bench_parser.add_argument(
+        "--templates",
+        default="config/contract_note_templates.yaml",
+        help="Contract type templates YAML",
+    )
+    bench_parser.add_argument("--repeat", type=int, default=5, help="Runs per measurement")
+
+    startup_parser = subparsers.add_parser(
+        "bench-startup",
+        help="Measure cold-start time of the CLI and API server and profile their imports",
+    )
+    startup_parser.add_argument("--repeat", type=int, default=5, help="Fresh processes per command")
+    startup_parser.add_argument(
+        "--budget-ms",
+        type=float,
+        default=1000.0,
+        help="Exit with status 1 when a median start-up time exceeds this",
+    )
+    startup_parser.add_argument(
+        "--profile",
+        type=int,
+        default=10,
+        help="Show this many slowest imports per entry point (0 to skip)",
+    )
+
+    watch_parser = subparsers.add_parser(
+        "watch", help="Process contracts as they are dropped into the input folder"
+    )
+    watch_parser.add_argument("--my-party", required=True, help="我方主体，例如：深圳腾讯")
+    watch_parser.add_argument(
+        "--input-dir", default=None, help="Override input folder to watch"
+    )
+    watch_parser.add_argument(
+        "--intermediate-dir", default=None, help="Override intermediate output folder"
+    )
+    watch_parser.add_argument(
+        "--final-dir", default=None, help="Override final output folder"
+    )
+    watch_parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=None,
+        help="Max concurrent LLM calls (default from config)",
+    )
+    watch_parser.add_argument(
+        "--settle",
+        type=float,
+        default=5.0,
+        help="Seconds a file's size/mtime must stay unchanged before it is processed",
+    )
+    watch_parser.add_argument(
+        "--poll-interval",
+        type=float,
+        default=10.0,
+        help="Seconds between folder scans (watchdog, if installed, wakes earlier)",
+    )
+    watch_parser.add_argument(
+        "--aggregate-every",
+        type=float,
+        default=60.0,
+        help="Write final CSV/Excel at most this many seconds after new results (0 disables)",
+    )
+    watch_parser.add_argument(
+        "--aggregate-after",
+        type=int,
+        default=None,
+        help="Write final CSV/Excel once this many new contracts were processed",
+    )
+    watch_parser.add_argument(
+        "--force-direction",
+        choices=["upstream", "downstream"],
+        default=None,
+        help="Skip classification and force direction",
+    )
+    watch_parser.add_argument(
+        "--upstream-headers",
+        default="表头字段/版权授权链-上游类-表头信息.xlsx",
+        help="Path to upstream header Excel",
+    )
+    watch_parser.add_argument(
+        "--downstream-headers",
+        default="表头字段/版权授权链-下游类-表头信息.xlsx",
+        help="Path to downstream header Excel",
+    )
+
+    merge_parser = subparsers.add_parser(
+        "merge", help="Combine sharded run outputs and verify every contract was processed"
+    )
+    merge_parser.add_argument(
+        "--input-dir", default=None, help="Input folder the shards partitioned"
+    )
+    merge_parser.add_argument(
+        "--intermediate-dir", default=None, help="Target intermediate folder"
+    )
+    merge_parser.add_argument(
+        "--from",
+        dest="shard_dirs",
+        nargs="+",
+        default=None,
+        help="Intermediate folders written by other hosts to copy in",
+    )
+
+    worker_parser = subparsers.add_parser(
+        "worker", help="Execute task runs queued by the API (IP_SUMMARY_WORKER_QUEUE=1)"
+    )
+    worker_parser.add_argument(
+        "--tasks-root", default="tasks", help="Task directory shared with the API server"
+    )
+    worker_parser.add_argument(
+        "--worker-id", default=None, help="Worker name (default: hostname-pid)"
+    )
+    worker_parser.add_argument(
+        "--poll-interval", type=float, default=2.0, help="Seconds between queue polls when idle"
+    )
+    worker_parser.add_argument(
+        "--lease",
+        type=float,
+        default=60.0,
+        help="Seconds a claimed job stays reserved without a heartbeat",
+    )
+    worker_parser.add_argument(
+        "--exit-when-idle", action="store_true", help="Stop once the queue is empty"
+    )
+    worker_parser.add_argument(
+        "--upstream-headers",
+        default="表头字段/版权授权链-上游类-表头信息.xlsx",
+        help="Path to upstream header Excel",
+    )
+    worker_parser.add_argument(
+        "--downstream-headers",
+        default="表头字段/版权授权链-下游类-表头信息.xlsx",
+        help="Path to downstream header Excel",
+    )
+
+    history_parser = subparsers.add_parser(
+        "history", help="Query finalized history (optionally export to CSV/Excel)"
+    )
+    history_parser.add_argument("--direction", choices=["upstream", "downstream"], required=True)
+    history_parser.add_argument("--history-dir", default=None, help="Override history folder")
+    history_parser.add_argument("--from", dest="month_from", default=None, help="First month, YYYY-MM")
+    history_parser.add_argument("--to", dest="month_to", default=None, help="Last month, YYYY-MM")
+    history_parser.add_argument("--contract", default=None, help="Substring of the contract path")
+    history_parser.add_argument("--prompt-version", default=None, help="Exact prompt version")
+    history_parser.add_argument(
+        "--include-superseded", action="store_true", help="Also list rows replaced by later finalizes"
+    )
+    history_parser.add_argument(
+        "--output", default=None, help="Write matches to this .csv or .xlsx file instead of printing a summary"
+    )
+
+    compact_parser = subparsers.add_parser(
+        "compact-history", help="Drop superseded history rows and reclaim space"
+    )
+    compact_parser.add_argument("--direction", choices=["upstream", "downstream"], required=True)
+    compact_parser.add_argument("--history-dir", default=None, help="Override history folder")
+    compact_parser.add_argument(
+        "--before", default=None, help="Only compact months before this one (YYYY-MM)"
+    )
+
     return parser.parse_args()
 
 
@@ -117,20 +389,212 @@ def main() -> None:
     if args.command == "run":
         upstream_headers = Path(args.upstream_headers)
         downstream_headers = Path(args.downstream_headers)
-        asyncio.run(
+        paths = None
+        if args.shard:
+            try:
+                shard_index, shard_count = parse_shard(args.shard)
+            except ValueError as exc:
+                sys.exit(str(exc))
+            paths = select_shard(
+                scan_documents(settings.pipeline.input_dir),
+                settings.pipeline.input_dir,
+                shard_index,
+                shard_count,
+            )
+            print(f"Shard {shard_index}/{shard_count}: {len(paths)} contracts")
+        results = asyncio.run(
             process_contracts(
                 settings,
                 args.my_party,
                 upstream_headers,
                 downstream_headers,
                 force_direction=args.force_direction,
+                paths=paths,
             )
         )
+        if args.shard:
+            manifest = write_shard_manifest(
+                results,
+                settings.pipeline.intermediate_dir,
+                settings.pipeline.input_dir,
+                shard_index,
+                shard_count,
+            )
+            print(f"Wrote shard manifest: {manifest}")
+        by_rules = sum(1 for r in results if r.classification.source == "rules")
+        print(f"Direction decided by rules for {by_rules}/{len(results)} contracts")
+        duplicates = sum(1 for r in results if r.duplicate_of)
+        clusters = {r.cluster_id for r in results if r.cluster_id}
+        print(f"Reused {duplicates} exact duplicates; {len(clusters)} template clusters")
     elif args.command == "aggregate":
         headers = load_headers(Path(args.upstream_headers), Path(args.downstream_headers))
         basename = args.basename or f"{args.direction}_{datetime.now():%Y%m%d_%H%M%S}"
         outputs = aggregate_to_outputs(settings, headers, args.direction, basename)
         print(f"Wrote outputs: {outputs}")
+    elif args.command == "eval-direction":
+        threshold = args.threshold
+        if threshold is None:
+            threshold = settings.pipeline.direction_rules_threshold or 0.0
+        report = evaluate_on_cases(Path(args.cases_dir), args.my_party, threshold)
+        print(
+            f"threshold={threshold} total={report['total']} skipped={report['skipped']} "
+            f"skip_rate={report['skip_rate']} agreement={report['agreement']}"
+        )
+        for mistake in report["mistakes"]:
+            print(f"  mismatch: {mistake}")
+    elif args.command == "bench-keywords":
+        texts = [load_document(p).text for p in scan_documents(settings.pipeline.input_dir)]
+        contract_types = load_contract_types(Path(args.templates))
+        report = benchmark_keyword_matching(texts, contract_types, repeat=args.repeat)
+        print(
+            f"{len(texts)} contracts, {int(report['characters'])} chars, "
+            f"{int(report['keywords'])} keywords"
+        )
+        print(f"  automaton build: {report['build_ms']:.2f} ms")
+        print(f"  naive substring scan: {report['naive_ms']:.2f} ms")
+        print(f"  automaton scan: {report['automaton_ms']:.2f} ms")
+    elif args.command == "bench-startup":
+        entry_points = {"cli": "main", "api": "api_server"}
+        # Importing the API server creates its task folder; keep that out of the project.
+        with tempfile.TemporaryDirectory() as scratch:
+            report = benchmark_startup(
+                {
+                    "cli": [sys.executable, str(ROOT / "main.py"), "--help"],
+                    "api": [sys.executable, "-c", "import api_server"],
+                },
+                repeat=args.repeat,
+                extra_paths=[ROOT, SRC],
+                cwd=Path(scratch),
+            )
+            over = []
+            for name, timing in report.items():
+                status = "ok" if timing["median_ms"] <= args.budget_ms else "OVER BUDGET"
+                if status != "ok":
+                    over.append(name)
+                print(
+                    f"{name} ({entry_points[name]}): median {timing['median_ms']:.0f} ms, "
+                    f"best {timing['best_ms']:.0f} ms [{status}]"
+                )
+                if args.profile:
+                    profile = profile_imports(
+                        [entry_points[name]],
+                        extra_paths=[ROOT, SRC],
+                        cwd=Path(scratch),
+                        top=args.profile,
+                    )
+                    print(f"  imports: {profile['total_ms']:.0f} ms; slowest (self time):")
+                    for module, ms in profile["by_self"]:
+                        print(f"    {ms:8.1f} ms  {module}")
+        if over:
+            sys.exit(f"Start-up budget of {args.budget_ms:.0f} ms exceeded by: {', '.join(over)}")
+    elif args.command == "reextract":
+        headers = load_headers(Path(args.upstream_headers), Path(args.downstream_headers))
+        folder = settings.pipeline.intermediate_dir / args.direction
+        filenames = args.files or sorted(p.name for p in folder.glob("*.json"))
+        updated = asyncio.run(
+            reextract_fields(
+                settings,
+                headers,
+                args.direction,
+                filenames,
+                args.headers,
+                include_reviewed=args.include_reviewed,
+            )
+        )
+        for filename, fields in updated.items():
+            print(f"{filename}: {', '.join(fields) if fields else 'no change'}")
+    elif args.command == "reprocess":
+        headers = load_headers(Path(args.upstream_headers), Path(args.downstream_headers))
+        inventory = prompt_version_inventory(settings.pipeline.intermediate_dir, headers)
+        print(f"Current prompt version: {inventory['current_version']}")
+        for version, counts in sorted(inventory["by_version"].items()):
+            print(f"  {version}: upstream={counts['upstream']} downstream={counts['downstream']}")
+        print("Stale stages: " + ", ".join(f"{k}={v}" for k, v in inventory["stale_stages"].items()))
+        for name in inventory["missing_sources"]:
+            print(f"  skipped (contract file missing): {name}")
+        if args.dry_run or not inventory["stale_files"]:
+            return
+        rerun = asyncio.run(reprocess_stale(settings, headers))
+        for filename, stages in rerun.items():
+            print(f"{filename}: {', '.join(stages)}")
+    elif args.command == "watch":
+        try:
+            asyncio.run(
+                watch_folder(
+                    settings,
+                    args.my_party,
+                    Path(args.upstream_headers),
+                    Path(args.downstream_headers),
+                    force_direction=args.force_direction,
+                    settle_seconds=args.settle,
+                    poll_interval=args.poll_interval,
+                    aggregate_every=args.aggregate_every or None,
+                    aggregate_after=args.aggregate_after,
+                )
+            )
+        except KeyboardInterrupt:
+            print("Watch stopped")
+    elif args.command == "merge":
+        try:
+            report = merge_shards(
+                settings.pipeline.intermediate_dir,
+                settings.pipeline.input_dir,
+                [Path(d) for d in args.shard_dirs or []],
+            )
+        except ValueError as exc:
+            sys.exit(str(exc))
+        print(
+            f"Shards found: {len(report['found_shards'])}/{report['count']}; "
+            f"upstream={report['summary']['upstream']} downstream={report['summary']['downstream']}"
+        )
+        for label in ("missing_shards", "missing_contracts", "duplicated_contracts", "missing_results"):
+            for item in report[label]:
+                print(f"  {label.replace('_', ' ')}: {item}")
+        print(f"Wrote manifest: {report['manifest']}")
+        if not report["complete"]:
+            sys.exit("Merge incomplete")
+    elif args.command == "history":
+        store = HistoryStore(settings.pipeline.history_dir, args.direction)
+        df = store.query(
+            month_from=args.month_from,
+            month_to=args.month_to,
+            contract=args.contract,
+            prompt_version=args.prompt_version,
+            include_superseded=args.include_superseded,
+        )
+        if args.output:
+            output = Path(args.output)
+            if output.suffix.lower() == ".xlsx":
+                df.to_excel(output, index=False)
+            else:
+                df.to_csv(output, index=False)
+            print(f"Wrote {len(df)} rows to {output}")
+        else:
+            for month, count in store.months().items():
+                print(f"{month}: {count}")
+            print(f"Matching rows: {len(df)}")
+    elif args.command == "compact-history":
+        report = HistoryStore(settings.pipeline.history_dir, args.direction).compact(args.before)
+        print(f"Removed {report['removed']} superseded rows; {report['remaining']} remain")
+    elif args.command == "worker":
+        tasks_root = Path(args.tasks_root)
+        try:
+            processed = asyncio.run(
+                run_worker(
+                    JobQueue(tasks_root / "jobs.sqlite3"),
+                    TaskManager(tasks_root),
+                    config_path,
+                    Path(args.upstream_headers),
+                    Path(args.downstream_headers),
+                    worker_id=args.worker_id,
+                    poll_interval=args.poll_interval,
+                    lease_seconds=args.lease,
+                    exit_when_idle=args.exit_when_idle,
+                )
+            )
+            print(f"Processed {processed} jobs")
+        except KeyboardInterrupt:
+            print("Worker stopped; unfinished job returned to the queue")
 
 
 if __name__ == "__main__":
@@ -4,10 +4,29 @@ Backend utilities for summarising IP authorization contracts.
 
 __all__ = [
     "config",
+    "config_registry",
+    "contract_types",
+    "dedup",
+    "diagnostics",
+    "direction_rules",
     "document_loader",
+    "exports",
+    "field_converter",
+    "history_store",
+    "job_queue",
+    "keyword_matcher",
     "llm_client",
+    "micro_batch",
     "models",
     "pipeline",
     "prompts",
+    "result_edits",
+    "results_index",
+    "run_control",
+    "sharding",
     "storage",
+    "task_runner",
+    "tracing",
+    "uploads",
+    "watcher",
 ]
@@ -2,11 +2,13 @@ from __future__ import annotations
 
 import os
 from pathlib import Path
-from typing import Any, Dict
+from typing import Any, Dict, Optional
 
 import yaml
 from pydantic import BaseModel, Field
 
+from .config_registry import registry
+
 
 class LLMSettings(BaseModel):
     provider: str = Field(default="deepseek")
@@ -25,14 +27,30 @@ class PipelineSettings(BaseModel):
     final_dir: Path
     history_dir: Path
     concurrent_requests: int = Field(default=3)
+    # Contracts whose rule-based direction confidence reaches this value skip the
+    # LLM classification call; None sends every contract to the LLM.
+    direction_rules_threshold: Optional[float] = Field(default=0.8)
+    # Estimated Jaccard similarity at which contracts share a template cluster;
+    # None disables near-duplicate clustering (exact duplicates are still reused).
+    near_duplicate_threshold: Optional[float] = Field(default=0.6)
+    # Contracts up to this many characters share batched classification and
+    # type-identification requests, packed up to micro_batch_budget_chars of text
+    # per request; None disables micro-batching.
+    micro_batch_max_chars: Optional[int] = Field(default=None)
+    micro_batch_budget_chars: int = Field(default=12000)
+    # Write intermediate results unindented with raw LLM answers compressed.
+    compact_intermediate: bool = Field(default=False)
+    # Record per-contract timing spans in {intermediate_dir}/_traces.jsonl.
+    tracing: bool = Field(default=True)
 
     def resolve_paths(self, base: Path) -> "PipelineSettings":
-        return PipelineSettings(
-            input_dir=(base / self.input_dir).resolve(),
-            intermediate_dir=(base / self.intermediate_dir).resolve(),
-            final_dir=(base / self.final_dir).resolve(),
-            history_dir=(base / self.history_dir).resolve(),
-            concurrent_requests=self.concurrent_requests,
+        return self.model_copy(
+            update={
+                "input_dir": (base / self.input_dir).resolve(),
+                "intermediate_dir": (base / self.intermediate_dir).resolve(),
+                "final_dir": (base / self.final_dir).resolve(),
+                "history_dir": (base / self.history_dir).resolve(),
+            }
         )
 
 
@@ -66,3 +84,11 @@ def load_settings(config_path: Path) -> Settings:
     )
     resolved_pipeline = settings.pipeline.resolve_paths(default_base)
     return Settings(llm=settings.llm, pipeline=resolved_pipeline)
+
+
+def get_settings(config_path: Path) -> Settings:
+    """
+    ``load_settings`` cached until the file changes (see ``ConfigRegistry``); the
+    environment is read at load time only.
+    """
+    return registry.get([config_path], load_settings)
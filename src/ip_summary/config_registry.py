@@ -0,0 +1,106 @@
+from __future__ import annotations
+
+import hashlib
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, TypeVar
+
+T = TypeVar("T")
+
+# Per file: (mtime_ns, size), or None when the file does not exist.
+Signature = Tuple[Optional[Tuple[int, int]], ...]
+
+
+@dataclass
+class _Entry:
+    signature: Signature
+    digest: str
+    value: Any
+    loads: int = 1
+
+
+def _signature(paths: Sequence[Path]) -> Signature:
+    stats = []
+    for path in paths:
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            stats.append(None)
+        else:
+            stats.append((stat.st_mtime_ns, stat.st_size))
+    return tuple(stats)
+
+
+def _digest(paths: Sequence[Path]) -> str:
+    digest = hashlib.sha1()
+    for path in paths:
+        try:
+            digest.update(path.read_bytes())
+        except FileNotFoundError:
+            digest.update(b"\0missing")
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class ConfigRegistry:
+    """
+    Process-wide cache of parsed configuration files (settings, header workbooks,
+    note templates, value mappings).
+
+    ``get`` parses a set of files once with the given loader and returns the same
+    object until one of the files changes: a changed mtime or size triggers a
+    content hash, and only a different hash re-runs the loader (touching a file
+    or saving it unchanged keeps the parsed value). Loader errors are not cached.
+    Cached values are shared, so callers copy before modifying them.
+    """
+
+    def __init__(self) -> None:
+        self._entries: Dict[Tuple[Any, ...], _Entry] = {}
+        self._locks: Dict[Tuple[Any, ...], threading.Lock] = {}
+        self._guard = threading.Lock()
+
+    def get(self, paths: Sequence[Path], loader: Callable[..., T]) -> T:
+        """``loader(*paths)``, cached per loader and (resolved) file set."""
+        resolved = tuple(Path(p).resolve() for p in paths)
+        key = (getattr(loader, "__qualname__", repr(loader)), loader, resolved)
+        with self._guard:
+            lock = self._locks.setdefault(key, threading.Lock())
+        with lock:
+            signature = _signature(resolved)
+            entry = self._entries.get(key)
+            if entry is not None and entry.signature == signature:
+                return entry.value
+            digest = _digest(resolved)
+            if entry is not None and entry.digest == digest:
+                entry.signature = signature
+                return entry.value
+            value = loader(*paths)
+            loads = entry.loads + 1 if entry is not None else 1
+            self._entries[key] = _Entry(signature, digest, value, loads)
+            return value
+
+    def reload(self) -> List[Dict[str, Any]]:
+        """
+        Drop every cached value; the next ``get`` parses the files again.
+        Returns the dropped entries (see ``entries``).
+        """
+        with self._guard:
+            dropped = self.entries()
+            self._entries.clear()
+        return dropped
+
+    def entries(self) -> List[Dict[str, Any]]:
+        """What is cached: loader name, files, content hash and how often it was parsed."""
+        return [
+            {
+                "loader": key[0],
+                "files": [str(p) for p in key[2]],
+                "sha1": entry.digest,
+                "loads": entry.loads,
+            }
+            for key, entry in list(self._entries.items())
+        ]
+
+
+registry = ConfigRegistry()
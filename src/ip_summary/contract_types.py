@@ -6,10 +6,13 @@ from __future__ import annotations
 
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Dict, List, Mapping, Optional
 
 import yaml
 
+from .config_registry import registry
+from .keyword_matcher import KeywordHit, KeywordMatcher
+
 
 @dataclass
 class ContractType:
@@ -19,9 +22,19 @@ class ContractType:
     template: str
 
 
-def load_contract_types(config_path: Path) -> Dict[str, ContractType]:
+class ContractTypeCatalog(Dict[str, ContractType]):
+    """合同类型映射，附带预编译的关键词自动机。"""
+
+    def __init__(self, types: Mapping[str, ContractType]):
+        super().__init__(types)
+        self.matcher = KeywordMatcher(kw for ct in self.values() for kw in ct.keywords)
+
+
+def load_contract_types(config_path: Path) -> ContractTypeCatalog:
     """从YAML配置文件加载合同类型定义。
 
+    加载时即构建关键词自动机，后续每份合同只需扫描一遍全文。
+
     Args:
         config_path: 配置文件路径
 
@@ -38,7 +51,37 @@ def load_contract_types(config_path: Path) -> Dict[str, ContractType]:
             keywords=cfg.get("keywords", []),
             template=cfg.get("template", ""),
         )
-    return types
+    return ContractTypeCatalog(types)
+
+
+def get_contract_types(config_path: Path) -> ContractTypeCatalog:
+    """进程内共享的合同类型定义（含关键词自动机）；文件内容变化后自动重新加载。"""
+    return registry.get([config_path], load_contract_types)
+
+
+def match_type_keywords(
+    contract_text: str,
+    contract_types: Dict[str, ContractType],
+) -> Dict[str, List[KeywordHit]]:
+    """一次扫描找出各合同类型命中的关键词及首次出现位置。
+
+    Args:
+        contract_text: 合同全文
+        contract_types: 合同类型定义（由load_contract_types加载时复用预编译自动机）
+
+    Returns:
+        合同类型名称 -> 命中关键词列表（按类型配置中的关键词顺序）
+    """
+    if not isinstance(contract_types, ContractTypeCatalog):
+        contract_types = ContractTypeCatalog(contract_types)
+    positions = contract_types.matcher.first_positions(contract_text)
+
+    hits: Dict[str, List[KeywordHit]] = {}
+    for type_name, ct in contract_types.items():
+        matched = [KeywordHit(kw, positions[kw]) for kw in ct.keywords if kw in positions]
+        if matched:
+            hits[type_name] = matched
+    return hits
 
 
 def identify_contract_type_by_keywords(
@@ -56,14 +99,10 @@ def identify_contract_type_by_keywords(
     Returns:
         最可能的合同类型名称，如果无法识别则返回None
     """
-    scores: Dict[str, int] = {}
-
-    for type_name, ct in contract_types.items():
-        if not ct.keywords:  # 跳过没有关键词的类型（如通用类型）
-            continue
-        score = sum(1 for kw in ct.keywords if kw in contract_text)
-        if score > 0:
-            scores[type_name] = score
+    scores = {
+        type_name: len(matched)
+        for type_name, matched in match_type_keywords(contract_text, contract_types).items()
+    }
 
     if not scores:
         return None
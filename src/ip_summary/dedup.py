@@ -0,0 +1,171 @@
+"""批次内重复与近似重复合同检测模块。
+
+- 完全重复：按规范化文本的内容哈希识别，重复件直接复用首份合同的结果；
+- 近似重复：对字符 shingle 计算 MinHash 签名，经 LSH 分桶找出候选对，
+  估计 Jaccard 相似度达到阈值的合同归为同一模板簇，便于批量校对。
+"""
+from __future__ import annotations
+
+import hashlib
+import re
+import zlib
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence
+
+_WHITESPACE_RE = re.compile(r"\s+")
+# 梅森素数 2^31-1，用于通用哈希 (a*x + b) mod p；a、x 均小于 2^31，乘积不会溢出 uint64
+_MERSENNE_PRIME = (1 << 31) - 1
+
+
+def normalize_text(text: str) -> str:
+    """去除空白差异，使仅排版不同的文本得到相同哈希。"""
+    return _WHITESPACE_RE.sub("", text)
+
+
+def content_hash(text: str) -> str:
+    """规范化文本的 SHA-256 摘要。"""
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+@dataclass
+class MinHasher:
+    """基于字符 shingle 的 MinHash 签名计算器。"""
+    num_perm: int = 64
+    shingle_size: int = 5
+    seed: int = 1
+    _a: List[int] = field(init=False, repr=False)
+    _b: List[int] = field(init=False, repr=False)
+
+    def __post_init__(self) -> None:
+        rng = hashlib.blake2b(str(self.seed).encode(), digest_size=8)
+        self._a, self._b = [], []
+        for i in range(self.num_perm):
+            rng.update(i.to_bytes(4, "little"))
+            digest = int.from_bytes(rng.digest(), "little")
+            self._a.append(digest % (_MERSENNE_PRIME - 1) + 1)
+            rng.update(b"b")
+            self._b.append(int.from_bytes(rng.digest(), "little") % _MERSENNE_PRIME)
+
+    def _shingle_hashes(self, text: str) -> List[int]:
+        normalized = normalize_text(text)
+        k = self.shingle_size
+        if len(normalized) <= k:
+            grams = {normalized} if normalized else set()
+        else:
+            grams = {normalized[i : i + k] for i in range(len(normalized) - k + 1)}
+        return [zlib.crc32(g.encode("utf-8")) % _MERSENNE_PRIME for g in grams]
+
+    def signature(self, text: str) -> List[int]:
+        """计算文本的 MinHash 签名；空文本返回全最大值签名。"""
+        import numpy as np
+
+        hashes = self._shingle_hashes(text)
+        if not hashes:
+            return [_MERSENNE_PRIME] * self.num_perm
+        values = np.array(hashes, dtype=np.uint64)
+        a = np.array(self._a, dtype=np.uint64)[:, None]
+        b = np.array(self._b, dtype=np.uint64)[:, None]
+        return ((a * values[None, :] + b) % _MERSENNE_PRIME).min(axis=1).tolist()
+
+
+def estimate_jaccard(sig_a: Sequence[int], sig_b: Sequence[int]) -> float:
+    """用两个签名相同位置相等的比例估计 Jaccard 相似度。"""
+    if not sig_a:
+        return 0.0
+    return sum(1 for x, y in zip(sig_a, sig_b) if x == y) / len(sig_a)
+
+
+@dataclass
+class DuplicateReport:
+    """一个批次的查重结果。"""
+    content_hashes: List[str]
+    # 下标 -> 内容完全相同的首份合同下标
+    exact_duplicate_of: Dict[int, int]
+    # 下标 -> 模板簇编号（仅包含至少两份合同的簇）
+    cluster_ids: Dict[int, str]
+
+
+def find_duplicates(
+    texts: Sequence[str],
+    threshold: Optional[float] = 0.6,
+    num_perm: int = 64,
+    bands: int = 16,
+) -> DuplicateReport:
+    """检测批次内的完全重复与近似重复合同。
+
+    Args:
+        texts: 合同文本列表
+        threshold: 归入同一模板簇所需的估计 Jaccard 相似度；None 表示不做近似查重
+        num_perm: MinHash 签名长度
+        bands: LSH 分段数（num_perm 需能被其整除）
+
+    Returns:
+        DuplicateReport
+    """
+    hashes = [content_hash(t) for t in texts]
+    first_by_hash: Dict[str, int] = {}
+    exact: Dict[int, int] = {}
+    for i, h in enumerate(hashes):
+        if h in first_by_hash:
+            exact[i] = first_by_hash[h]
+        else:
+            first_by_hash[h] = i
+
+    parent = list(range(len(texts)))
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    def union(i: int, j: int) -> None:
+        ri, rj = find(i), find(j)
+        if ri != rj:
+            parent[max(ri, rj)] = min(ri, rj)
+
+    for dup, original in exact.items():
+        union(dup, original)
+
+    if threshold is not None:
+        hasher = MinHasher(num_perm=num_perm)
+        unique = sorted(first_by_hash.values())
+        signatures = {i: hasher.signature(texts[i]) for i in unique}
+        rows = num_perm // bands
+        for band in range(bands):
+            buckets: Dict[tuple, List[int]] = {}
+            for i in unique:
+                key = tuple(signatures[i][band * rows : (band + 1) * rows])
+                buckets.setdefault(key, []).append(i)
+            for members in buckets.values():
+                # 桶内每个簇只保留一个代表，新成员只与各簇代表比较并随即合并；
+                # 模板合同集中在同一个桶时比较次数随合同数线性增长，而非两两比较
+                representatives: List[int] = []
+                for i in members:
+                    root = find(i)
+                    if any(find(r) == root for r in representatives):
+                        continue
+                    for r in representatives:
+                        if estimate_jaccard(signatures[i], signatures[r]) >= threshold:
+                            union(i, r)
+                            break
+                    else:
+                        representatives.append(i)
+
+    groups: Dict[int, List[int]] = {}
+    for i in range(len(texts)):
+        groups.setdefault(find(i), []).append(i)
+    cluster_ids: Dict[int, str] = {}
+    for root, members in groups.items():
+        if len(members) < 2:
+            continue
+        # 以簇内最小内容哈希命名，保证同一批文件重复运行时编号稳定
+        cluster_id = "tpl-" + min(hashes[m] for m in members)[:10]
+        for m in members:
+            cluster_ids[m] = cluster_id
+
+    return DuplicateReport(
+        content_hashes=hashes,
+        exact_duplicate_of=exact,
+        cluster_ids=cluster_ids,
+    )
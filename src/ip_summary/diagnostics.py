@@ -0,0 +1,138 @@
+"""性能诊断与微基准模块。"""
+from __future__ import annotations
+
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence
+
+from .contract_types import ContractType, ContractTypeCatalog, match_type_keywords
+
+
+def _best_of(func: Callable[[], object], repeat: int) -> float:
+    """运行若干次，返回最快一次的耗时（毫秒）。"""
+    timings: List[float] = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return min(timings)
+
+
+def benchmark_keyword_matching(
+    texts: List[str],
+    contract_types: Dict[str, ContractType],
+    repeat: int = 5,
+) -> Dict[str, float]:
+    """对比逐关键词子串查找与预编译自动机的关键词预筛选耗时。
+
+    Args:
+        texts: 待扫描的合同文本
+        contract_types: 合同类型定义
+        repeat: 重复次数，取最快一次
+
+    Returns:
+        各实现扫描全部文本的耗时（毫秒）、自动机构建耗时及关键词数量
+    """
+    def naive() -> None:
+        for text in texts:
+            for ct in contract_types.values():
+                sum(1 for kw in ct.keywords if kw in text)
+
+    catalog = ContractTypeCatalog(contract_types)
+
+    def automaton() -> None:
+        for text in texts:
+            match_type_keywords(text, catalog)
+
+    return {
+        "keywords": float(len(catalog.matcher.keywords)),
+        "characters": float(sum(len(t) for t in texts)),
+        "build_ms": _best_of(lambda: ContractTypeCatalog(contract_types), repeat),
+        "naive_ms": _best_of(naive, repeat),
+        "automaton_ms": _best_of(automaton, repeat),
+    }
+
+
+def _child_env(extra_paths: Sequence[Path]) -> Dict[str, str]:
+    env = dict(os.environ)
+    paths = [str(p) for p in extra_paths]
+    if env.get("PYTHONPATH"):
+        paths.append(env["PYTHONPATH"])
+    env["PYTHONPATH"] = os.pathsep.join(paths)
+    return env
+
+
+def profile_imports(
+    modules: Sequence[str],
+    extra_paths: Sequence[Path] = (),
+    cwd: Optional[Path] = None,
+    top: int = 15,
+) -> Dict[str, object]:
+    """在全新解释器中以 ``-X importtime`` 导入模块，统计冷启动导入耗时。
+
+    Args:
+        modules: 要导入的模块名
+        extra_paths: 加入子进程 PYTHONPATH 的目录（如 src/）
+        cwd: 子进程工作目录
+        top: 返回耗时最多的模块数
+
+    Returns:
+        total_ms 为全部导入的自身耗时之和；by_cumulative 为顶层导入按累计耗时排序，
+        by_self 为所有模块按自身耗时排序，元素为 (模块名, 毫秒)
+    """
+    code = "; ".join(f"import {m}" for m in modules)
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True,
+        text=True,
+        cwd=cwd,
+        env=_child_env(extra_paths),
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else code)
+    entries = []
+    for line in proc.stderr.splitlines():
+        # "import time: self [us] | cumulative | imported package"
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        entries.append((name.rstrip(), int(self_us), int(cumulative_us)))
+    top_level = [(n.strip(), c / 1000) for n, _, c in entries if not n.startswith("  ")]
+    return {
+        "total_ms": sum(s for _, s, _ in entries) / 1000,
+        "by_cumulative": sorted(top_level, key=lambda e: e[1], reverse=True)[:top],
+        "by_self": sorted(
+            ((n.strip(), s / 1000) for n, s, _ in entries), key=lambda e: e[1], reverse=True
+        )[:top],
+    }
+
+
+def benchmark_startup(
+    commands: Dict[str, Sequence[str]],
+    repeat: int = 5,
+    extra_paths: Sequence[Path] = (),
+    cwd: Optional[Path] = None,
+) -> Dict[str, Dict[str, float]]:
+    """每条命令在全新进程中运行若干次，测量冷启动耗时。
+
+    Args:
+        commands: 名称 -> 命令行（如 ``[sys.executable, "main.py", "--help"]``）
+        repeat: 每条命令运行次数
+
+    Returns:
+        名称 -> {"best_ms", "median_ms"}
+    """
+    report: Dict[str, Dict[str, float]] = {}
+    env = _child_env(extra_paths)
+    for name, command in commands.items():
+        timings: List[float] = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            subprocess.run(command, cwd=cwd, env=env, check=True, capture_output=True)
+            timings.append((time.perf_counter() - start) * 1000)
+        report[name] = {"best_ms": min(timings), "median_ms": statistics.median(timings)}
+    return report
@@ -0,0 +1,218 @@
+"""基于规则的合同方向预判模块。
+
+解析合同主体角色（甲方/乙方、授权方/被授权方等），确定我方所处的角色，
+再按“谁授权给谁、谁委托谁、谁支付许可费”等句式与审批表关键词打分，
+本地判定上游/下游。置信度低于阈值的合同仍交由LLM判定。
+"""
+from __future__ import annotations
+
+import json
+import re
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from .models import ClassificationResult, DirectionLiteral
+
+# 签约主体标签
+PARTY_LABELS = ("甲方", "乙方", "丙方")
+
+# 角色别名 -> 我方担任该角色时的方向
+ROLE_DIRECTIONS: Dict[str, DirectionLiteral] = {
+    "被授权方": "upstream",
+    "被许可方": "upstream",
+    "受让方": "upstream",
+    "委托方": "upstream",
+    "授权方": "downstream",
+    "许可方": "downstream",
+    "转让方": "downstream",
+    "出让方": "downstream",
+    "受托方": "downstream",
+}
+
+# 与主体无关的审批表/标题关键词及权重
+DIRECTION_KEYWORDS: Dict[DirectionLiteral, Dict[str, int]] = {
+    "upstream": {"内容采购": 2, "委托创作": 1, "委托制作": 1},
+    "downstream": {"我方授权": 3, "发行合同": 1, "合作发行": 1, "出版发行": 1},
+}
+
+# 句式模板：{src} 向 {dst} 授予权利 / 委托创作 / 支付许可费。
+# 第二个元素表示 {src} 一方是否为取得权利的一方。
+_GRANT_PATTERNS: List[Tuple[str, bool]] = [
+    (r"{src}(?:同意|愿意|已|现)?(?:将|把)?[^。；\n]{{0,60}}?(?:授权|许可|授予|转让)(?:给)?{dst}", False),
+    (r"{src}(?:愿意)?委托{dst}(?!独家代理|代理|发行)", True),
+    (r"{dst}接受{src}(?:的)?委托", True),
+    (r"{src}[^。；\n]{{0,6}}向{dst}支付[^。；\n]{{0,10}}(?:许可使用费|授权费|授权金|版权费|版税)", True),
+]
+
+_PARTY_RE = re.compile(
+    r"(甲方|乙方|丙方)\s*(?:[（(]\s*([一-龥]{2,4}方)\s*[）)])?\s*[:：]\s*\**\s*([^\n<|*]{2,60})"
+)
+_ROLE_ALIAS_RE = re.compile(
+    r"(授权方|被授权方|许可方|被许可方|转让方|出让方|受让方|委托方|受托方)\s*[（(]?\s*(?:以下简称)?\s*[“\"]?(甲方|乙方|丙方)"
+)
+_NAME_STOP_RE = re.compile(r"[（(，,。；;\s]|地址|住所|法定代表人|联系人")
+
+# 每条规则最多计入的命中次数，避免同一条款反复出现时主导结果
+_MAX_HITS_PER_RULE = 3
+# 置信度曲线参数：confidence = 0.5 + 0.5 * margin / (margin + K)，在测试用例上标定
+_CONFIDENCE_K = 2.0
+
+
+def parse_parties(contract_text: str) -> Dict[str, Dict[str, str]]:
+    """解析合同签约主体。
+
+    Returns:
+        主体标签（甲方/乙方/丙方） -> {"name": 主体名称, "role": 角色别名（可能为空）}
+    """
+    parties: Dict[str, Dict[str, str]] = {}
+    for label, role, raw_name in _PARTY_RE.findall(contract_text):
+        name = _NAME_STOP_RE.split(raw_name.strip(), maxsplit=1)[0].strip()
+        if len(name) < 2 or label in parties and parties[label]["name"]:
+            if role and label in parties and not parties[label]["role"]:
+                parties[label]["role"] = role
+            continue
+        parties[label] = {"name": name, "role": role or parties.get(label, {}).get("role", "")}
+
+    for role, label in _ROLE_ALIAS_RE.findall(contract_text):
+        if label in parties and not parties[label]["role"]:
+            parties[label]["role"] = role
+    return parties
+
+
+def _party_match_score(name: str, my_party: str) -> int:
+    """主体名称与我方主体的匹配程度：2=包含，1=按顺序包含全部字符，0=不匹配。"""
+    if not my_party:
+        return 0
+    if my_party in name:
+        return 2
+    it = iter(name)
+    return 1 if all(ch in it for ch in my_party) else 0
+
+
+def locate_my_label(parties: Dict[str, Dict[str, str]], my_party: str) -> Optional[str]:
+    """找出我方对应的主体标签；多个主体同等匹配时返回None。"""
+    scored = sorted(
+        ((_party_match_score(p["name"], my_party), label) for label, p in parties.items()),
+        reverse=True,
+    )
+    if not scored or scored[0][0] == 0:
+        return None
+    if len(scored) > 1 and scored[1][0] == scored[0][0]:
+        return None
+    return scored[0][1]
+
+
+def score_direction(contract_text: str, my_party: str) -> Dict[str, object]:
+    """对合同方向进行规则打分。
+
+    Returns:
+        包含 upstream/downstream 分数、我方标签及命中规则的字典
+    """
+    scores: Dict[DirectionLiteral, float] = {"upstream": 0.0, "downstream": 0.0}
+    hits: List[str] = []
+
+    for direction, keywords in DIRECTION_KEYWORDS.items():
+        for kw, weight in keywords.items():
+            if kw in contract_text:
+                scores[direction] += weight
+                hits.append(kw)
+
+    parties = parse_parties(contract_text)
+    my_label = locate_my_label(parties, my_party)
+    if my_label:
+        role = parties[my_label]["role"]
+        if role in ROLE_DIRECTIONS:
+            scores[ROLE_DIRECTIONS[role]] += 3
+            hits.append(f"{my_label}（{role}）")
+
+        for other in parties:
+            if other == my_label:
+                continue
+            for template, src_acquires in _GRANT_PATTERNS:
+                for src, dst in ((my_label, other), (other, my_label)):
+                    count = len(re.findall(template.format(src=src, dst=dst), contract_text))
+                    if not count:
+                        continue
+                    we_acquire = src_acquires == (src == my_label)
+                    direction: DirectionLiteral = "upstream" if we_acquire else "downstream"
+                    scores[direction] += min(count, _MAX_HITS_PER_RULE)
+                    hits.append(f"{src}->{dst}×{count}")
+
+    return {
+        "upstream": scores["upstream"],
+        "downstream": scores["downstream"],
+        "my_label": my_label,
+        "parties": parties,
+        "hits": hits,
+    }
+
+
+def classify_direction_by_rules(
+    contract_text: str, my_party: str
+) -> Optional[ClassificationResult]:
+    """本地规则判定合同方向。
+
+    没有任何规则命中时返回None；否则按两方向分差给出置信度。
+    """
+    scored = score_direction(contract_text, my_party)
+    up, down = scored["upstream"], scored["downstream"]
+    if up == down == 0:
+        return None
+    direction: DirectionLiteral = "upstream" if up > down else "downstream"
+    margin = abs(up - down)
+    confidence = 0.5 + 0.5 * margin / (margin + _CONFIDENCE_K)
+    if scored["my_label"] is None:
+        # 未定位到我方主体时只剩关键词证据，置信度减半计入
+        confidence = 0.5 + (confidence - 0.5) / 2
+    dir_cn = "上游" if direction == "upstream" else "下游"
+    reason = f"规则判定为{dir_cn}：" + "、".join(scored["hits"][:4])
+    return ClassificationResult(
+        direction=direction,
+        confidence=round(confidence, 3),
+        reason=reason[:60],
+        raw_response=json.dumps(
+            {k: scored[k] for k in ("upstream", "downstream", "my_label", "hits")},
+            ensure_ascii=False,
+        ),
+        source="rules",
+    )
+
+
+def evaluate_on_cases(
+    cases_dir: Path, my_party: str, threshold: float
+) -> Dict[str, object]:
+    """在带标签的测试用例目录上评估规则分类器。
+
+    目录名中含“上游”/“下游”的子目录视为对应方向的标注样本。
+
+    Returns:
+        样本数、跳过LLM的比例（置信度达到阈值）、跳过部分的准确率及错例
+    """
+    from .document_loader import load_document, scan_documents
+
+    total = skipped = agreed = 0
+    mistakes: List[str] = []
+    for path in scan_documents(cases_dir):
+        label_dir = path.relative_to(cases_dir).parts[0]
+        if "上游" in label_dir:
+            label = "upstream"
+        elif "下游" in label_dir:
+            label = "downstream"
+        else:
+            continue
+        total += 1
+        result = classify_direction_by_rules(load_document(path).text, my_party)
+        if result is None or result.confidence < threshold:
+            continue
+        skipped += 1
+        if result.direction == label:
+            agreed += 1
+        else:
+            mistakes.append(f"{path.name}: {result.direction} ({result.confidence})")
+    return {
+        "total": total,
+        "skipped": skipped,
+        "skip_rate": round(skipped / total, 3) if total else 0.0,
+        "agreement": round(agreed / skipped, 3) if skipped else 0.0,
+        "mistakes": mistakes,
+    }
@@ -1,14 +1,18 @@
 from __future__ import annotations
 
+import hashlib
+import json
+import os
+import uuid
 from pathlib import Path
-from typing import Iterable, List, Sequence
-
-import pdfplumber
-from docx import Document
+from typing import Iterable, List, Optional, Sequence
 
 from .models import LoadedDocument
+from .tracing import annotate, traced
 
 SUPPORTED_EXTENSIONS = {".md", ".txt", ".docx", ".pdf"}
+# Parse cache folder inside a run's intermediate directory.
+PARSE_CACHE_DIR = "_parsed"
 
 
 def scan_documents(root: Path) -> List[Path]:
@@ -22,22 +26,78 @@ def scan_documents(root: Path) -> List[Path]:
     return sorted(files)
 
 
-def load_documents(paths: Sequence[Path]) -> List[LoadedDocument]:
-    return [load_document(path) for path in paths]
+def load_documents(paths: Sequence[Path], cache_dir: Optional[Path] = None) -> List[LoadedDocument]:
+    return [load_document(path, cache_dir) for path in paths]
+
+
+def parse_cache_path(cache_dir: Path, path: Path) -> Path:
+    """
+    Cache entry for a file's extracted text, keyed by path, size and mtime so a
+    replaced file is parsed again.
+    """
+    stat = path.stat()
+    key = f"{path.resolve()}|{stat.st_size}|{stat.st_mtime_ns}"
+    return cache_dir / f"{hashlib.sha1(key.encode('utf-8')).hexdigest()}.json"
 
 
-def load_document(path: Path) -> LoadedDocument:
+@traced("load_document")
+def load_document(path: Path, cache_dir: Optional[Path] = None) -> LoadedDocument:
+    """
+    Load a contract's text. With ``cache_dir``, PDF/DOCX text is reused from (and
+    saved to) the parse cache, e.g. when parsing already happened during upload.
+    """
     suffix = path.suffix.lower()
+    annotate(contract=str(path), format=suffix.lstrip("."))
+    cache_path = None
+    if cache_dir is not None and suffix in {".docx", ".pdf"}:
+        cache_path = parse_cache_path(cache_dir, path)
+        if cache_path.exists():
+            text = json.loads(cache_path.read_text(encoding="utf-8"))["text"]
+            annotate(cached=True)
+            return _loaded(path, text)
+    text = _parse(path, suffix)
+    if cache_path is not None:
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = cache_path.with_suffix(f".{uuid.uuid4().hex}.tmp")
+        tmp_path.write_text(json.dumps({"text": text}, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp_path, cache_path)
+    return _loaded(path, text)
+
+
+def cached_text(path: Path, cache_dir: Path) -> Optional[str]:
+    """
+    A contract's text if it is available without parsing: plain-text files are
+    read, PDF/DOCX only come from the parse cache. None otherwise.
+    """
+    suffix = path.suffix.lower()
+    try:
+        if suffix in {".md", ".txt"}:
+            return _parse(path, suffix).strip()
+        if suffix in {".docx", ".pdf"}:
+            cache_path = parse_cache_path(cache_dir, path)
+            return json.loads(cache_path.read_text(encoding="utf-8"))["text"].strip()
+    except (OSError, ValueError, KeyError):
+        pass
+    return None
+
+
+def _parse(path: Path, suffix: str) -> str:
     if suffix in {".md", ".txt"}:
         text = path.read_text(encoding="utf-8", errors="ignore")
     elif suffix == ".docx":
+        # Parsers are imported on first use: most runs hit the parse cache.
+        from docx import Document
+
         doc = Document(path)
         text = "\n".join([p.text for p in doc.paragraphs])
     elif suffix == ".pdf":
         text = _read_pdf(path)
     else:
         raise ValueError(f"Unsupported file type for {path}")
+    return text
 
+
+def _loaded(path: Path, text: str) -> LoadedDocument:
     return LoadedDocument(
         path=path,
         text=text.strip(),
@@ -46,6 +106,8 @@ def load_document(path: Path) -> LoadedDocument:
 
 
 def _read_pdf(path: Path) -> str:
+    import pdfplumber
+
     contents: List[str] = []
     with pdfplumber.open(path) as pdf:
         for page in pdf.pages:
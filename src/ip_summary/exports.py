@@ -0,0 +1,423 @@
+from __future__ import annotations
+
+import csv
+import datetime
+import hashlib
+import json
+import math
+import os
+import sqlite3
+import time
+import uuid
+import zipfile
+from contextlib import closing, contextmanager
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# Finalized rows are stored once as a JSON-lines snapshot (first line: column
+# names) and rendered to CSV/XLSX from it, so every format shows the same data.
+SNAPSHOT_SUFFIX = ".rows.jsonl"
+FORMAT_SUFFIXES = {"csv": ".csv", "excel": ".xlsx"}
+CSV_CHUNK_ROWS = 1000
+# Per output folder: manifest of finalized artifacts and the cached download archive.
+MANIFEST_NAME = "_manifest.sqlite3"
+ARCHIVE_DIR = "_archives"
+# Temporary files older than this are leftovers of interrupted writes.
+STALE_TMP_SECONDS = 3600
+# Excel rejects longer cell text.
+XLSX_MAX_CELL_CHARS = 32767
+
+Row = Sequence[Any]
+
+
+def _plain(value: Any) -> Any:
+    if value is None:
+        return None
+    if hasattr(value, "item"):
+        # numpy scalar -> Python scalar
+        value = value.item()
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    return value
+
+
+def _xlsx_cell(value: Any) -> Any:
+    """
+    A value openpyxl accepts: lists / dicts (edited fields) and other non-scalars
+    become text as with ``DataFrame.to_excel``, text is cut to Excel's cell limit.
+    """
+    if value is None or isinstance(value, (bool, int, float, datetime.date, datetime.time)):
+        return value
+    if not isinstance(value, str):
+        value = str(value)
+    return value[:XLSX_MAX_CELL_CHARS]
+
+
+def frame_rows(df: pd.DataFrame) -> Iterator[List[Any]]:
+    """Rows of ``df`` with Python scalars and NaN as None."""
+    for values in df.itertuples(index=False, name=None):
+        yield [_plain(v) for v in values]
+
+
+class _AtomicTarget:
+    """Write to a temporary sibling and rename over ``path`` only on success."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.tmp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex[:8]}.tmp")
+
+    def __enter__(self) -> Path:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        return self.tmp_path
+
+    def __exit__(self, exc_type, exc, tb) -> None:  # noqa: ANN001
+        if exc_type is None:
+            os.replace(self.tmp_path, self.path)
+        else:
+            self.tmp_path.unlink(missing_ok=True)
+
+
+def write_csv(path: Path, columns: Sequence[str], rows: Iterable[Row], chunk_rows: int = CSV_CHUNK_ROWS) -> Path:
+    """Stream rows to CSV, flushing every ``chunk_rows`` rows (same layout as ``DataFrame.to_csv``)."""
+    with _AtomicTarget(path) as tmp_path, tmp_path.open("w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f, lineterminator="\n")
+        writer.writerow(columns)
+        chunk: List[Row] = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= chunk_rows:
+                writer.writerows(chunk)
+                chunk.clear()
+        writer.writerows(chunk)
+    return path
+
+
+def write_xlsx(path: Path, columns: Sequence[str], rows: Iterable[Row], sheet_name: str = "Sheet1") -> Path:
+    """Stream rows to XLSX with openpyxl's write-only (constant memory) workbook."""
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(sheet_name)
+    bold = Font(bold=True)
+    header = []
+    for name in columns:
+        cell = WriteOnlyCell(sheet, value=name)
+        cell.font = bold
+        header.append(cell)
+    sheet.append(header)
+    for row in rows:
+        sheet.append([_xlsx_cell(v) for v in row])
+    with _AtomicTarget(path) as tmp_path:
+        workbook.save(tmp_path)
+    return path
+
+
+_WRITERS = {"csv": write_csv, "excel": write_xlsx}
+
+
+def snapshot_path(output_dir: Path, basename: str) -> Path:
+    return output_dir / f"{basename}{SNAPSHOT_SUFFIX}"
+
+
+def output_path(snapshot: Path, fmt: str) -> Path:
+    basename = snapshot.name[: -len(SNAPSHOT_SUFFIX)]
+    return snapshot.with_name(basename + FORMAT_SUFFIXES[fmt])
+
+
+def write_snapshot(path: Path, columns: Sequence[str], rows: Iterable[Row]) -> Tuple[Path, str, int]:
+    """Write a snapshot; returns ``(path, sha256 of its content, row count)``."""
+    digest = hashlib.sha256()
+    count = 0
+    with _AtomicTarget(path) as tmp_path, tmp_path.open("w", encoding="utf-8", newline="\n") as f:
+        for line in _snapshot_lines(columns, rows):
+            digest.update(line.encode("utf-8"))
+            f.write(line)
+            count += 1
+    return path, digest.hexdigest(), count - 1
+
+
+def _snapshot_lines(columns: Sequence[str], rows: Iterable[Row]) -> Iterator[str]:
+    yield json.dumps(list(columns), ensure_ascii=False) + "\n"
+    for row in rows:
+        yield json.dumps(list(row), ensure_ascii=False) + "\n"
+
+
+def read_snapshot(path: Path) -> Tuple[List[str], Iterator[List[Any]]]:
+    """Column names and a lazy row iterator (the file is read line by line)."""
+    f = path.open("r", encoding="utf-8")
+    columns = json.loads(f.readline())
+
+    def _rows() -> Iterator[List[Any]]:
+        with f:
+            for line in f:
+                yield json.loads(line)
+
+    return columns, _rows()
+
+
+def render(snapshot: Path, fmt: str) -> Path:
+    """
+    The ``fmt`` file for a snapshot, generated on first use and regenerated only
+    when the snapshot is newer than the cached file.
+    """
+    target = output_path(snapshot, fmt)
+    if target.exists() and target.stat().st_mtime_ns >= snapshot.stat().st_mtime_ns:
+        return target
+    columns, rows = read_snapshot(snapshot)
+    return _WRITERS[fmt](target, columns, rows)
+
+
+def write_outputs(
+    df: pd.DataFrame,
+    output_dir: Path,
+    basename: str,
+    formats: Sequence[str] = ("csv", "excel"),
+) -> Dict[str, Path]:
+    """
+    Store ``df`` as ``{basename}.rows.jsonl``, record it in the folder's
+    ``FinalManifest`` and render the requested formats now; other formats are
+    rendered by ``render`` when first needed. Stale renders from an earlier
+    snapshot with the same name are removed.
+    """
+    snapshot, sha256, rows = write_snapshot(
+        snapshot_path(output_dir, basename), list(df.columns), frame_rows(df)
+    )
+    FinalManifest(output_dir).record(basename, snapshot, sha256, rows)
+    outputs: Dict[str, Path] = {"snapshot": snapshot}
+    for fmt in FORMAT_SUFFIXES:
+        if fmt in formats:
+            outputs[fmt] = render(snapshot, fmt)
+        else:
+            output_path(snapshot, fmt).unlink(missing_ok=True)
+    return outputs
+
+
+def latest_snapshot(output_dir: Path, pattern: str) -> Optional[Path]:
+    """Most recently written snapshot whose basename matches the glob ``pattern``."""
+    entry = FinalManifest(output_dir).latest(pattern)
+    return entry["path"] if entry else None
+
+
+def render_all(output_dir: Path) -> List[Path]:
+    """Render every format of every snapshot in ``output_dir`` (e.g. before archiving)."""
+    rendered: List[Path] = []
+    for entry in FinalManifest(output_dir).entries():
+        if entry["kind"] == "snapshot":
+            rendered.extend(render(entry["path"], fmt) for fmt in FORMAT_SUFFIXES)
+    return rendered
+
+
+def _sha256_file(path: Path) -> str:
+    digest = hashlib.sha256()
+    with path.open("rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class FinalManifest:
+    """
+    Manifest of the finalized artifacts in an output folder (``_manifest.sqlite3``).
+
+    Every snapshot written by ``write_outputs`` is recorded with its content hash
+    and a sequence number, so the latest output for a name pattern is one query
+    instead of a glob and a stat of every file, and the set of hashes identifies
+    the folder's content for caching the download archive. Folders finalized
+    before the manifest existed are adopted once: their snapshots, and CSV/Excel
+    files without a snapshot (``kind="file"``), are recorded in mtime order.
+    """
+
+    def __init__(self, output_dir: Path):
+        self.output_dir = output_dir
+        self.db_path = output_dir / MANIFEST_NAME
+        output_dir.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS artifacts (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                    basename TEXT NOT NULL,
+                    kind TEXT NOT NULL,
+                    file TEXT NOT NULL UNIQUE,
+                    sha256 TEXT NOT NULL,
+                    rows INTEGER,
+                    recorded_at REAL NOT NULL
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS artifacts_basename ON artifacts (basename)")
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self._adopt_existing()
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        with closing(sqlite3.connect(self.db_path, timeout=30, isolation_level=None)) as conn:
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            yield conn
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    def _adopt_existing(self) -> None:
+        with self._connect() as conn:
+            if conn.execute("SELECT 1 FROM meta WHERE key = 'adopted'").fetchone():
+                return
+        snapshots = list(self.output_dir.glob(f"*{SNAPSHOT_SUFFIX}"))
+        rendered = {output_path(p, fmt) for p in snapshots for fmt in FORMAT_SUFFIXES}
+        legacy = [
+            p
+            for suffix in FORMAT_SUFFIXES.values()
+            for p in self.output_dir.rglob(f"*{suffix}")
+            if p not in rendered and not self._is_internal(p)
+        ]
+        found = sorted(snapshots + legacy, key=lambda p: p.stat().st_mtime)
+        with self._transaction() as conn:
+            if conn.execute("SELECT 1 FROM meta WHERE key = 'adopted'").fetchone():
+                return
+            for path in found:
+                is_snapshot = path.name.endswith(SNAPSHOT_SUFFIX)
+                self._insert(
+                    conn,
+                    path.name[: -len(SNAPSHOT_SUFFIX)] if is_snapshot else path.stem,
+                    "snapshot" if is_snapshot else "file",
+                    path,
+                    _sha256_file(path),
+                    None,
+                    path.stat().st_mtime,
+                )
+            conn.execute("INSERT INTO meta (key, value) VALUES ('adopted', '1')")
+
+    def _is_internal(self, path: Path) -> bool:
+        relative = path.relative_to(self.output_dir)
+        return relative.parts[0] == ARCHIVE_DIR or any(part.startswith(".") for part in relative.parts)
+
+    def _insert(
+        self,
+        conn: sqlite3.Connection,
+        basename: str,
+        kind: str,
+        path: Path,
+        sha256: str,
+        rows: Optional[int],
+        recorded_at: float,
+    ) -> None:
+        file = path.relative_to(self.output_dir).as_posix()
+        # Re-recording a file moves it to the end of the sequence.
+        conn.execute("DELETE FROM artifacts WHERE file = ?", (file,))
+        conn.execute(
+            "INSERT INTO artifacts (basename, kind, file, sha256, rows, recorded_at)"
+            " VALUES (?, ?, ?, ?, ?, ?)",
+            (basename, kind, file, sha256, rows, recorded_at),
+        )
+
+    def record(self, basename: str, path: Path, sha256: str, rows: Optional[int] = None) -> None:
+        with self._transaction() as conn:
+            self._insert(conn, basename, "snapshot", path, sha256, rows, time.time())
+
+    def _entry(self, row: sqlite3.Row) -> Dict[str, Any]:
+        return {
+            "basename": row["basename"],
+            "kind": row["kind"],
+            "path": self.output_dir / row["file"],
+            "sha256": row["sha256"],
+            "rows": row["rows"],
+            "seq": row["seq"],
+        }
+
+    def entries(self) -> List[Dict[str, Any]]:
+        """Recorded artifacts that still exist, oldest first."""
+        with self._connect() as conn:
+            rows = conn.execute("SELECT * FROM artifacts ORDER BY seq").fetchall()
+        return [e for e in map(self._entry, rows) if e["path"].exists()]
+
+    def latest(self, pattern: str, suffix: str = SNAPSHOT_SUFFIX) -> Optional[Dict[str, Any]]:
+        """
+        Newest artifact whose basename matches the glob ``pattern``: a snapshot by
+        default, or a legacy file with ``suffix`` (e.g. ``".csv"``).
+        """
+        kind = "snapshot" if suffix == SNAPSHOT_SUFFIX else "file"
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT * FROM artifacts WHERE kind = ? AND basename GLOB ? AND file LIKE ?"
+                " ORDER BY seq DESC",
+                (kind, pattern, f"%{suffix}"),
+            ).fetchall()
+        for row in rows:
+            entry = self._entry(row)
+            if entry["path"].exists():
+                return entry
+        return None
+
+    def digest(self) -> str:
+        """Hash of the recorded content; changes whenever an artifact does."""
+        digest = hashlib.sha1()
+        for entry in sorted(self.entries(), key=lambda e: e["path"].name):
+            digest.update(f"{entry['path'].name}:{entry['sha256']}\n".encode("utf-8"))
+        return digest.hexdigest()
+
+
+def build_archive(output_dir: Path, name: str) -> Tuple[Path, str]:
+    """
+    Zip of every finalized CSV/Excel in ``output_dir``, built once per manifest
+    content and reused until an artifact changes.
+
+    Older archives of the folder and temporary files left by interrupted writes
+    are removed, so at most one archive is kept.
+
+    Returns:
+        ``(archive_path, manifest_digest)``.
+    """
+    manifest = FinalManifest(output_dir)
+    digest = manifest.digest()
+    archive_dir = output_dir / ARCHIVE_DIR
+    archive = archive_dir / f"{name}-{digest[:16]}.zip"
+    if not archive.exists():
+        members: List[Path] = []
+        for entry in manifest.entries():
+            if entry["kind"] == "snapshot":
+                members.extend(render(entry["path"], fmt) for fmt in FORMAT_SUFFIXES)
+            else:
+                members.append(entry["path"])
+        with _AtomicTarget(archive) as tmp_path:
+            with zipfile.ZipFile(tmp_path, "w", zipfile.ZIP_DEFLATED) as zf:
+                for path in sorted(set(members)):
+                    zf.write(path, path.relative_to(output_dir).as_posix())
+    collect_garbage(output_dir, keep=archive)
+    return archive, digest
+
+
+def collect_garbage(output_dir: Path, keep: Optional[Path] = None) -> List[Path]:
+    """Remove archives other than ``keep`` and stale temporary files; returns what was removed."""
+    removed: List[Path] = []
+    archive_dir = output_dir / ARCHIVE_DIR
+    if archive_dir.exists():
+        for path in archive_dir.iterdir():
+            if path.suffix == ".zip" and path != keep:
+                path.unlink(missing_ok=True)
+                removed.append(path)
+    cutoff = time.time() - STALE_TMP_SECONDS
+    for folder in (output_dir, archive_dir):
+        if not folder.exists():
+            continue
+        for path in folder.glob(".*.tmp"):
+            try:
+                if path.stat().st_mtime < cutoff:
+                    path.unlink()
+                    removed.append(path)
+            except FileNotFoundError:
+                pass
+    return removed
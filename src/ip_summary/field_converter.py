@@ -5,10 +5,21 @@
 from __future__ import annotations
 
 from pathlib import Path
-from typing import Any, Dict, Optional, Union
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Sequence, Tuple, Union
 
 import yaml
 
+from .config_registry import registry
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+DEFAULT_MAPPINGS_PATH = (
+    Path(__file__).parent.parent.parent / "config" / "field_value_mappings.yaml"
+)
+# 每个字段缓存的不同取值上限，超过后清空，避免自由文本字段无限增长。
+_VALUE_CACHE_LIMIT = 10000
+
 
 def load_field_mappings(config_path: Path) -> Dict[str, Dict[str, int]]:
     """从YAML配置文件加载字段映射。
@@ -127,8 +138,43 @@ def convert_fields_to_codes(
     }
 
 
+class CompiledField:
+    """单个字段的预编译映射。
+
+    精确匹配用字典；模糊匹配按配置顺序扫描（与 ``convert_value_to_code`` 的
+    先到先得语义一致），结果按取值缓存，同一文字只匹配一次。
+    """
+
+    def __init__(self, mapping: Dict[str, int]):
+        self.exact = dict(mapping)
+        self.ordered: List[Tuple[str, int]] = list(mapping.items())
+        self._cache: Dict[str, Tuple[Any, bool]] = {}
+
+    def lookup(self, value_str: str) -> Tuple[Any, bool]:
+        """返回 (编号或原文字, 是否命中映射)。"""
+        hit = self._cache.get(value_str)
+        if hit is not None:
+            return hit
+        if value_str in self.exact:
+            hit = (self.exact[value_str], True)
+        else:
+            hit = (value_str, False)
+            for text, code in self.ordered:
+                if text in value_str or value_str in text:
+                    hit = (code, True)
+                    break
+        if len(self._cache) >= _VALUE_CACHE_LIMIT:
+            self._cache.clear()
+        self._cache[value_str] = hit
+        return hit
+
+
 class FieldConverter:
-    """字段值转换器，封装映射加载和转换功能。"""
+    """字段值转换器，封装映射加载和转换功能。
+
+    表头到映射表的解析按表头缓存，整列转换时每个不同取值只转换一次。
+    进程内复用请用 ``get_field_converter``。
+    """
 
     def __init__(self, config_path: Optional[Path] = None):
         """初始化转换器。
@@ -137,17 +183,89 @@ class FieldConverter:
             config_path: 映射配置文件路径，默认为 config/field_value_mappings.yaml
         """
         if config_path is None:
-            config_path = (
-                Path(__file__).parent.parent.parent
-                / "config"
-                / "field_value_mappings.yaml"
-            )
+            config_path = DEFAULT_MAPPINGS_PATH
         self.mappings = load_field_mappings(config_path)
+        self._compiled: Dict[str, Optional[CompiledField]] = {}
+
+    def compile_field(self, field_name: str) -> Optional[CompiledField]:
+        """表头对应的预编译映射；没有映射时返回 None。"""
+        if field_name not in self._compiled:
+            mapping = _find_mapping_for_field(field_name, self.mappings)
+            self._compiled[field_name] = CompiledField(mapping) if mapping else None
+        return self._compiled[field_name]
+
+    @staticmethod
+    def _convert_with(compiled: Optional[CompiledField], value: Any) -> Tuple[Any, bool]:
+        """按 ``convert_value_to_code`` 的规则转换；第二项表示有映射却未命中。"""
+        if value is None or isinstance(value, (int, float)):
+            return value, False
+        value_str = str(value).strip()
+        try:
+            return int(value_str), False
+        except ValueError:
+            pass
+        if compiled is None:
+            return value, False
+        code, hit = compiled.lookup(value_str)
+        return (code, False) if hit else (value, True)
 
     def convert(self, field_name: str, value: Any) -> Union[int, str, Any]:
         """转换单个字段值。"""
-        return convert_value_to_code(field_name, value, self.mappings)
+        return self._convert_with(self.compile_field(field_name), value)[0]
 
     def convert_all(self, fields: Dict[str, Any]) -> Dict[str, Any]:
         """批量转换字段值。"""
-        return convert_fields_to_codes(fields, self.mappings)
+        return {name: self.convert(name, value) for name, value in fields.items()}
+
+    def convert_column(self, field_name: str, values: Sequence[Any]) -> Tuple[List[Any], List[str]]:
+        """整列转换。
+
+        Returns:
+            (转换后的值列表, 有映射但未能转换的不同文字值)
+        """
+        compiled = self.compile_field(field_name)
+        converted: Dict[str, Tuple[Any, bool]] = {}
+        result: List[Any] = []
+        unmapped: List[str] = []
+        for value in values:
+            if type(value) is str:
+                hit = converted.get(value)
+                if hit is None:
+                    hit = converted[value] = self._convert_with(compiled, value)
+                    if hit[1]:
+                        unmapped.append(value)
+                result.append(hit[0])
+            else:
+                result.append(self._convert_with(compiled, value)[0])
+        return result, unmapped
+
+    def convert_frame(
+        self, df: pd.DataFrame, columns: Sequence[str]
+    ) -> Tuple[pd.DataFrame, Dict[str, List[str]]]:
+        """转换 DataFrame 中指定的列，其余列保持不变。
+
+        Returns:
+            (转换后的新 DataFrame, 字段名 -> 未能转换的文字值)
+        """
+        targets = set(columns)
+        data: Dict[int, Any] = {}
+        unmapped: Dict[str, List[str]] = {}
+        for i, name in enumerate(df.columns):
+            values = df.iloc[:, i]
+            if name in targets:
+                converted, missing = self.convert_column(name, values.tolist())
+                data[i] = converted
+                if missing:
+                    unmapped[name] = missing
+            else:
+                data[i] = values
+        import pandas as pd
+
+        out = pd.DataFrame(data, index=df.index)
+        out.columns = df.columns
+        return out, unmapped
+
+
+def get_field_converter(config_path: Optional[Path] = None) -> FieldConverter:
+    """进程内共享的转换器；映射文件内容变化后自动重新加载。"""
+    return registry.get([config_path or DEFAULT_MAPPINGS_PATH], FieldConverter)
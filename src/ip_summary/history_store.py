@@ -0,0 +1,236 @@
+from __future__ import annotations
+
+import json
+import math
+import sqlite3
+from contextlib import closing, contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from .models import DirectionLiteral
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# Per-row key columns aggregate_results adds for the history; not written to outputs.
+HISTORY_KEY_COLUMNS = ("_content_hash", "_prompt_version")
+
+
+def _clean(value: Any) -> Any:
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    if hasattr(value, "item"):
+        # numpy scalars from the DataFrame.
+        return value.item()
+    return value
+
+
+class HistoryStore:
+    """
+    Append-only history of finalized rows, one SQLite file per direction.
+
+    Rows are partitioned by the month they were recorded in (indexed ``month``
+    column) and keyed by contract content hash and prompt version: finalizing the
+    same contract again is a no-op unless its values changed, in which case the new
+    row supersedes the old one. Each append is a single transaction, so concurrent
+    finalizes cannot overwrite each other. An existing ``{direction}_history.csv``
+    is imported once.
+    """
+
+    def __init__(self, history_dir: Path, direction: DirectionLiteral):
+        self.history_dir = history_dir
+        self.direction = direction
+        self.db_path = history_dir / f"{direction}_history.sqlite3"
+        history_dir.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS history (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    month TEXT NOT NULL,
+                    recorded_at TEXT NOT NULL,
+                    row_key TEXT NOT NULL,
+                    prompt_version TEXT,
+                    contract_path TEXT,
+                    row TEXT NOT NULL,
+                    superseded INTEGER NOT NULL DEFAULT 0
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS history_month ON history (month)")
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS history_key ON history (row_key, superseded)"
+            )
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self._import_legacy_csv()
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        with closing(sqlite3.connect(self.db_path, timeout=30, isolation_level=None)) as conn:
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            yield conn
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    def _import_legacy_csv(self) -> None:
+        legacy = self.history_dir / f"{self.direction}_history.csv"
+        with self._connect() as conn:
+            done = conn.execute("SELECT 1 FROM meta WHERE key = 'legacy_csv_imported'").fetchone()
+        if done or not legacy.exists():
+            return
+        import pandas as pd
+
+        df = pd.read_csv(legacy)
+        recorded_at = datetime.fromtimestamp(legacy.stat().st_mtime).isoformat(timespec="seconds")
+        with self._transaction() as conn:
+            if conn.execute("SELECT 1 FROM meta WHERE key = 'legacy_csv_imported'").fetchone():
+                return
+            self._insert(conn, df, [("", "legacy")] * len(df), recorded_at)
+            conn.execute("INSERT INTO meta (key, value) VALUES ('legacy_csv_imported', ?)", (str(legacy),))
+
+    @staticmethod
+    def _insert(
+        conn: sqlite3.Connection,
+        df: pd.DataFrame,
+        keys: Sequence[Tuple[Optional[str], Optional[str]]],
+        recorded_at: str,
+    ) -> Tuple[int, int]:
+        month = recorded_at[:7]
+        columns = [c for c in df.columns if c not in HISTORY_KEY_COLUMNS]
+        added = superseded = 0
+        for values, (content_hash, prompt_version) in zip(
+            df[columns].itertuples(index=False, name=None), keys
+        ):
+            row = {c: _clean(v) for c, v in zip(columns, values)}
+            contract_path = row.get("合同源文件")
+            # Results without a content hash (Excel imports, legacy rows) are keyed by path.
+            row_key = f"{content_hash or contract_path}|{prompt_version or ''}"
+            row_json = json.dumps(row, ensure_ascii=False)
+            current = conn.execute(
+                "SELECT id, row FROM history WHERE row_key = ? AND superseded = 0", (row_key,)
+            ).fetchall()
+            if any(existing["row"] == row_json for existing in current):
+                continue
+            if current:
+                conn.executemany(
+                    "UPDATE history SET superseded = 1 WHERE id = ?",
+                    [(existing["id"],) for existing in current],
+                )
+                superseded += len(current)
+            conn.execute(
+                "INSERT INTO history (month, recorded_at, row_key, prompt_version, contract_path, row)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (month, recorded_at, row_key, prompt_version, contract_path, row_json),
+            )
+            added += 1
+        return added, superseded
+
+    def append(
+        self,
+        df: pd.DataFrame,
+        keys: Optional[Sequence[Tuple[Optional[str], Optional[str]]]] = None,
+    ) -> Dict[str, int]:
+        """
+        Record finalized rows atomically.
+
+        Args:
+            df: Aggregated rows; the ``HISTORY_KEY_COLUMNS`` are used as keys when
+                present and not stored.
+            keys: ``(content_hash, prompt_version)`` per row, overriding those columns.
+
+        Returns:
+            Counts of rows ``added``, ``unchanged`` (already recorded) and
+            ``superseded`` (older values replaced).
+        """
+        if keys is None:
+            if all(c in df.columns for c in HISTORY_KEY_COLUMNS):
+                keys = list(df[list(HISTORY_KEY_COLUMNS)].itertuples(index=False, name=None))
+            else:
+                keys = [(None, None)] * len(df)
+        recorded_at = datetime.now().isoformat(timespec="seconds")
+        with self._transaction() as conn:
+            added, superseded = self._insert(conn, df, keys, recorded_at)
+        return {"added": added, "unchanged": len(df) - added, "superseded": superseded}
+
+    def query(
+        self,
+        month_from: Optional[str] = None,
+        month_to: Optional[str] = None,
+        contract: Optional[str] = None,
+        prompt_version: Optional[str] = None,
+        include_superseded: bool = False,
+    ) -> pd.DataFrame:
+        """
+        Recorded rows as a DataFrame with ``记录时间`` prepended.
+
+        Args:
+            month_from / month_to: Inclusive ``YYYY-MM`` bounds.
+            contract: Substring of the contract source path.
+            prompt_version: Exact prompt version.
+            include_superseded: Also return rows replaced by later finalizes.
+        """
+        where, params = ["1 = 1"], []
+        if not include_superseded:
+            where.append("superseded = 0")
+        if month_from:
+            where.append("month >= ?")
+            params.append(month_from)
+        if month_to:
+            where.append("month <= ?")
+            params.append(month_to)
+        if contract:
+            where.append("contract_path LIKE ?")
+            params.append(f"%{contract}%")
+        if prompt_version:
+            where.append("prompt_version = ?")
+            params.append(prompt_version)
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"SELECT recorded_at, row FROM history WHERE {' AND '.join(where)} ORDER BY id",
+                params,
+            ).fetchall()
+        records: List[Dict[str, Any]] = [
+            {"记录时间": r["recorded_at"], **json.loads(r["row"])} for r in rows
+        ]
+        import pandas as pd
+
+        return pd.DataFrame.from_records(records)
+
+    def months(self) -> Dict[str, int]:
+        with self._connect() as conn:
+            return {
+                r["month"]: r["n"]
+                for r in conn.execute(
+                    "SELECT month, COUNT(*) AS n FROM history WHERE superseded = 0"
+                    " GROUP BY month ORDER BY month"
+                )
+            }
+
+    def compact(self, before_month: Optional[str] = None) -> Dict[str, int]:
+        """
+        Drop superseded rows (only from months before ``before_month`` if given)
+        and reclaim the file space.
+        """
+        with self._transaction() as conn:
+            if before_month:
+                cursor = conn.execute(
+                    "DELETE FROM history WHERE superseded = 1 AND month < ?", (before_month,)
+                )
+            else:
+                cursor = conn.execute("DELETE FROM history WHERE superseded = 1")
+            removed = cursor.rowcount
+        with self._connect() as conn:
+            conn.execute("VACUUM")
+            remaining = conn.execute("SELECT COUNT(*) FROM history").fetchone()[0]
+        return {"removed": removed, "remaining": remaining}
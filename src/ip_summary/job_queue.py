@@ -0,0 +1,259 @@
+from __future__ import annotations
+
+import json
+import sqlite3
+import time
+import uuid
+from contextlib import closing, contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+from pydantic import BaseModel, Field
+
+JOB_STATUSES = ("queued", "running", "done", "failed", "cancelled")
+# Requests the API leaves for the worker running a job.
+CONTROL_ACTIONS = ("pause", "resume", "cancel")
+
+
+class Job(BaseModel):
+    id: str
+    task_id: str
+    kind: str
+    params: Dict[str, Any] = Field(default_factory=dict)
+    status: str = "queued"
+    worker_id: Optional[str] = None
+    lease_expires: Optional[float] = None
+    attempts: int = 0
+    error: Optional[str] = None
+    control: Optional[str] = None
+    created_at: float
+    updated_at: float
+
+
+class JobActive(Exception):
+    """Raised by ``enqueue`` when the task already has a queued or running job."""
+
+    def __init__(self, job: Job):
+        super().__init__(f"Task {job.task_id} already has {job.status} job {job.id}")
+        self.job = job
+
+
+class JobQueue:
+    """
+    Durable job queue in a SQLite file shared by the API and any number of workers.
+
+    A worker claims a job with a lease and must heartbeat before the lease expires;
+    jobs whose lease lapsed (crashed or partitioned worker) are claimable again.
+    """
+
+    def __init__(self, db_path: Path, max_attempts: int = 3):
+        self.db_path = db_path
+        self.max_attempts = max_attempts
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    task_id TEXT NOT NULL,
+                    kind TEXT NOT NULL,
+                    params TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    worker_id TEXT,
+                    lease_expires REAL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    error TEXT,
+                    control TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+                """
+            )
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+            if "control" not in columns:
+                conn.execute("ALTER TABLE jobs ADD COLUMN control TEXT")
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_task ON jobs (task_id)")
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        # isolation_level=None: transactions are opened explicitly with BEGIN IMMEDIATE
+        # so that claim is a single atomic read-modify-write across processes.
+        with closing(sqlite3.connect(self.db_path, timeout=30, isolation_level=None)) as conn:
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            yield conn
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    @staticmethod
+    def _to_job(row: sqlite3.Row) -> Job:
+        data = dict(row)
+        data["params"] = json.loads(data["params"])
+        return Job(**data)
+
+    def enqueue(self, task_id: str, kind: str, params: Optional[Dict[str, Any]] = None) -> Job:
+        """
+        Queue a job for the task. Raises ``JobActive`` if the task already has a
+        queued or running job, so two workers never process one task at a time.
+        """
+        now = time.time()
+        job = Job(
+            id=uuid.uuid4().hex[:12],
+            task_id=task_id,
+            kind=kind,
+            params=params or {},
+            created_at=now,
+            updated_at=now,
+        )
+        with self._transaction() as conn:
+            active = conn.execute(
+                "SELECT * FROM jobs WHERE task_id = ? AND status IN ('queued', 'running')"
+                " ORDER BY created_at LIMIT 1",
+                (task_id,),
+            ).fetchone()
+            if active is not None:
+                raise JobActive(self._to_job(active))
+            conn.execute(
+                "INSERT INTO jobs (id, task_id, kind, params, status, attempts, created_at, updated_at)"
+                " VALUES (?, ?, ?, ?, 'queued', 0, ?, ?)",
+                (job.id, task_id, kind, json.dumps(job.params, ensure_ascii=False), now, now),
+            )
+        return job
+
+    def claim(self, worker_id: str, lease_seconds: float) -> Optional[Job]:
+        """Take the oldest queued job, or one whose worker stopped heartbeating."""
+        now = time.time()
+        with self._transaction() as conn:
+            while True:
+                row = conn.execute(
+                    "SELECT * FROM jobs WHERE status = 'queued'"
+                    " OR (status = 'running' AND lease_expires < ?)"
+                    " ORDER BY created_at LIMIT 1",
+                    (now,),
+                ).fetchone()
+                if row is None:
+                    return None
+                if row["status"] == "queued" or row["attempts"] < self.max_attempts:
+                    break
+                # Out of attempts: fail it and look at the next candidate.
+                conn.execute(
+                    "UPDATE jobs SET status = 'failed', error = ?, updated_at = ? WHERE id = ?",
+                    (f"lease expired {row['attempts']} times", now, row["id"]),
+                )
+            conn.execute(
+                "UPDATE jobs SET status = 'running', worker_id = ?, lease_expires = ?,"
+                " attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                (worker_id, now + lease_seconds, now, row["id"]),
+            )
+            claimed = conn.execute("SELECT * FROM jobs WHERE id = ?", (row["id"],)).fetchone()
+        return self._to_job(claimed)
+
+    def heartbeat(self, job_id: str, worker_id: str, lease_seconds: float) -> bool:
+        """Extend the lease; False means the job was taken over or finished elsewhere."""
+        now = time.time()
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET lease_expires = ?, updated_at = ?"
+                " WHERE id = ? AND worker_id = ? AND status = 'running'",
+                (now + lease_seconds, now, job_id, worker_id),
+            )
+        return cursor.rowcount == 1
+
+    def _finish(self, job_id: str, worker_id: str, status: str, error: Optional[str]) -> bool:
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, lease_expires = NULL, updated_at = ?"
+                " WHERE id = ? AND worker_id = ? AND status = 'running'",
+                (status, error, time.time(), job_id, worker_id),
+            )
+        return cursor.rowcount == 1
+
+    def complete(self, job_id: str, worker_id: str) -> bool:
+        return self._finish(job_id, worker_id, "done", None)
+
+    def mark_cancelled(self, job_id: str, worker_id: str) -> bool:
+        return self._finish(job_id, worker_id, "cancelled", None)
+
+    def request_control(self, task_id: str, action: str) -> List[Job]:
+        """
+        Ask whoever runs the task's active job to pause, resume or cancel it.
+
+        Queued jobs are cancelled on the spot (a pause is applied once claimed);
+        running ones pick the request up on their next heartbeat. Returns the
+        affected jobs.
+        """
+        if action not in CONTROL_ACTIONS:
+            raise ValueError(f"Unknown control action: {action}")
+        now = time.time()
+        with self._transaction() as conn:
+            rows = conn.execute(
+                "SELECT id, status FROM jobs WHERE task_id = ? AND status IN ('queued', 'running')",
+                (task_id,),
+            ).fetchall()
+            for row in rows:
+                if row["status"] == "queued" and action == "cancel":
+                    conn.execute(
+                        "UPDATE jobs SET status = 'cancelled', updated_at = ? WHERE id = ?",
+                        (now, row["id"]),
+                    )
+                else:
+                    conn.execute(
+                        "UPDATE jobs SET control = ?, updated_at = ? WHERE id = ?",
+                        (action, now, row["id"]),
+                    )
+            ids = [row["id"] for row in rows]
+        return [job for job in (self.get(job_id) for job_id in ids) if job is not None]
+
+    def requested_control(self, job_id: str) -> Optional[str]:
+        with self._connect() as conn:
+            row = conn.execute("SELECT control FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return row["control"] if row else None
+
+    def fail(self, job_id: str, worker_id: str, error: str) -> bool:
+        return self._finish(job_id, worker_id, "failed", error)
+
+    def release(self, job_id: str, worker_id: str) -> bool:
+        """Hand a claimed job back to the queue (e.g. on worker shutdown)."""
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = 'queued', worker_id = NULL, lease_expires = NULL,"
+                " attempts = MAX(attempts - 1, 0), updated_at = ?"
+                " WHERE id = ? AND worker_id = ? AND status = 'running'",
+                (time.time(), job_id, worker_id),
+            )
+        return cursor.rowcount == 1
+
+    def active_job(self, task_id: str) -> Optional[Job]:
+        """The task's queued or running job, if any."""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE task_id = ? AND status IN ('queued', 'running')"
+                " ORDER BY created_at LIMIT 1",
+                (task_id,),
+            ).fetchone()
+        return self._to_job(row) if row else None
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_job(row) if row else None
+
+    def list_jobs(self, task_id: Optional[str] = None) -> List[Job]:
+        with self._connect() as conn:
+            if task_id is None:
+                rows = conn.execute("SELECT * FROM jobs ORDER BY created_at").fetchall()
+            else:
+                rows = conn.execute(
+                    "SELECT * FROM jobs WHERE task_id = ? ORDER BY created_at", (task_id,)
+                ).fetchall()
+        return [self._to_job(row) for row in rows]
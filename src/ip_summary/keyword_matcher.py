@@ -0,0 +1,118 @@
+"""多关键词匹配模块。
+
+基于 Aho-Corasick 自动机，一次扫描合同全文即可找出所有关键词及其出现位置，
+扫描耗时基本不随关键词数量增长。
+"""
+from __future__ import annotations
+
+import re
+from collections import deque
+from dataclasses import dataclass
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+
+@dataclass(frozen=True)
+class KeywordHit:
+    """一次关键词命中。"""
+    keyword: str
+    start: int
+
+    @property
+    def end(self) -> int:
+        return self.start + len(self.keyword)
+
+
+class KeywordMatcher:
+    """预编译的 Aho-Corasick 关键词自动机。"""
+
+    def __init__(self, keywords: Iterable[str]):
+        """构建自动机。
+
+        Args:
+            keywords: 关键词列表，重复和空字符串会被忽略
+        """
+        self.keywords: List[str] = list(dict.fromkeys(k for k in keywords if k))
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[Tuple[int, ...]] = [()]
+        self._terminal: Set[int] = set()
+
+        for index, keyword in enumerate(self.keywords):
+            state = 0
+            for ch in keyword:
+                nxt = self._goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[state][ch] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append(())
+                state = nxt
+            self._out[state] += (index,)
+            self._terminal.add(state)
+
+        # 广度优先计算失败指针，并把后缀状态的输出合并进来
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fallback = self._fail[state]
+                while fallback and ch not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(ch, 0)
+                self._fail[nxt] = target if target != nxt else 0
+                self._out[nxt] += self._out[self._fail[nxt]]
+
+        # 位于根状态时没有进行中的部分匹配，可用正则（C 实现）直接跳到下一个
+        # 有关键词起始的位置，避免逐字在 Python 中推进
+        # 正则按字典树展开成嵌套分支，避免在每个位置逐一尝试全部关键词
+        self._start_re: Optional[re.Pattern[str]] = (
+            re.compile(self._trie_pattern(0)) if self.keywords else None
+        )
+
+    def _trie_pattern(self, state: int) -> str:
+        branches = []
+        for ch, nxt in self._goto[state].items():
+            # 到达某个关键词的结尾即可确定起始位置，无需继续展开
+            tail = "" if nxt in self._terminal else self._trie_pattern(nxt)
+            branches.append(re.escape(ch) + tail)
+        if len(branches) == 1:
+            return branches[0]
+        return "(?:" + "|".join(branches) + ")"
+
+    def iter_hits(self, text: str) -> Iterator[KeywordHit]:
+        """按结束位置顺序产出全部命中（含重叠命中）。"""
+        if self._start_re is None:
+            return
+        goto, fail, out, keywords = self._goto, self._fail, self._out, self.keywords
+        search = self._start_re.search
+        state = 0
+        i = 0
+        n = len(text)
+        while i < n:
+            if state == 0:
+                m = search(text, i)
+                if m is None:
+                    return
+                i = m.start()
+            ch = text[i]
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            for index in out[state]:
+                keyword = keywords[index]
+                yield KeywordHit(keyword=keyword, start=i - len(keyword) + 1)
+            i += 1
+
+    def find_all(self, text: str) -> List[KeywordHit]:
+        """返回全部命中。"""
+        return list(self.iter_hits(text))
+
+    def first_positions(self, text: str) -> Dict[str, int]:
+        """返回每个命中关键词首次出现的位置。"""
+        positions: Dict[str, int] = {}
+        for hit in self.iter_hits(text):
+            if hit.keyword not in positions or hit.start < positions[hit.keyword]:
+                positions[hit.keyword] = hit.start
+        return positions
@@ -1,19 +1,46 @@
 from __future__ import annotations
 
-from typing import Any, Dict, List, Optional
-
-from openai import AsyncOpenAI
+import asyncio
+import hashlib
+import json
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Dict, List, Optional
 
 from .config import LLMSettings
+from .tracing import annotate, span, start_span
+
+
+@dataclass
+class _InFlight:
+    task: "asyncio.Task[str]"
+    waiters: int = 0
+    abandoned: bool = False
+
+
+# Identical requests in flight across every client/task in this process.
+_IN_FLIGHT: Dict[str, _InFlight] = {}
+_STATS: Dict[str, int] = {"requests": 0, "api_calls": 0, "coalesced": 0}
+
+
+def single_flight_stats() -> Dict[str, int]:
+    """Counters for LLM requests, actual API calls and requests served by a shared call."""
+    return {**_STATS, "in_flight": len(_IN_FLIGHT)}
 
 
 class LLMClient:
     """
     Thin wrapper around the DeepSeek ChatCompletion API.
+
+    Concurrent identical requests (same endpoint, API key, model, sampling
+    parameters and messages) share one in-flight API call and all receive its result.
     """
 
     def __init__(self, settings: LLMSettings):
         self.settings = settings
+        # The SDK is imported here rather than at module level: it is the slowest
+        # import of the package and most commands never call the LLM.
+        from openai import AsyncOpenAI
+
         self.client = AsyncOpenAI(api_key=settings.api_key, base_url=settings.base_url)
 
     async def chat(
@@ -21,17 +48,146 @@ class LLMClient:
         messages: List[Dict[str, Any]],
         temperature: Optional[float] = None,
         max_output_tokens: Optional[int] = None,
+        gate: Optional[asyncio.Semaphore] = None,
+    ) -> str:
+        """
+        Send a chat request, joining an identical request already in flight.
+
+        ``gate`` is the caller's concurrency semaphore; it is only acquired when this
+        request actually reaches the API, so coalesced callers never occupy a slot.
+        When tracing, the wait for ``gate`` and the API request are recorded as
+        ``llm.queue`` and ``llm.request`` spans.
+        """
+        params = self._params(messages, temperature, max_output_tokens)
+        key = self._request_key(params)
+        _STATS["requests"] += 1
+
+        loop = asyncio.get_running_loop()
+        inflight = _IN_FLIGHT.get(key)
+        if (
+            inflight is not None
+            and not inflight.abandoned
+            and inflight.task.get_loop() is loop
+        ):
+            _STATS["coalesced"] += 1
+            annotate(coalesced=True)
+        else:
+            inflight = _InFlight(task=loop.create_task(self._gated_complete(params, gate)))
+            _IN_FLIGHT[key] = inflight
+            inflight.task.add_done_callback(lambda t, k=key: self._forget(k, t))
+
+        inflight.waiters += 1
+        try:
+            # shield: one caller being cancelled must not cancel the shared call.
+            return await asyncio.shield(inflight.task)
+        finally:
+            inflight.waiters -= 1
+            if inflight.waiters == 0 and not inflight.task.done():
+                # Every caller gave up: stop the API call and let new requests start fresh.
+                inflight.abandoned = True
+                inflight.task.cancel()
+
+    async def chat_stream(
+        self,
+        messages: List[Dict[str, Any]],
+        temperature: Optional[float] = None,
+        max_output_tokens: Optional[int] = None,
+        gate: Optional[asyncio.Semaphore] = None,
+    ) -> AsyncIterator[str]:
+        """
+        Stream a chat completion, yielding text deltas as they arrive.
+
+        Streams are never coalesced; ``gate`` is held for the whole stream.
+        """
+        params = self._params(messages, temperature, max_output_tokens)
+        _STATS["requests"] += 1
+        if gate is not None:
+            with span("llm.queue"):
+                await gate.acquire()
+        # Not made current: the consumer runs between the yields.
+        request = start_span("llm.request", stream=True)
+        try:
+            async for delta in self._stream(params):
+                yield delta
+        except BaseException as exc:
+            if request is not None:
+                request.end(exc)
+            raise
+        finally:
+            if request is not None:
+                request.end()
+            if gate is not None:
+                gate.release()
+
+    def _params(
+        self,
+        messages: List[Dict[str, Any]],
+        temperature: Optional[float],
+        max_output_tokens: Optional[int],
+    ) -> Dict[str, Any]:
+        return {
+            "model": self.settings.model,
+            "messages": messages,
+            "temperature": self._resolve_temperature(temperature),
+            "top_p": self.settings.top_p,
+            "max_tokens": max_output_tokens or self.settings.max_output_tokens,
+        }
+
+    async def _gated_complete(
+        self, params: Dict[str, Any], gate: Optional[asyncio.Semaphore]
     ) -> str:
+        if gate is None:
+            with span("llm.request"):
+                return await self._complete(params)
+        with span("llm.queue"):
+            await gate.acquire()
+        try:
+            with span("llm.request"):
+                return await self._complete(params)
+        finally:
+            gate.release()
+
+    async def _complete(self, params: Dict[str, Any]) -> str:
+        _STATS["api_calls"] += 1
         response = await self.client.chat.completions.create(
-            model=self.settings.model,
-            messages=messages,
-            temperature=self._resolve_temperature(temperature),
-            top_p=self.settings.top_p,
-            max_tokens=max_output_tokens or self.settings.max_output_tokens,
+            **params,
             timeout=self.settings.request_timeout,
         )
+        usage = getattr(response, "usage", None)
+        if usage is not None:
+            annotate(prompt_tokens=usage.prompt_tokens, completion_tokens=usage.completion_tokens)
         return response.choices[0].message.content or ""
 
+    async def _stream(self, params: Dict[str, Any]) -> AsyncIterator[str]:
+        _STATS["api_calls"] += 1
+        stream = await self.client.chat.completions.create(
+            **params,
+            stream=True,
+            timeout=self.settings.request_timeout,
+        )
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+    def _request_key(self, params: Dict[str, Any]) -> str:
+        # Calls are billed to the API key: only requests made with the same key
+        # share a call. A digest keeps the key itself out of the payload.
+        account = hashlib.sha256((self.settings.api_key or "").encode("utf-8")).hexdigest()
+        payload = json.dumps(
+            {"base_url": self.settings.base_url, "account": account, **params},
+            ensure_ascii=False,
+            sort_keys=True,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _forget(key: str, task: "asyncio.Task[str]") -> None:
+        if _IN_FLIGHT.get(key) is not None and _IN_FLIGHT[key].task is task:
+            del _IN_FLIGHT[key]
+        if not task.cancelled():
+            # Retrieve the exception so an abandoned failed call is not logged as unhandled.
+            task.exception()
+
     def _resolve_temperature(self, temperature: Optional[float]) -> float:
         if temperature is None:
             return self.settings.temperature
@@ -0,0 +1,76 @@
+"""短合同合并请求（micro-batching）模块。
+
+把若干篇幅较短的合同按字符预算打包进同一个分类/类型识别请求，
+每份合同带编号；拆包时逐项校验，编号不一致或答案无效的合同退回单独调用。
+"""
+from __future__ import annotations
+
+import json
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# 单个批次最多容纳的合同数，避免输出过长被截断
+MAX_ITEMS_PER_BATCH = 10
+
+
+def pack_batches(
+    items: Sequence[Tuple[str, str]],
+    budget_chars: int,
+    max_items: int = MAX_ITEMS_PER_BATCH,
+) -> List[List[Tuple[str, str]]]:
+    """按字符预算把 (编号, 文本) 顺序装箱。
+
+    Args:
+        items: (编号, 合同文本) 列表
+        budget_chars: 每个批次的合同文本总字符数上限（近似 token 预算）
+        max_items: 每个批次最多的合同数
+
+    Returns:
+        批次列表；只有一份合同的批次也会返回，由调用方决定是否单独调用
+    """
+    batches: List[List[Tuple[str, str]]] = []
+    current: List[Tuple[str, str]] = []
+    used = 0
+    for item in items:
+        size = len(item[1])
+        if current and (used + size > budget_chars or len(current) >= max_items):
+            batches.append(current)
+            current, used = [], 0
+        current.append(item)
+        used += size
+    if current:
+        batches.append(current)
+    return batches
+
+
+def parse_batch_results(
+    payload: Dict[str, object], expected_ids: Sequence[str]
+) -> Optional[Dict[str, Dict[str, object]]]:
+    """拆解批量请求的 JSON 结果。
+
+    Args:
+        payload: 模型返回并解析后的 JSON（期望形如 {"results": [{"id": ...}, ...]}）
+        expected_ids: 本批次发送的合同编号
+
+    Returns:
+        编号 -> 该合同的答案；返回的编号集合与发送的不一致（缺失、重复或多出）时返回None，
+        表示整批答案不可信
+    """
+    entries = payload.get("results") if isinstance(payload, dict) else None
+    if not isinstance(entries, list):
+        return None
+    answers: Dict[str, Dict[str, object]] = {}
+    for entry in entries:
+        if not isinstance(entry, dict):
+            return None
+        item_id = str(entry.get("id", "")).strip()
+        if item_id in answers:
+            return None
+        answers[item_id] = entry
+    if set(answers) != set(expected_ids):
+        return None
+    return answers
+
+
+def entry_json(entry: Dict[str, object]) -> str:
+    """单项答案的原始 JSON，用于记录 raw_response。"""
+    return json.dumps(entry, ensure_ascii=False)
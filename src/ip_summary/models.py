@@ -1,12 +1,30 @@
 from __future__ import annotations
 
+import base64
+import zlib
 from pathlib import Path
 from typing import Any, Dict, List, Literal, Optional
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, field_validator
 
 DirectionLiteral = Literal["upstream", "downstream"]
 
+# Machine-only text (raw LLM answers) may be stored zlib-compressed with this
+# prefix; it is decoded transparently when a result is loaded.
+COMPACT_PREFIX = "zlib+b64:"
+
+
+def encode_compact(text: Optional[str]) -> Optional[str]:
+    if not text:
+        return text
+    return COMPACT_PREFIX + base64.b64encode(zlib.compress(text.encode("utf-8"), 6)).decode("ascii")
+
+
+def decode_compact(value: Any) -> Any:
+    if isinstance(value, str) and value.startswith(COMPACT_PREFIX):
+        return zlib.decompress(base64.b64decode(value[len(COMPACT_PREFIX):])).decode("utf-8")
+    return value
+
 
 class LoadedDocument(BaseModel):
     path: Path
@@ -19,6 +37,13 @@ class ClassificationResult(BaseModel):
     confidence: float = Field(ge=0.0, le=1.0)
     reason: str
     raw_response: str
+    # "rules" when decided locally by direction_rules without an LLM call.
+    source: Literal["llm", "rules"] = "llm"
+
+    @field_validator("raw_response", mode="before")
+    @classmethod
+    def _decode_raw_response(cls, value: Any) -> Any:
+        return decode_compact(value)
 
 
 class ExtractionResult(BaseModel):
@@ -30,6 +55,26 @@ class ExtractionResult(BaseModel):
     classification: ClassificationResult
     prompt_version: str
     notes: Optional[str] = None
+    # Header names edited by a reviewer; targeted re-extraction leaves them untouched.
+    reviewed_fields: List[str] = Field(default_factory=list)
+    # Prompt version per stage and fingerprint of the header list used for extraction.
+    stage_versions: Dict[str, str] = Field(default_factory=dict)
+    headers_hash: Optional[str] = None
+    # Whitespace-normalised text hash, near-duplicate template cluster, and the
+    # contract whose result was reused when this one is an exact duplicate.
+    content_hash: Optional[str] = None
+    cluster_id: Optional[str] = None
+    duplicate_of: Optional[str] = None
+    # False while the contract note is still being generated.
+    completed: bool = True
+    # Intermediate file name (without .json), see storage.result_key; None for
+    # results written before keys existed, which are named after the contract stem.
+    storage_key: Optional[str] = None
+
+    @field_validator("raw_extraction", mode="before")
+    @classmethod
+    def _decode_raw_extraction(cls, value: Any) -> Any:
+        return decode_compact(value)
 
 
 class HeaderDefinition(BaseModel):
@@ -1,15 +1,22 @@
 from __future__ import annotations
 
 import asyncio
+import hashlib
 import json
+from functools import lru_cache
 from pathlib import Path
-from typing import Dict, List, Optional
-
-from tqdm.asyncio import tqdm_asyncio
+from typing import Callable, Collection, Dict, List, Optional, Sequence, Tuple
 
 from .config import Settings
-from .document_loader import load_document, scan_documents
+from .config_registry import registry
+from .dedup import find_duplicates
+from .direction_rules import classify_direction_by_rules
+from .document_loader import PARSE_CACHE_DIR, load_document, load_documents, scan_documents
+from .history_store import HISTORY_KEY_COLUMNS
 from .llm_client import LLMClient
+from .micro_batch import entry_json, pack_batches, parse_batch_results
+from .run_control import RunControl, checkpoint, current_run_control
+from .tracing import TRACE_FILE, annotate, span, trace_run, traced
 from .models import (
     ClassificationResult,
     DirectionLiteral,
@@ -19,6 +26,10 @@ from .models import (
 )
 from .prompts import (
     PROMPT_VERSION,
+    BATCH_STAGE_PROMPT_VERSIONS,
+    STAGE_PROMPT_VERSIONS,
+    build_batch_classification_messages,
+    build_batch_type_classification_messages,
     build_classification_messages,
     build_extraction_messages,
     build_type_classification_messages,
@@ -26,29 +37,74 @@ from .prompts import (
 )
 from .contract_types import (
     ContractType,
-    load_contract_types,
-    identify_contract_type_by_keywords,
+    get_contract_types,
+    match_type_keywords,
     get_type_names_for_prompt,
 )
+from .field_converter import _normalize_field_name
 from .storage import (
     aggregate_results,
     append_history,
     ensure_directories,
+    IntermediateWriter,
     load_header_columns,
-    save_intermediate,
+    load_intermediate,
+    result_key,
     write_tabular_outputs,
 )
 
 
-def load_headers(upstream_path: Path, downstream_path: Path) -> HeaderDefinition:
+def _read_headers(upstream_path: Path, downstream_path: Path) -> HeaderDefinition:
     return HeaderDefinition(
         upstream_headers=load_header_columns(upstream_path),
         downstream_headers=load_header_columns(downstream_path),
     )
 
 
+def load_headers(upstream_path: Path, downstream_path: Path) -> HeaderDefinition:
+    """Header lists of both workbooks, parsed once per process until a workbook changes."""
+    return registry.get([upstream_path, downstream_path], _read_headers)
+
+
+def headers_fingerprint(headers: Sequence[str]) -> str:
+    return _fingerprint(tuple(headers))
+
+
+@lru_cache(maxsize=64)
+def _fingerprint(headers: Tuple[str, ...]) -> str:
+    digest = hashlib.sha1(json.dumps(list(headers), ensure_ascii=False).encode("utf-8"))
+    return digest.hexdigest()[:12]
+
+
+def _trace_path(settings: Settings) -> Optional[Path]:
+    if not settings.pipeline.tracing:
+        return None
+    return settings.pipeline.intermediate_dir / TRACE_FILE
+
+
+def _stage_versions(stages: Sequence[str], batched: Collection[str] = ()) -> Dict[str, str]:
+    """Prompt version per stage; ``batched`` stages were answered by a micro-batch prompt."""
+    return {
+        stage: BATCH_STAGE_PROMPT_VERSIONS[stage] if stage in batched else STAGE_PROMPT_VERSIONS[stage]
+        for stage in stages
+    }
+
+
+def _is_current(stage: str, version: str) -> bool:
+    return version in (STAGE_PROMPT_VERSIONS[stage], BATCH_STAGE_PROMPT_VERSIONS.get(stage))
+
+
+def _headers_for(headers: HeaderDefinition, direction: DirectionLiteral) -> List[str]:
+    return headers.upstream_headers if direction == "upstream" else headers.downstream_headers
+
+
 NOTE_TEMPLATES_PATH = Path(__file__).parent.parent.parent / "config" / "contract_note_templates.yaml"
 
+# Streamed note text is written to the intermediate JSON every this many new characters.
+NOTE_FLUSH_CHARS = 200
+
+ProgressCallback = Callable[[Dict[str, object]], None]
+
 
 async def process_contracts(
     settings: Settings,
@@ -57,6 +113,50 @@ async def process_contracts(
     downstream_header_path: Path,
     force_direction: Optional[DirectionLiteral] = None,
     note_templates_path: Optional[Path] = None,
+    on_event: Optional[ProgressCallback] = None,
+    paths: Optional[Sequence[Path]] = None,
+    control: Optional[RunControl] = None,
+) -> List[ExtractionResult]:
+    """
+    Classify, extract and annotate every contract in the input directory
+    (or only ``paths`` when given, e.g. one shard of it).
+
+    Each result is saved as soon as its fields are extracted (``completed=False``);
+    the contract note is then streamed into the same file. ``on_event`` receives
+    progress events: classified, extracted, note (text so far) and completed.
+    ``control`` pauses or cancels the run; after cancellation only the contracts
+    that finished are returned. With ``pipeline.tracing`` the time spent per
+    contract and stage is recorded (see ``tracing``).
+    """
+    control = control or RunControl()
+    token = current_run_control.set(control)
+    try:
+        with trace_run(_trace_path(settings), "run"):
+            return await _process_contracts(
+                settings,
+                my_party,
+                upstream_header_path,
+                downstream_header_path,
+                force_direction,
+                note_templates_path,
+                on_event,
+                paths,
+                control,
+            )
+    finally:
+        current_run_control.reset(token)
+
+
+async def _process_contracts(
+    settings: Settings,
+    my_party: str,
+    upstream_header_path: Path,
+    downstream_header_path: Path,
+    force_direction: Optional[DirectionLiteral],
+    note_templates_path: Optional[Path],
+    on_event: Optional[ProgressCallback],
+    paths: Optional[Sequence[Path]],
+    control: RunControl,
 ) -> List[ExtractionResult]:
     headers = load_headers(upstream_header_path, downstream_header_path)
     ensure_directories(
@@ -69,33 +169,40 @@ async def process_contracts(
     templates_path = note_templates_path or NOTE_TEMPLATES_PATH
     contract_types = {}
     if templates_path.exists():
-        contract_types = load_contract_types(templates_path)
+        contract_types = get_contract_types(templates_path)
 
-    paths = scan_documents(settings.pipeline.input_dir)
-    documents = [load_document(p) for p in paths]
+    if paths is None:
+        paths = scan_documents(settings.pipeline.input_dir)
+    documents = await asyncio.to_thread(
+        load_documents, paths, settings.pipeline.intermediate_dir / PARSE_CACHE_DIR
+    )
     client = LLMClient(settings.llm)
     semaphore = asyncio.Semaphore(settings.pipeline.concurrent_requests)
-
-    async def _run(loaded: LoadedDocument) -> ExtractionResult:
-        classification = await _classify(loaded.text, my_party, client, semaphore)
-        direction = force_direction or classification.direction
-        header_list = (
-            headers.upstream_headers if direction == "upstream" else headers.downstream_headers
+    writer = IntermediateWriter(settings.pipeline.intermediate_dir, settings.pipeline.compact_intermediate)
+
+    async def _run(loaded: LoadedDocument, index: int) -> ExtractionResult:
+        batched_classification, batched_type = None, None
+        if index in short_indexes:
+            batched = await batch_stage
+            batched_classification = batched[0].get(index)
+            batched_type = batched[1].get(index)
+        classification = batched_classification or await _classify_direction(
+            loaded.text, my_party, client, semaphore, settings.pipeline.direction_rules_threshold
         )
+        # Stages whose answer came from a packed request (not the local rules).
+        batched_stages = set()
+        if batched_classification is not None and batched_classification.source == "llm":
+            batched_stages.add("classification")
+        if batched_type is not None:
+            batched_stages.add("contract_type")
+        direction = force_direction or classification.direction
+        annotate(direction=direction)
+        _emit("classified", loaded.path, direction, confidence=classification.confidence)
+        header_list = _headers_for(headers, direction)
         extraction, raw_extraction = await _extract(
             loaded.text, header_list, my_party, direction, client, semaphore
         )
-
-        # Generate contract note based on type
-        contract_note = None
-        contract_type_name = None
-        if contract_types:
-            contract_type_name, contract_note = await _generate_contract_note(
-                loaded.text, my_party, contract_types, client, semaphore
-            )
-            # Set the note in the extracted fields if "合同备注" is a field
-            if "合同备注" in extraction:
-                extraction["合同备注"] = contract_note
+        stages = ["classification", "extraction"]
 
         result = ExtractionResult(
             contract_path=loaded.path,
@@ -105,16 +212,563 @@ async def process_contracts(
             raw_extraction=raw_extraction,
             classification=classification,
             prompt_version=PROMPT_VERSION,
-            notes=f"合同类型：{contract_type_name}" if contract_type_name else None,
+            stage_versions=_stage_versions(stages, batched_stages),
+            headers_hash=headers_fingerprint(header_list),
+            content_hash=report.content_hashes[index],
+            cluster_id=report.cluster_ids.get(index),
+            completed=not contract_types,
+            storage_key=result_key(loaded.path, settings.pipeline.input_dir),
         )
-        save_intermediate(result, settings.pipeline.intermediate_dir)
+        # Fields are usable before the (slow) note is generated.
+        await writer.save(result)
+        _emit("extracted", loaded.path, direction)
+
+        # Generate contract note based on type
+        if contract_types:
+            flushed = 0
+
+            def _on_note_text(text: str) -> None:
+                nonlocal flushed
+                if len(text) - flushed < NOTE_FLUSH_CHARS:
+                    return
+                flushed = len(text)
+                if "合同备注" in result.fields:
+                    result.fields["合同备注"] = text
+                    writer.submit(result)
+                _emit("note", loaded.path, direction, text=text)
+
+            contract_type_name, contract_note = await _generate_contract_note(
+                loaded.text,
+                my_party,
+                contract_types,
+                client,
+                semaphore,
+                batched_type,
+                on_text=_on_note_text,
+            )
+            # Set the note in the extracted fields if "合同备注" is a field
+            if "合同备注" in result.fields:
+                result.fields["合同备注"] = contract_note
+            stages += ["contract_type", "note"]
+            result.notes = f"合同类型：{contract_type_name}" if contract_type_name else None
+            result.stage_versions = _stage_versions(stages, batched_stages)
+            result.completed = True
+            await writer.save(result)
+
+        _emit("completed", loaded.path, direction)
         return result
 
-    tasks = [_run(doc) for doc in documents]
-    results = await tqdm_asyncio.gather(*tasks)
+    def _emit(event: str, contract_path: Path, direction: DirectionLiteral, **data: object) -> None:
+        if on_event is None:
+            return
+        on_event(
+            {
+                "event": event,
+                "contract": contract_path.name,
+                "filename": f"{result_key(contract_path, settings.pipeline.input_dir)}.json",
+                "direction": direction,
+                **data,
+            }
+        )
+
+    # Exact duplicates reuse the first copy's result instead of calling the LLM again.
+    report = await asyncio.to_thread(
+        find_duplicates,
+        [doc.text for doc in documents],
+        settings.pipeline.near_duplicate_threshold,
+    )
+    primaries = [i for i in range(len(documents)) if i not in report.exact_duplicate_of]
+
+    # Short contracts share batched classification / type-identification requests;
+    # long ones start straight away without waiting for the batches.
+    max_chars = settings.pipeline.micro_batch_max_chars
+    short_indexes = {
+        i for i in primaries if max_chars is not None and len(documents[i].text) <= max_chars
+    }
+    batch_stage = asyncio.ensure_future(
+        _micro_batch_stage(
+            {i: documents[i].text for i in sorted(short_indexes)},
+            my_party,
+            contract_types,
+            client,
+            semaphore,
+            settings.pipeline.direction_rules_threshold,
+            settings.pipeline.micro_batch_budget_chars,
+        )
+    )
+    control.track(batch_stage)
+
+    from tqdm import tqdm
+
+    progress = tqdm(total=len(primaries))
+
+    async def _counted(loaded: LoadedDocument, index: int) -> ExtractionResult:
+        try:
+            filename = f"{result_key(loaded.path, settings.pipeline.input_dir)}.json"
+            with span("contract", contract=str(loaded.path), filename=filename):
+                return await _run(loaded, index)
+        finally:
+            progress.update(1)
+
+    with progress:
+        outputs = await control.gather([_counted(documents[i], i) for i in primaries])
+    # Contracts stopped by cancellation have no result; saved ones are kept.
+    by_index = {i: r for i, r in zip(primaries, outputs) if r is not None}
+
+    input_dir = settings.pipeline.input_dir
+    for index, original in report.exact_duplicate_of.items():
+        if original not in by_index:
+            continue
+        source = by_index[original]
+        # Relative path, not the bare name: same-named files in other subfolders differ.
+        source_path = source.contract_path
+        if source_path.is_relative_to(input_dir):
+            source_path = source_path.relative_to(input_dir)
+        duplicate = source.model_copy(
+            update={
+                "contract_path": documents[index].path,
+                "duplicate_of": source_path.as_posix(),
+                "storage_key": result_key(documents[index].path, settings.pipeline.input_dir),
+            },
+            deep=True,
+        )
+        await writer.save(duplicate)
+        _emit("completed", duplicate.contract_path, duplicate.direction)
+        by_index[index] = duplicate
+
+    # Streamed-note writes still in flight.
+    await writer.flush()
+    return [by_index[i] for i in range(len(documents)) if i in by_index]
+
+
+def select_headers(requested: Sequence[str], available: Sequence[str]) -> List[str]:
+    """
+    Resolve user-supplied header names against the header file.
+
+    Headers carry option descriptions (e.g. '合同类型 1：主合同...'), so a bare
+    prefix such as '合同类型' is accepted when it is unambiguous.
+    """
+    selected: List[str] = []
+    for name in requested:
+        name = name.strip()
+        if name in available:
+            matches = [name]
+        else:
+            matches = [h for h in available if _normalize_field_name(h) == name]
+            if not matches:
+                matches = [h for h in available if h.startswith(name)]
+        if len(matches) != 1:
+            reason = "not found" if not matches else f"ambiguous ({len(matches)} matches)"
+            raise ValueError(f"Header '{name}' {reason}")
+        if matches[0] not in selected:
+            selected.append(matches[0])
+    return selected
+
+
+async def reextract_fields(
+    settings: Settings,
+    headers: HeaderDefinition,
+    direction: DirectionLiteral,
+    filenames: Sequence[str],
+    requested_headers: Sequence[str],
+    include_reviewed: bool = False,
+    note_templates_path: Optional[Path] = None,
+    control: Optional[RunControl] = None,
+) -> Dict[str, List[str]]:
+    """
+    Re-run extraction for a subset of headers on selected intermediate results.
+
+    Only the chosen headers are sent to the LLM (a reduced JSON template), and the
+    answers are merged into the existing JSON. Fields listed in
+    ``reviewed_fields`` are kept as-is unless ``include_reviewed`` is set.
+
+    Returns a mapping of filename -> headers that were actually updated (contracts
+    stopped by ``control`` cancellation are left out).
+    """
+    control = control or RunControl()
+    header_list = _headers_for(headers, direction)
+    selected = select_headers(requested_headers, header_list)
+    folder = settings.pipeline.intermediate_dir / direction
+    missing = [name for name in filenames if not (folder / name).exists()]
+    if missing:
+        raise FileNotFoundError(f"Intermediate results not found: {', '.join(missing)}")
+
+    contract_types: Dict[str, ContractType] = {}
+    templates_path = note_templates_path or NOTE_TEMPLATES_PATH
+    if "合同备注" in selected and templates_path.exists():
+        contract_types = get_contract_types(templates_path)
+
+    client = LLMClient(settings.llm)
+    semaphore = asyncio.Semaphore(settings.pipeline.concurrent_requests)
+    writer = IntermediateWriter(settings.pipeline.intermediate_dir, settings.pipeline.compact_intermediate)
+
+    async def _run(filename: str) -> List[str]:
+        result = load_intermediate(folder / filename)
+        annotate(contract=str(result.contract_path), direction=direction)
+        targets = [
+            h for h in selected if include_reviewed or h not in result.reviewed_fields
+        ]
+        if not targets:
+            return []
+        loaded = await asyncio.to_thread(
+            load_document, result.contract_path, settings.pipeline.intermediate_dir / PARSE_CACHE_DIR
+        )
+
+        updates: Dict[str, object] = {}
+        extract_headers = [h for h in targets if not (h == "合同备注" and contract_types)]
+        if extract_headers:
+            extraction, _ = await _extract(
+                loaded.text, extract_headers, result.my_party, direction, client, semaphore
+            )
+            updates.update(extraction)
+        if len(extract_headers) < len(targets):
+            _, updates["合同备注"] = await _generate_contract_note(
+                loaded.text, result.my_party, contract_types, client, semaphore
+            )
+
+        result.fields.update(updates)
+        if include_reviewed:
+            result.reviewed_fields = [h for h in result.reviewed_fields if h not in updates]
+        await writer.save(result)
+        return list(updates)
+
+    async def _traced_run(filename: str) -> List[str]:
+        with span("contract", filename=filename):
+            return await _run(filename)
+
+    with trace_run(_trace_path(settings), "reextract"):
+        updated = await control.gather([_traced_run(name) for name in filenames])
+    return {name: headers for name, headers in zip(filenames, updated) if headers is not None}
+
+
+def stale_stages(result: ExtractionResult, header_list: Sequence[str]) -> List[str]:
+    """
+    Return the pipeline stages whose output predates the current prompts/headers.
+
+    Results written before per-stage versions existed are treated as produced
+    entirely by their ``prompt_version``. Excel imports are user-authored and
+    never considered stale. Incomplete results also need their note stages.
+    """
+    if result.prompt_version == "excel_import":
+        return []
+    recorded = result.stage_versions or {
+        stage: result.prompt_version for stage in STAGE_PROMPT_VERSIONS
+    }
+    # Stages absent from the record never ran for this result (e.g. no note templates).
+    stale = [
+        stage
+        for stage in STAGE_PROMPT_VERSIONS
+        if stage in recorded and not _is_current(stage, recorded[stage])
+    ]
+    if "extraction" not in stale:
+        if result.headers_hash is not None:
+            headers_changed = result.headers_hash != headers_fingerprint(header_list)
+        else:
+            headers_changed = set(result.fields) != set(header_list)
+        if headers_changed:
+            stale.insert(1 if "classification" in stale else 0, "extraction")
+    if not result.completed:
+        # Interrupted before the streamed note finished.
+        stale += [stage for stage in ("contract_type", "note") if stage not in stale]
+    return stale
+
+
+def _find_stale_results(
+    intermediate_dir: Path, headers: HeaderDefinition
+) -> List[tuple[Path, ExtractionResult, List[str]]]:
+    found = []
+    for direction in ("upstream", "downstream"):
+        folder = intermediate_dir / direction
+        for path in sorted(folder.glob("*.json")):
+            result = load_intermediate(path)
+            stages = stale_stages(result, _headers_for(headers, result.direction))
+            found.append((path, result, stages))
+    return found
+
+
+def prompt_version_inventory(
+    intermediate_dir: Path, headers: HeaderDefinition
+) -> Dict[str, object]:
+    """
+    Summarise intermediate results by prompt version and count stale stages.
+    """
+    by_version: Dict[str, Dict[str, int]] = {}
+    stale_counts: Dict[str, int] = {stage: 0 for stage in STAGE_PROMPT_VERSIONS}
+    stale_files: Dict[str, List[str]] = {}
+    missing_sources: List[str] = []
+    for path, result, stages in _find_stale_results(intermediate_dir, headers):
+        counts = by_version.setdefault(result.prompt_version, {"upstream": 0, "downstream": 0})
+        counts[result.direction] += 1
+        for stage in stages:
+            stale_counts[stage] += 1
+        if stages:
+            stale_files[f"{result.direction}/{path.name}"] = stages
+            if not result.contract_path.exists():
+                missing_sources.append(f"{result.direction}/{path.name}")
+    return {
+        "current_version": PROMPT_VERSION,
+        "stage_versions": dict(STAGE_PROMPT_VERSIONS),
+        "batch_stage_versions": dict(BATCH_STAGE_PROMPT_VERSIONS),
+        "by_version": by_version,
+        "stale_stages": stale_counts,
+        "stale_files": stale_files,
+        # Stale results whose contract file is gone cannot be re-run.
+        "missing_sources": missing_sources,
+    }
+
+
+async def reprocess_stale(
+    settings: Settings,
+    headers: HeaderDefinition,
+    note_templates_path: Optional[Path] = None,
+    control: Optional[RunControl] = None,
+) -> Dict[str, List[str]]:
+    """
+    Re-run only the outdated stages for results produced by older prompts or headers.
+
+    Classification is repeated only when its own prompt changed; if the direction
+    flips, the result moves folders and extraction/note run for the new direction.
+    Reviewed fields keep their values; results whose contract file no longer
+    exists are skipped. Returns filename -> stages re-run (contracts stopped by
+    ``control`` cancellation are left out).
+    """
+    control = control or RunControl()
+    intermediate_dir = settings.pipeline.intermediate_dir
+    pending = [
+        item
+        for item in _find_stale_results(intermediate_dir, headers)
+        if item[2] and item[1].contract_path.exists()
+    ]
+
+    templates_path = note_templates_path or NOTE_TEMPLATES_PATH
+    contract_types: Dict[str, ContractType] = {}
+    if templates_path.exists():
+        contract_types = get_contract_types(templates_path)
+
+    client = LLMClient(settings.llm)
+    semaphore = asyncio.Semaphore(settings.pipeline.concurrent_requests)
+    writer = IntermediateWriter(intermediate_dir, settings.pipeline.compact_intermediate)
+
+    async def _run(path: Path, result: ExtractionResult, stages: List[str]) -> List[str]:
+        loaded = await asyncio.to_thread(
+            load_document, result.contract_path, settings.pipeline.intermediate_dir / PARSE_CACHE_DIR
+        )
+        rerun = list(stages)
+        versions = dict(result.stage_versions) or {
+            stage: result.prompt_version for stage in STAGE_PROMPT_VERSIONS
+        }
+        previous_direction = result.direction
+        ran: List[str] = []
+
+        if "classification" in stages:
+            result.classification = await _classify_direction(
+                loaded.text,
+                result.my_party,
+                client,
+                semaphore,
+                settings.pipeline.direction_rules_threshold,
+            )
+            result.direction = result.classification.direction
+            ran.append("classification")
+            if result.direction != previous_direction:
+                rerun = list(dict.fromkeys(rerun + ["extraction", "contract_type", "note"]))
+
+        header_list = _headers_for(headers, result.direction)
+        reviewed = {h: result.fields[h] for h in result.reviewed_fields if h in result.fields}
+
+        if "extraction" in rerun:
+            extraction, result.raw_extraction = await _extract(
+                loaded.text, header_list, result.my_party, result.direction, client, semaphore
+            )
+            if "合同备注" in extraction and "合同备注" in result.fields:
+                extraction["合同备注"] = result.fields["合同备注"]
+            result.fields = extraction
+            result.headers_hash = headers_fingerprint(header_list)
+            ran.append("extraction")
+
+        if contract_types and ({"contract_type", "note"} & set(rerun)):
+            known_type = None
+            if "contract_type" not in rerun and result.notes and result.notes.startswith("合同类型："):
+                known_type = result.notes[len("合同类型："):]
+            contract_type_name, contract_note = await _generate_contract_note(
+                loaded.text,
+                result.my_party,
+                contract_types,
+                client,
+                semaphore,
+                contract_type_name=known_type,
+            )
+            if "合同备注" in result.fields:
+                result.fields["合同备注"] = contract_note
+            result.notes = f"合同类型：{contract_type_name}"
+            ran += ["note"] if known_type else ["contract_type", "note"]
+
+        result.fields.update({h: v for h, v in reviewed.items() if h in header_list})
+        result.reviewed_fields = [h for h in result.reviewed_fields if h in header_list]
+        versions.update(_stage_versions(ran))
+        result.stage_versions = versions
+        if all(_is_current(stage, version) for stage, version in versions.items()):
+            result.prompt_version = PROMPT_VERSION
+        result.completed = True
+
+        saved = await writer.save(result)
+        if saved != path:
+            path.unlink(missing_ok=True)
+        return ran
+
+    async def _traced_run(path: Path, result: ExtractionResult, stages: List[str]) -> List[str]:
+        attributes = {"contract": str(result.contract_path), "filename": path.name}
+        with span("contract", stages=",".join(stages), **attributes):
+            return await _run(path, result, stages)
+
+    with trace_run(_trace_path(settings), "reprocess"):
+        done = await control.gather([_traced_run(*item) for item in pending])
+    return {
+        f"{item[1].direction}/{item[0].name}": stages
+        for item, stages in zip(pending, done)
+        if stages is not None
+    }
+
+
+async def _micro_batch_stage(
+    texts: Dict[int, str],
+    my_party: str,
+    contract_types: Dict[str, ContractType],
+    client: LLMClient,
+    semaphore: asyncio.Semaphore,
+    rules_threshold: Optional[float],
+    budget_chars: int,
+) -> Tuple[Dict[int, ClassificationResult], Dict[int, str]]:
+    """
+    Classify direction and identify contract type for short contracts in packed
+    requests. Returns per-index classifications and contract type names.
+    """
+    classifications: Dict[int, ClassificationResult] = {}
+    pending: List[Tuple[str, str]] = []
+    for index, text in texts.items():
+        local = _rules_decision(text, my_party, rules_threshold)
+        if local is not None:
+            classifications[index] = local
+        else:
+            pending.append((str(index), text))
+
+    type_items = [(str(index), text) for index, text in texts.items()] if contract_types else []
+    batch_jobs = [
+        _classify_batch(batch, my_party, client, semaphore)
+        for batch in pack_batches(pending, budget_chars)
+    ] + [
+        _identify_types_batch(batch, contract_types, client, semaphore)
+        for batch in pack_batches(type_items, budget_chars)
+    ]
+    contract_type_names: Dict[int, str] = {}
+    for answers in await asyncio.gather(*batch_jobs):
+        for item_id, answer in answers.items():
+            if isinstance(answer, ClassificationResult):
+                classifications[int(item_id)] = answer
+            else:
+                contract_type_names[int(item_id)] = answer
+    return classifications, contract_type_names
+
+
+@traced("classify_batch")
+async def _classify_batch(
+    items: List[Tuple[str, str]],
+    my_party: str,
+    client: LLMClient,
+    semaphore: asyncio.Semaphore,
+) -> Dict[str, ClassificationResult]:
+    """One classification request for several contracts; invalid answers fall back to single calls."""
+    results: Dict[str, ClassificationResult] = {}
+    if len(items) > 1:
+        messages = build_batch_classification_messages(items, my_party)
+        raw = await _call_llm(messages, client, semaphore)
+        answers = parse_batch_results(_safe_json(raw), [item_id for item_id, _ in items]) or {}
+        for item_id, entry in answers.items():
+            direction = str(entry.get("direction", "")).strip().lower()
+            if direction not in {"upstream", "downstream"}:
+                continue
+            try:
+                confidence = float(entry.get("confidence", 0))
+            except (TypeError, ValueError):
+                continue
+            reason = str(entry.get("reason", "")).strip()
+            results[item_id] = ClassificationResult(
+                direction=direction,
+                confidence=max(0.0, min(confidence, 1.0)),
+                reason=reason or "未提供说明",
+                raw_response=entry_json(entry),
+            )
+
+    fallback = [(item_id, text) for item_id, text in items if item_id not in results]
+    singles = await asyncio.gather(
+        *[_classify(text, my_party, client, semaphore) for _, text in fallback]
+    )
+    results.update({item_id: r for (item_id, _), r in zip(fallback, singles)})
     return results
 
 
+@traced("identify_types_batch")
+async def _identify_types_batch(
+    items: List[Tuple[str, str]],
+    contract_types: Dict[str, ContractType],
+    client: LLMClient,
+    semaphore: asyncio.Semaphore,
+) -> Dict[str, str]:
+    """合并识别多份短合同的类型；答案缺失或不在类型列表中的合同退回单独识别。"""
+    results: Dict[str, str] = {}
+    if len(items) > 1:
+        hint_types = {}
+        for item_id, text in items:
+            keyword_hits = match_type_keywords(text, contract_types)
+            if keyword_hits:
+                hint_types[item_id] = max(keyword_hits, key=lambda k: len(keyword_hits[k]))
+        messages = build_batch_type_classification_messages(
+            items, get_type_names_for_prompt(contract_types), hint_types
+        )
+        raw = await _call_llm(messages, client, semaphore)
+        answers = parse_batch_results(_safe_json(raw), [item_id for item_id, _ in items]) or {}
+        for item_id, entry in answers.items():
+            contract_type = entry.get("contract_type", "")
+            if contract_type and contract_type in contract_types:
+                results[item_id] = contract_type
+
+    fallback = [(item_id, text) for item_id, text in items if item_id not in results]
+    singles = await asyncio.gather(
+        *[_identify_contract_type(text, contract_types, client, semaphore) for _, text in fallback]
+    )
+    results.update({item_id: name for (item_id, _), name in zip(fallback, singles)})
+    return results
+
+
+def _rules_decision(
+    contract_text: str, my_party: str, rules_threshold: Optional[float]
+) -> Optional[ClassificationResult]:
+    if rules_threshold is None:
+        return None
+    local = classify_direction_by_rules(contract_text, my_party)
+    if local is not None and local.confidence >= rules_threshold:
+        return local
+    return None
+
+
+async def _classify_direction(
+    contract_text: str,
+    my_party: str,
+    client: LLMClient,
+    semaphore: asyncio.Semaphore,
+    rules_threshold: Optional[float],
+) -> ClassificationResult:
+    """
+    Decide direction locally when the party-role rules are confident enough,
+    otherwise escalate to the LLM classifier.
+    """
+    local = _rules_decision(contract_text, my_party, rules_threshold)
+    if local is not None:
+        return local
+    return await _classify(contract_text, my_party, client, semaphore)
+
+
+@traced("classify")
 async def _classify(
     contract_text: str,
     my_party: str,
@@ -135,6 +789,7 @@ async def _classify(
     )
 
 
+@traced("extract")
 async def _extract(
     contract_text: str,
     headers: List[str],
@@ -151,6 +806,7 @@ async def _extract(
     return fields, raw
 
 
+@traced("identify_contract_type")
 async def _identify_contract_type(
     contract_text: str,
     contract_types: Dict[str, ContractType],
@@ -158,14 +814,19 @@ async def _identify_contract_type(
     semaphore: asyncio.Semaphore,
 ) -> str:
     """识别合同类型，返回最匹配的类型名称。"""
-    # 先用关键词预筛选
-    hint_type = identify_contract_type_by_keywords(contract_text, contract_types)
+    # 先用关键词预筛选（一次扫描得到各类型命中的关键词及位置）
+    keyword_hits = match_type_keywords(contract_text, contract_types)
+    hint_type = None
+    if keyword_hits:
+        hint_type = max(keyword_hits, key=lambda k: len(keyword_hits[k]))
 
     # 生成类型列表说明
     type_list = get_type_names_for_prompt(contract_types)
 
     # 调用LLM进行类型识别
-    messages = build_type_classification_messages(contract_text, type_list, hint_type)
+    messages = build_type_classification_messages(
+        contract_text, type_list, hint_type, keyword_hits
+    )
     raw = await _call_llm(messages, client, semaphore)
     parsed = _safe_json(raw)
 
@@ -178,22 +839,30 @@ async def _identify_contract_type(
     return hint_type or "通用类型"
 
 
+@traced("generate_contract_note")
 async def _generate_contract_note(
     contract_text: str,
     my_party: str,
     contract_types: Dict[str, ContractType],
     client: LLMClient,
     semaphore: asyncio.Semaphore,
+    contract_type_name: Optional[str] = None,
+    on_text: Optional[Callable[[str], None]] = None,
 ) -> tuple[str, str]:
     """生成合同备注。
 
+    Args:
+        contract_type_name: 已知的合同类型，提供时跳过类型识别
+        on_text: 提供时以流式方式生成备注，每收到新内容即以当前全文回调
+
     Returns:
         (合同类型名称, 生成的备注内容)
     """
     # 识别合同类型
-    contract_type_name = await _identify_contract_type(
-        contract_text, contract_types, client, semaphore
-    )
+    if contract_type_name is None:
+        contract_type_name = await _identify_contract_type(
+            contract_text, contract_types, client, semaphore
+        )
 
     # 获取对应模板
     ct = contract_types.get(contract_type_name)
@@ -206,7 +875,10 @@ async def _generate_contract_note(
     messages = build_note_generation_messages(
         contract_text, contract_type_name, ct.template, my_party
     )
-    note = await _call_llm(messages, client, semaphore)
+    if on_text is None:
+        note = await _call_llm(messages, client, semaphore)
+    else:
+        note = await _stream_llm(messages, client, semaphore, on_text)
 
     # 清理可能的Markdown格式
     note = note.strip()
@@ -218,13 +890,29 @@ async def _generate_contract_note(
     return contract_type_name, note
 
 
+@traced("call_llm")
 async def _call_llm(
     messages: List[Dict[str, str]],
     client: LLMClient,
     semaphore: asyncio.Semaphore,
 ) -> str:
-    async with semaphore:
-        return await client.chat(messages)
+    await checkpoint()
+    return await client.chat(messages, gate=semaphore)
+
+
+@traced("stream_llm")
+async def _stream_llm(
+    messages: List[Dict[str, str]],
+    client: LLMClient,
+    semaphore: asyncio.Semaphore,
+    on_text: Callable[[str], None],
+) -> str:
+    await checkpoint()
+    text = ""
+    async for delta in client.chat_stream(messages, gate=semaphore):
+        text += delta
+        on_text(text)
+    return text
 
 
 def _safe_json(payload: str) -> Dict[str, object]:
@@ -255,11 +943,21 @@ def aggregate_to_outputs(
     headers: HeaderDefinition,
     direction: DirectionLiteral,
     basename: str,
+    append_to_history: bool = True,
+    formats: Sequence[str] = ("csv", "excel"),
 ) -> Dict[str, Path]:
     df = aggregate_results(
-        settings.pipeline.intermediate_dir, headers.upstream_headers if direction == "upstream" else headers.downstream_headers, direction
+        settings.pipeline.intermediate_dir,
+        headers.upstream_headers if direction == "upstream" else headers.downstream_headers,
+        direction,
+        with_history_keys=append_to_history,
+    )
+    outputs = write_tabular_outputs(
+        df.drop(columns=list(HISTORY_KEY_COLUMNS), errors="ignore"),
+        settings.pipeline.final_dir,
+        basename,
+        formats,
     )
-    outputs = write_tabular_outputs(df, settings.pipeline.final_dir, basename)
-    history_file = settings.pipeline.history_dir / f"{direction}_history.csv"
-    append_history(df, history_file)
+    if append_to_history:
+        append_history(df, settings.pipeline.history_dir, direction)
     return outputs
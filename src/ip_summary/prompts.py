@@ -1,11 +1,28 @@
 from __future__ import annotations
 
-from typing import Dict, List, Optional, Sequence
+from functools import lru_cache
+from typing import Dict, List, Mapping, Optional, Sequence, Tuple
 
+from .keyword_matcher import KeywordHit
 from .models import DirectionLiteral
 
 
-PROMPT_VERSION = "v1.2"
+PROMPT_VERSION = "v1.3"
+
+# Per-stage prompt versions. When a prompt below changes, bump its stage here as
+# well as PROMPT_VERSION; `reprocess` re-runs only the stages whose version moved.
+STAGE_PROMPT_VERSIONS: Dict[str, str] = {
+    "classification": "v1.2",
+    "extraction": "v1.2",
+    "contract_type": "v1.3",
+    "note": "v1.2",
+}
+# Versions recorded for stages answered by the packed (micro-batch) prompts
+# instead of the single-contract ones; bump when a build_batch_* prompt changes.
+BATCH_STAGE_PROMPT_VERSIONS: Dict[str, str] = {
+    "classification": "v1.2-batch",
+    "contract_type": "v1.3-batch",
+}
 
 
 def build_classification_messages(contract_text: str, my_party: str) -> List[Dict[str, str]]:
@@ -29,6 +46,44 @@ def build_classification_messages(contract_text: str, my_party: str) -> List[Dic
     ]
 
 
+def _format_batch_items(items: Sequence[Tuple[str, str]]) -> str:
+    return "\n\n".join(
+        f"<<<合同 id={item_id}>>>\n{text}\n<<<合同 id={item_id} 结束>>>" for item_id, text in items
+    )
+
+
+def build_batch_classification_messages(
+    items: Sequence[Tuple[str, str]], my_party: str
+) -> List[Dict[str, str]]:
+    """Classify several short contracts in one request; ``items`` are (id, text) pairs."""
+    system = (
+        "You are a legal contract classifier for IP authorization chains. "
+        "You will receive several independent contracts, each wrapped in <<<合同 id=...>>> markers, "
+        "and the party representing 'us'. For EACH contract decide whether it is upstream or downstream relative to us. "
+        "Definitions: upstream = we acquire rights/commission content from the counterparty; "
+        "downstream = we license/transfer/authorize rights to the counterparty. "
+        "Judge every contract on its own text only. "
+        'Return JSON only: {"results": [{"id": "<id>", "direction": "upstream|downstream", '
+        '"confidence": 0-1, "reason": "max 50 Chinese characters"}]} with exactly one entry per id.'
+    )
+    user = (
+        f"我方主体：{my_party}\n\n"
+        f"合同列表（共 {len(items)} 份）：\n{_format_batch_items(items)}\n\n"
+        "请只输出 JSON，results 中每个 id 恰好出现一次。"
+    )
+    return [
+        {"role": "system", "content": system},
+        {"role": "user", "content": user},
+    ]
+
+
+@lru_cache(maxsize=64)
+def extraction_json_template(headers: Tuple[str, ...]) -> str:
+    """The null-filled JSON template for a header list (built once per list)."""
+    template_lines = [f'  "{h}": null' for h in headers]
+    return "{\n" + ",\n".join(template_lines) + "\n}"
+
+
 def build_extraction_messages(
     contract_text: str,
     headers: Sequence[str],
@@ -36,8 +91,7 @@ def build_extraction_messages(
     direction: DirectionLiteral,
 ) -> List[Dict[str, str]]:
     dir_cn = "上游" if direction == "upstream" else "下游"
-    template_lines = [f'  "{h}": null' for h in headers]
-    json_template = "{\n" + ",\n".join(template_lines) + "\n}"
+    json_template = extraction_json_template(tuple(headers))
     system = (
         "You are an IP authorization contract analyst. "
         "Extract required fields as JSON using the provided headers EXACTLY as keys (do not改写字段名). "
@@ -67,10 +121,32 @@ def build_extraction_messages(
     ]
 
 
+TYPE_CLASSIFICATION_TEXT_LIMIT = 8000
+
+
+def _format_keyword_hits(
+    contract_text: str, keyword_hits: Mapping[str, Sequence[KeywordHit]]
+) -> str:
+    """把关键词命中整理为提示；截断窗口之外的命中附带上下文片段。"""
+    lines = []
+    snippets = []
+    for type_name, hits in keyword_hits.items():
+        lines.append(f"- {type_name}：" + "、".join(f"{h.keyword}@{h.start}" for h in hits))
+        for h in hits:
+            if h.start >= TYPE_CLASSIFICATION_TEXT_LIMIT and len(snippets) < 5:
+                context = contract_text[max(0, h.start - 20) : h.end + 20].replace("\n", " ")
+                snippets.append(f"- 位置{h.start}「{h.keyword}」：…{context}…")
+    text = "\n（关键词命中，格式为 关键词@字符位置）：\n" + "\n".join(lines)
+    if snippets:
+        text += "\n（以下命中位于截断内容之后，附上下文）：\n" + "\n".join(snippets)
+    return text
+
+
 def build_type_classification_messages(
     contract_text: str,
     type_list: str,
     hint_type: Optional[str] = None,
+    keyword_hits: Optional[Mapping[str, Sequence[KeywordHit]]] = None,
 ) -> List[Dict[str, str]]:
     """构建合同类型识别的prompt。
 
@@ -78,6 +154,7 @@ def build_type_classification_messages(
         contract_text: 合同全文
         type_list: 格式化的类型列表说明
         hint_type: 关键词预筛选的提示类型（可选）
+        keyword_hits: 各类型命中的关键词及位置（可选）
 
     Returns:
         消息列表
@@ -92,11 +169,54 @@ def build_type_classification_messages(
     hint = ""
     if hint_type:
         hint = f"\n（关键词预筛选提示：可能是 {hint_type}，请验证）"
+    if keyword_hits:
+        hint += _format_keyword_hits(contract_text, keyword_hits)
 
     user = (
         f"请判断以下合同属于哪种类型：\n\n"
         f"可选类型列表：\n{type_list}\n\n"
-        f"合同内容：\n{contract_text[:8000]}\n{hint}\n\n"
+        f"合同内容：\n{contract_text[:TYPE_CLASSIFICATION_TEXT_LIMIT]}\n{hint}\n\n"
+        "请只输出JSON，不要添加其他说明。"
+    )
+
+    return [
+        {"role": "system", "content": system},
+        {"role": "user", "content": user},
+    ]
+
+
+def build_batch_type_classification_messages(
+    items: Sequence[Tuple[str, str]],
+    type_list: str,
+    hint_types: Optional[Mapping[str, str]] = None,
+) -> List[Dict[str, str]]:
+    """构建多份短合同合并识别类型的prompt。
+
+    Args:
+        items: (合同编号, 合同全文) 列表
+        type_list: 格式化的类型列表说明
+        hint_types: 合同编号 -> 关键词预筛选的提示类型（可选）
+
+    Returns:
+        消息列表
+    """
+    system = (
+        "你是一个专业的IP版权合同分类专家。下面给出多份相互独立的合同，每份用 <<<合同 id=...>>> 标记包裹。\n"
+        "请逐份判断其所属的合同类型，只能从给定的类型列表中选择最匹配的一个类型。\n"
+        "如果无法明确归类，请选择'通用类型'。\n"
+        "返回JSON格式：{\"results\": [{\"id\": \"合同编号\", \"contract_type\": \"类型名称\", "
+        "\"confidence\": 0.0-1.0, \"reason\": \"判断理由（不超过50字）\"}]}，每个编号恰好一条。"
+    )
+
+    hint = ""
+    if hint_types:
+        hint = "\n（关键词预筛选提示，请验证）：\n" + "\n".join(
+            f"- id={item_id}：可能是 {type_name}" for item_id, type_name in hint_types.items()
+        )
+
+    user = (
+        f"可选类型列表：\n{type_list}\n\n"
+        f"合同列表（共 {len(items)} 份）：\n{_format_batch_items(items)}\n{hint}\n\n"
         "请只输出JSON，不要添加其他说明。"
     )
 
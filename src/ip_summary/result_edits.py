@@ -0,0 +1,140 @@
+from __future__ import annotations
+
+import json
+import os
+import threading
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, List, Mapping, Optional, Sequence, Tuple
+
+from .results_index import ResultsIndex
+from .storage import stage_json, sync_directory
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# Serialises edits per intermediate folder within this process only, so two
+# concurrent edit requests cannot interleave their read-modify-write. It does not
+# exclude the pipeline or worker processes writing the same files: the API rejects
+# edits with 409 while the task has an active run or queued job.
+_locks: Dict[Path, threading.Lock] = {}
+_locks_guard = threading.Lock()
+
+
+def _lock_for(intermediate_dir: Path) -> threading.Lock:
+    key = intermediate_dir.resolve()
+    with _locks_guard:
+        return _locks.setdefault(key, threading.Lock())
+
+
+def _merge_reviewed(reviewed: Optional[List[str]], fields: Mapping[str, Any]) -> List[str]:
+    merged = list(reviewed or [])
+    merged.extend(h for h in fields if h not in merged)
+    return merged
+
+
+def _commit(writes: Sequence[Tuple[Path, Dict[str, Any]]]) -> None:
+    """
+    Write every payload to a fsynced temporary sibling first, then rename them
+    all into place; a failure while preparing leaves every result untouched.
+    """
+    staged: List[Tuple[Path, Path]] = []
+    try:
+        for path, payload in writes:
+            staged.append((stage_json(path, payload), path))
+    except BaseException:
+        for tmp_path, _ in staged:
+            tmp_path.unlink(missing_ok=True)
+        raise
+    for tmp_path, path in staged:
+        os.replace(tmp_path, path)
+    for folder in {path.parent for _, path in staged}:
+        sync_directory(folder)
+
+
+def apply_field_patches(
+    intermediate_dir: Path,
+    direction: str,
+    patches: Mapping[str, Mapping[str, Any]],
+    new_results: Optional[Mapping[str, Dict[str, Any]]] = None,
+    review: str = "patched",
+    set_direction: bool = False,
+) -> List[Dict[str, Any]]:
+    """
+    Apply field edits to many results of one direction in a single batch.
+
+    Args:
+        patches: JSON filename -> {header: value}.
+        new_results: Full payloads for filenames that do not exist yet (created
+            instead of reported missing).
+        review: Which headers join ``reviewed_fields``: ``"patched"`` (every header
+            in the patch, as a manual edit) or ``"changed"`` (only those whose value
+            differs, as for a re-imported sheet).
+        set_direction: Also set the payload direction to ``direction``.
+
+    Returns:
+        One entry per filename: ``status`` (updated / unchanged / created /
+        missing) and ``changed`` as {header: [old, new]}.
+    """
+    folder = intermediate_dir / direction
+    new_results = new_results or {}
+    report: List[Dict[str, Any]] = []
+    writes: List[Tuple[Path, Dict[str, Any]]] = []
+    with _lock_for(intermediate_dir):
+        for filename, fields in patches.items():
+            path = folder / filename
+            if not path.exists():
+                if filename in new_results:
+                    writes.append((path, new_results[filename]))
+                    report.append({"filename": filename, "status": "created", "changed": {}})
+                else:
+                    report.append({"filename": filename, "status": "missing", "changed": {}})
+                continue
+            payload = json.loads(path.read_text(encoding="utf-8"))
+            current = payload.get("fields") or {}
+            changed = {h: [current.get(h), v] for h, v in fields.items() if current.get(h) != v}
+            direction_changed = set_direction and payload.get("direction") != direction
+            reviewed = _merge_reviewed(
+                payload.get("reviewed_fields"), fields if review == "patched" else changed
+            )
+            if not changed and not direction_changed and reviewed == payload.get("reviewed_fields"):
+                report.append({"filename": filename, "status": "unchanged", "changed": {}})
+                continue
+            current.update(fields)
+            payload["fields"] = current
+            payload["reviewed_fields"] = reviewed
+            if set_direction:
+                payload["direction"] = direction
+            writes.append((path, payload))
+            report.append({"filename": filename, "status": "updated", "changed": changed})
+        if writes:
+            folder.mkdir(parents=True, exist_ok=True)
+            _commit(writes)
+            ResultsIndex(intermediate_dir).upsert_many(
+                direction, [(path.name, payload) for path, payload in writes]
+            )
+    return report
+
+
+def sheet_patches(
+    df: pd.DataFrame, headers: Sequence[str]
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Turn an edited review sheet into per-contract patches, column-wise.
+
+    Cells become strings (empty cells None); rows without ``合同源文件`` are
+    skipped and later rows for the same contract override earlier ones.
+
+    Returns:
+        contract path (as in ``合同源文件``) -> {header: value}
+    """
+    df = df[df["合同源文件"].notna() & (df["合同源文件"].astype(str).str.strip() != "")]
+    if df.empty:
+        return {}
+    sources = df["合同源文件"].astype(str)
+    columns = [h for h in headers if h in df.columns]
+    values = df[columns].astype(object)
+    values = values.where(values.isna(), values.astype(str)).where(values.notna(), None)
+    patches: Dict[str, Dict[str, Any]] = {}
+    for source, record in zip(sources, values.to_dict("records")):
+        patches.setdefault(source, {}).update(record)
+    return patches
@@ -0,0 +1,612 @@
+from __future__ import annotations
+
+import base64
+import json
+import os
+import re
+import sqlite3
+from contextlib import closing, contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Mapping, Optional, Sequence, Set, Tuple
+
+from .document_loader import PARSE_CACHE_DIR, cached_text
+
+INDEX_NAME = "_results_index.sqlite3"
+# Bump when result_item or the table layout changes; older indexes are rebuilt.
+SCHEMA_VERSION = 3
+DIRECTIONS = ("upstream", "downstream")
+_NOTE_TYPE_PREFIX = "合同类型："
+# 2026-12-31, 2026/12/31, 2026.12.31, 2026年12月31日; a missing day means the 1st.
+_DATE_RE = re.compile(r"((?:19|20)\d{2})\s*[-/.年]\s*(\d{1,2})(?:\s*[-/.月]\s*(\d{1,2})\s*日?|\s*月)?")
+# The trigram index serves LIKE patterns of at least three characters (without
+# an ESCAPE clause); shorter terms and terms with wildcards use instr instead.
+_MIN_LIKE_CHARS = 3
+_SEARCH_TABLES = ("results_fields_fts", "results_text_fts")
+# Index files this process has already set up / fully populated: results are
+# saved one by one, and re-running the schema statements on every save (and for
+# every task on every search) would dominate the cost of small writes.
+_ready: Set[str] = set()
+_populated: Set[str] = set()
+
+
+def _is_empty(value: Any) -> bool:
+    return value is None or (isinstance(value, str) and not value.strip())
+
+
+def _contract_type(payload: Dict[str, Any]) -> Optional[str]:
+    notes = payload.get("notes") or ""
+    if notes.startswith(_NOTE_TYPE_PREFIX):
+        return notes[len(_NOTE_TYPE_PREFIX):].splitlines()[0].strip() or None
+    return None
+
+
+def result_item(payload: Dict[str, Any], filename: str) -> Dict[str, Any]:
+    """The part of an intermediate result the review UI needs."""
+    return {
+        "filename": filename,
+        "contract_path": payload["contract_path"],
+        "direction": payload["direction"],
+        "fields": payload.get("fields") or {},
+        "classification": payload["classification"],
+        "contract_type": _contract_type(payload),
+        "cluster_id": payload.get("cluster_id"),
+        "duplicate_of": payload.get("duplicate_of"),
+        "completed": payload.get("completed", True),
+        "content_hash": payload.get("content_hash"),
+        "prompt_version": payload.get("prompt_version"),
+    }
+
+
+def field_dates(fields: Mapping[str, Any]) -> List[Tuple[str, str]]:
+    """``(header, YYYY-MM-DD)`` for every date written in a field value."""
+    found: List[Tuple[str, str]] = []
+    for header, value in fields.items():
+        if not isinstance(value, str):
+            continue
+        for match in _DATE_RE.finditer(value):
+            year, month, day = int(match.group(1)), int(match.group(2)), int(match.group(3) or 1)
+            if 1 <= month <= 12 and 1 <= day <= 31:
+                found.append((header, f"{year:04d}-{month:02d}-{day:02d}"))
+    return found
+
+
+def _fields_text(fields: Mapping[str, Any]) -> str:
+    return "\n".join(f"{h}: {v}" for h, v in fields.items() if not _is_empty(v))
+
+
+def _like(term: str) -> str:
+    return "%" + term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+
+
+_COLUMNS = (
+    "direction",
+    "filename",
+    "size",
+    "mtime_ns",
+    "own_direction",
+    "confidence",
+    "contract_type",
+    "cluster_id",
+    "completed",
+    "empty_count",
+    "fields",
+    "item",
+)
+_UPSERT = (
+    f"INSERT INTO results ({', '.join(_COLUMNS)}) VALUES ({', '.join('?' * len(_COLUMNS))})"
+    " ON CONFLICT (direction, filename) DO UPDATE SET "
+    + ", ".join(f"{c} = excluded.{c}" for c in _COLUMNS[2:])
+)
+
+
+def encode_cursor(filename: str) -> str:
+    return base64.urlsafe_b64encode(filename.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> str:
+    try:
+        return base64.b64decode(cursor.encode("ascii"), altchars=b"-_", validate=True).decode("utf-8")
+    except (ValueError, UnicodeError):
+        raise ValueError(f"Invalid cursor: {cursor!r}")
+
+
+class ResultsIndex:
+    """
+    SQLite index over a task's intermediate JSON results.
+
+    The JSON files stay the source of truth. ``refresh`` re-reads only files whose
+    size or mtime changed (so results written by the pipeline or by a worker in
+    another process show up), and editors call ``upsert``/``remove`` right after
+    writing. ``generation`` increases with every change and keys HTTP caching.
+
+    For ``search``, every entry is also in two full-text tables (FTS5 with the
+    trigram tokenizer, which matches Chinese substrings without word segmentation)
+    sharing the entry's rowid: the contract path with the field values, and the
+    contract text from the parse cache. Edits only re-index the fields; the text
+    is re-read when the result's content hash changes. Dates found in field values
+    are in ``result_dates``.
+    """
+
+    def __init__(self, intermediate_dir: Path):
+        self.intermediate_dir = intermediate_dir
+        self.db_path = intermediate_dir / INDEX_NAME
+        self._key = os.path.abspath(self.db_path)
+        if self._key in _ready and self.db_path.exists():
+            return
+        # First use in this process, or the file was deleted with its task.
+        _populated.discard(self._key)
+        intermediate_dir.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            # Persistent: set once when the file is set up.
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+            row = conn.execute("SELECT value FROM meta WHERE key = 'schema'").fetchone()
+            if row is None or row[0] != SCHEMA_VERSION:
+                for table in ("results", "result_dates", *_SEARCH_TABLES):
+                    conn.execute(f"DROP TABLE IF EXISTS {table}")
+                conn.execute("DELETE FROM meta WHERE key = 'populated'")
+                conn.execute(
+                    "INSERT OR REPLACE INTO meta (key, value) VALUES ('schema', ?)", (SCHEMA_VERSION,)
+                )
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS results (
+                    direction TEXT NOT NULL,
+                    filename TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    mtime_ns INTEGER NOT NULL,
+                    own_direction TEXT,
+                    confidence REAL,
+                    contract_type TEXT,
+                    cluster_id TEXT,
+                    completed INTEGER NOT NULL,
+                    empty_count INTEGER NOT NULL,
+                    fields TEXT NOT NULL,
+                    item TEXT NOT NULL,
+                    PRIMARY KEY (direction, filename)
+                )
+                """
+            )
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS result_dates (
+                    direction TEXT NOT NULL,
+                    filename TEXT NOT NULL,
+                    header TEXT NOT NULL,
+                    value TEXT NOT NULL
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS result_dates_file ON result_dates (direction, filename)")
+            conn.execute("CREATE INDEX IF NOT EXISTS result_dates_value ON result_dates (header, value)")
+            # content_hash is only set next to a non-empty text; see _load_bodies.
+            for table, columns in zip(_SEARCH_TABLES, ("text", "content_hash UNINDEXED, text")):
+                try:
+                    conn.execute(
+                        f"CREATE VIRTUAL TABLE IF NOT EXISTS {table}"
+                        f" USING fts5({columns}, tokenize='trigram', detail=none)"
+                    )
+                except sqlite3.OperationalError:
+                    # SQLite before 3.34 has no trigram tokenizer: LIKE scans the text.
+                    conn.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS {table} USING fts5({columns}, detail=none)")
+            conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('generation', 0)")
+        _ready.add(self._key)
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        with closing(sqlite3.connect(self.db_path, timeout=30, isolation_level=None)) as conn:
+            conn.row_factory = sqlite3.Row
+            # A derived cache: losing the last commits on power failure only means
+            # the next refresh re-reads those files.
+            conn.execute("PRAGMA synchronous=NORMAL")
+            yield conn
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    @staticmethod
+    def _bump(conn: sqlite3.Connection) -> None:
+        conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'generation'")
+
+    @staticmethod
+    def _row(
+        direction: str, filename: str, payload: Dict[str, Any], stat: os.stat_result
+    ) -> Tuple[Any, ...]:
+        """Table row followed by the search document (see ``_write``)."""
+        item = result_item(payload, filename)
+        fields = item["fields"]
+        doc = {
+            "contract_path": str(item["contract_path"]),
+            "fields": _fields_text(fields),
+            "content_hash": item["content_hash"],
+            "dates": field_dates(fields),
+            "body": None,
+        }
+        return (
+            direction,
+            filename,
+            stat.st_size,
+            stat.st_mtime_ns,
+            payload.get("direction"),
+            (item["classification"] or {}).get("confidence"),
+            item["contract_type"],
+            item["cluster_id"],
+            int(bool(item["completed"])),
+            sum(1 for value in fields.values() if _is_empty(value)),
+            json.dumps(fields, ensure_ascii=False),
+            json.dumps(item, ensure_ascii=False),
+            doc,
+        )
+
+    @classmethod
+    def _read_row(cls, direction: str, path: Path, stat: os.stat_result) -> Optional[Tuple[Any, ...]]:
+        try:
+            return cls._row(direction, path.name, json.loads(path.read_text(encoding="utf-8")), stat)
+        except (OSError, ValueError, KeyError):
+            # Missing or half-written file: picked up again on the next refresh.
+            return None
+
+    def _load_bodies(self, direction: str, rows: List[Tuple[Any, ...]]) -> None:
+        """
+        Read the contract text for rows whose content is new to the index (outside
+        any transaction); the others keep their indexed text in ``_write``.
+        """
+        if not rows:
+            return
+        with self._connect() as conn:
+            indexed = {
+                r["filename"]: r["content_hash"]
+                for r in conn.execute(
+                    "SELECT r.filename, t.content_hash FROM results r"
+                    " JOIN results_text_fts t ON t.rowid = r.rowid"
+                    " WHERE r.direction = ? AND t.content_hash IS NOT NULL",
+                    (direction,),
+                )
+            }
+        cache_dir = self.intermediate_dir / PARSE_CACHE_DIR
+        for row in rows:
+            doc = row[-1]
+            if doc["content_hash"] is None or indexed.get(row[1]) != doc["content_hash"]:
+                doc["body"] = cached_text(Path(doc["contract_path"]), cache_dir) or ""
+
+    @staticmethod
+    def _unlink(conn: sqlite3.Connection, direction: str, filename: str) -> None:
+        """Remove the search entries of one result."""
+        old = conn.execute(
+            "SELECT rowid FROM results WHERE direction = ? AND filename = ?", (direction, filename)
+        ).fetchone()
+        if old is not None:
+            for table in _SEARCH_TABLES:
+                conn.execute(f"DELETE FROM {table} WHERE rowid = ?", (old[0],))
+        conn.execute("DELETE FROM result_dates WHERE direction = ? AND filename = ?", (direction, filename))
+
+    def _write(self, conn: sqlite3.Connection, rows: List[Tuple[Any, ...]]) -> None:
+        for row in rows:
+            direction, filename, doc = row[0], row[1], row[-1]
+            # An upsert keeps the rowid, so the contract text stays attached to it.
+            conn.execute(_UPSERT, row[:-1])
+            rowid = conn.execute(
+                "SELECT rowid FROM results WHERE direction = ? AND filename = ?", (direction, filename)
+            ).fetchone()[0]
+            conn.execute("DELETE FROM results_fields_fts WHERE rowid = ?", (rowid,))
+            conn.execute(
+                "INSERT INTO results_fields_fts (rowid, text) VALUES (?, ?)",
+                (rowid, doc["contract_path"] + "\n" + doc["fields"]),
+            )
+            if doc["body"] is not None:
+                conn.execute("DELETE FROM results_text_fts WHERE rowid = ?", (rowid,))
+                conn.execute(
+                    "INSERT INTO results_text_fts (rowid, content_hash, text) VALUES (?, ?, ?)",
+                    (rowid, doc["content_hash"] if doc["body"] else None, doc["body"]),
+                )
+            conn.execute("DELETE FROM result_dates WHERE direction = ? AND filename = ?", (direction, filename))
+            conn.executemany(
+                "INSERT INTO result_dates (direction, filename, header, value) VALUES (?, ?, ?, ?)",
+                [(direction, filename, header, value) for header, value in doc["dates"]],
+            )
+
+    def generation(self) -> int:
+        with self._connect() as conn:
+            return conn.execute("SELECT value FROM meta WHERE key = 'generation'").fetchone()[0]
+
+    def upsert(self, direction: str, filename: str, payload: Optional[Dict[str, Any]] = None) -> None:
+        """
+        Re-index one result file (removes the entry if the file is gone). Pass the
+        ``payload`` just written to skip reading the file back.
+        """
+        path = self.intermediate_dir / direction / filename
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            self.remove(direction, filename)
+            return
+        try:
+            row = (
+                self._row(direction, filename, payload, stat)
+                if payload is not None
+                else self._read_row(direction, path, stat)
+            )
+        except KeyError:
+            row = None
+        if row is not None:
+            self._load_bodies(direction, [row])
+            with self._transaction() as conn:
+                self._write(conn, [row])
+                self._bump(conn)
+
+    def upsert_many(self, direction: str, entries: List[Tuple[str, Dict[str, Any]]]) -> None:
+        """Index freshly written ``(filename, payload)`` pairs in one transaction."""
+        folder = self.intermediate_dir / direction
+        rows = [
+            self._row(direction, filename, payload, (folder / filename).stat())
+            for filename, payload in entries
+        ]
+        if rows:
+            self._load_bodies(direction, rows)
+            with self._transaction() as conn:
+                self._write(conn, rows)
+                self._bump(conn)
+
+    def remove(self, direction: str, filename: str) -> None:
+        with self._transaction() as conn:
+            self._unlink(conn, direction, filename)
+            cursor = conn.execute(
+                "DELETE FROM results WHERE direction = ? AND filename = ?", (direction, filename)
+            )
+            if cursor.rowcount:
+                self._bump(conn)
+
+    def refresh(self, direction: str) -> int:
+        """Bring ``direction`` in line with the folder; returns the number of changed entries."""
+        folder = self.intermediate_dir / direction
+        on_disk: Dict[str, os.stat_result] = {}
+        if folder.exists():
+            with os.scandir(folder) as entries:
+                for entry in entries:
+                    if entry.name.endswith(".json") and entry.is_file():
+                        on_disk[entry.name] = entry.stat()
+        with self._connect() as conn:
+            indexed = {
+                row["filename"]: (row["size"], row["mtime_ns"])
+                for row in conn.execute(
+                    "SELECT filename, size, mtime_ns FROM results WHERE direction = ?", (direction,)
+                )
+            }
+        changed = [
+            name
+            for name, stat in on_disk.items()
+            if indexed.get(name) != (stat.st_size, stat.st_mtime_ns)
+        ]
+        gone = [name for name in indexed if name not in on_disk]
+        rows = [
+            row
+            for row in (self._read_row(direction, folder / name, on_disk[name]) for name in changed)
+            if row is not None
+        ]
+        if not rows and not gone:
+            return 0
+        self._load_bodies(direction, rows)
+        with self._transaction() as conn:
+            self._write(conn, rows)
+            for name in gone:
+                self._unlink(conn, direction, name)
+            conn.executemany(
+                "DELETE FROM results WHERE direction = ? AND filename = ?",
+                [(direction, name) for name in gone],
+            )
+            self._bump(conn)
+        return len(rows) + len(gone)
+
+    def items(self, direction: str) -> List[Dict[str, Any]]:
+        """All current items of ``direction`` (refreshed first), ordered by filename."""
+        self.refresh(direction)
+        return self.query(direction)[0]
+
+    def query(
+        self,
+        direction: str,
+        cursor: Optional[str] = None,
+        limit: Optional[int] = None,
+        max_confidence: Optional[float] = None,
+        empty_field: Optional[str] = None,
+        contract_type: Optional[str] = None,
+        cluster_id: Optional[str] = None,
+        completed: Optional[bool] = None,
+    ) -> Tuple[List[Dict[str, Any]], int, Optional[str]]:
+        """
+        Filtered page of result items ordered by filename.
+
+        Args:
+            cursor: ``next_cursor`` from the previous page.
+            limit: Page size; None returns everything after the cursor.
+            max_confidence: Only classifications with confidence below this value.
+            empty_field: Only results where this header is empty; ``"*"`` matches any
+                empty header.
+
+        Returns:
+            ``(items, total_matching, next_cursor)``.
+        """
+        where = ["direction = ?", "(own_direction IS NULL OR own_direction = ?)"]
+        params: List[Any] = [direction, direction]
+        if max_confidence is not None:
+            where.append("confidence < ?")
+            params.append(max_confidence)
+        if empty_field == "*":
+            where.append("empty_count > 0")
+        elif empty_field:
+            where.append("COALESCE(TRIM(json_extract(fields, ?)), '') = ''")
+            params.append('$."' + empty_field.replace('"', '\\"') + '"')
+        if contract_type is not None:
+            where.append("contract_type = ?")
+            params.append(contract_type)
+        if cluster_id is not None:
+            where.append("cluster_id = ?")
+            params.append(cluster_id)
+        if completed is not None:
+            where.append("completed = ?")
+            params.append(int(completed))
+        condition = " AND ".join(where)
+
+        with self._connect() as conn:
+            total = conn.execute(f"SELECT COUNT(*) FROM results WHERE {condition}", params).fetchone()[0]
+            page_where, page_params = condition, list(params)
+            if cursor:
+                page_where += " AND filename > ?"
+                page_params.append(decode_cursor(cursor))
+            sql = f"SELECT filename, item FROM results WHERE {page_where} ORDER BY filename"
+            if limit is not None:
+                sql += " LIMIT ?"
+                page_params.append(limit + 1)
+            rows = conn.execute(sql, page_params).fetchall()
+
+        next_cursor = None
+        if limit is not None and len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1]["filename"])
+        return [json.loads(row["item"]) for row in rows], total, next_cursor
+
+    def ensure_populated(self) -> None:
+        """Index both directions once, e.g. for tasks processed before the index existed."""
+        if self._key in _populated:
+            return
+        with self._connect() as conn:
+            populated = conn.execute("SELECT 1 FROM meta WHERE key = 'populated'").fetchone()
+        if not populated:
+            for direction in DIRECTIONS:
+                self.refresh(direction)
+            with self._connect() as conn:
+                conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('populated', 1)")
+        _populated.add(self._key)
+
+    def search(
+        self,
+        text: Optional[str] = None,
+        direction: Optional[str] = None,
+        fields: Optional[Mapping[str, str]] = None,
+        date_field: Optional[str] = None,
+        date_from: Optional[str] = None,
+        date_to: Optional[str] = None,
+        after: Optional[Tuple[str, str]] = None,
+        limit: Optional[int] = None,
+    ) -> Tuple[List[Dict[str, Any]], int]:
+        """
+        Results matching every given filter, ordered by direction and filename.
+
+        Args:
+            text: Whitespace-separated terms, each found (case-insensitively, as a
+                substring) in the contract path, a field value or the contract text.
+            fields: {header: substring of its value}.
+            date_field: Header whose dates ``date_from``/``date_to`` apply to; any
+                header when None.
+            date_from / date_to: Inclusive ``YYYY``, ``YYYY-MM`` or ``YYYY-MM-DD``
+                bounds, e.g. ``date_from="2026", date_to="2026"`` for the whole year.
+            after: ``(direction, filename)`` of the last item of the previous page.
+            limit: Page size; None returns every match, 0 only counts.
+
+        Returns:
+            ``(items, total_matching)``.
+        """
+        where = ["(r.own_direction IS NULL OR r.own_direction = r.direction)"]
+        params: List[Any] = []
+        if direction is not None:
+            where.append("r.direction = ?")
+            params.append(direction)
+        for term in (text or "").split():
+            if len(term) >= _MIN_LIKE_CHARS and not {"%", "_"} & set(term):
+                match, arg = "text LIKE ?", f"%{term}%"
+            else:
+                match, arg = "instr(lower(text), lower(?)) > 0", term
+            tables = " OR ".join(f"r.rowid IN (SELECT rowid FROM {t} WHERE {match})" for t in _SEARCH_TABLES)
+            where.append(f"({tables})")
+            params.extend([arg] * len(_SEARCH_TABLES))
+        for header, value in (fields or {}).items():
+            where.append("json_extract(r.fields, ?) LIKE ? ESCAPE '\\'")
+            params.extend(['$."' + header.replace('"', '\\"') + '"', _like(value)])
+        if date_from is not None or date_to is not None:
+            dates = ["d.direction = r.direction", "d.filename = r.filename"]
+            if date_field is not None:
+                dates.append("d.header = ?")
+                params.append(date_field)
+            if date_from is not None:
+                dates.append("d.value >= ?")
+                params.append(date_from)
+            if date_to is not None:
+                # Compare prefixes so date_to="2026" includes 2026-12-31.
+                dates.append("substr(d.value, 1, ?) <= ?")
+                params.extend([len(date_to), date_to])
+            where.append(f"EXISTS (SELECT 1 FROM result_dates d WHERE {' AND '.join(dates)})")
+        condition = " AND ".join(where)
+        source = "results r"
+
+        with self._connect() as conn:
+            total = conn.execute(f"SELECT COUNT(*) FROM {source} WHERE {condition}", params).fetchone()[0]
+            if limit == 0:
+                return [], total
+            page_where, page_params = condition, list(params)
+            if after is not None:
+                page_where += " AND (r.direction, r.filename) > (?, ?)"
+                page_params.extend(after)
+            sql = f"SELECT r.item FROM {source} WHERE {page_where} ORDER BY r.direction, r.filename"
+            if limit is not None:
+                sql += " LIMIT ?"
+                page_params.append(limit)
+            rows = conn.execute(sql, page_params).fetchall()
+        return [json.loads(row["item"]) for row in rows], total
+
+
+def search_indexes(
+    indexes: Sequence[Tuple[str, ResultsIndex]],
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+    **filters: Any,
+) -> Tuple[List[Dict[str, Any]], int, Optional[str]]:
+    """
+    ``ResultsIndex.search`` across several indexes (e.g. one per task), in the
+    given order; each item gets a ``source`` key with the index's name.
+
+    Returns:
+        ``(items, total_matching, next_cursor)``.
+    """
+    position: Optional[Tuple[str, str, str]] = None
+    if cursor:
+        try:
+            source, folder, filename = json.loads(decode_cursor(cursor))
+        except (TypeError, ValueError):
+            raise ValueError(f"Invalid cursor: {cursor!r}")
+        position = (source, folder, filename)
+    names = [name for name, _ in indexes]
+    if position is not None and position[0] not in names:
+        raise ValueError(f"Invalid cursor: {cursor!r}")
+    start = names.index(position[0]) if position is not None else 0
+
+    items: List[Dict[str, Any]] = []
+    total = 0
+    has_more = False
+    for i, (name, index) in enumerate(indexes):
+        index.ensure_populated()
+        if i < start or (limit is not None and len(items) >= limit):
+            # Before the cursor, or the page is already full: only counted.
+            count = index.search(limit=0, **filters)[1]
+            has_more = has_more or (i >= start and count > 0)
+        else:
+            after = position[1:] if position is not None and i == start else None
+            page = None if limit is None else limit - len(items) + 1
+            found, count = index.search(after=after, limit=page, **filters)
+            if page is not None and len(found) == page:
+                found = found[:-1]
+                has_more = True
+            items.extend({"source": name, **item} for item in found)
+        total += count
+    next_cursor = None
+    if limit is not None and has_more and items:
+        last = items[-1]
+        next_cursor = encode_cursor(json.dumps([last["source"], last["direction"], last["filename"]]))
+    return items, total, next_cursor
@@ -0,0 +1,110 @@
+from __future__ import annotations
+
+import asyncio
+from contextvars import ContextVar
+from typing import Awaitable, List, Optional, Sequence, Set, TypeVar
+
+T = TypeVar("T")
+
+# Control of the run the current coroutine belongs to; LLM call sites consult it
+# without every helper having to take an extra argument.
+current_run_control: ContextVar[Optional["RunControl"]] = ContextVar(
+    "current_run_control", default=None
+)
+
+
+class RunCancelled(Exception):
+    """Raised at a checkpoint once the run has been cancelled."""
+
+
+class RunControl:
+    """
+    Cancel / pause / resume switch for one pipeline run.
+
+    Pausing stops new LLM calls at the next checkpoint (calls already sent finish);
+    cancelling also cancels every in-flight contract so semaphore slots are freed
+    immediately. Results saved before cancellation are kept.
+    """
+
+    def __init__(self) -> None:
+        self._resumed = asyncio.Event()
+        self._resumed.set()
+        self._cancelled = False
+        self._tasks: Set["asyncio.Task[object]"] = set()
+
+    @property
+    def state(self) -> str:
+        if self._cancelled:
+            return "cancelled"
+        return "running" if self._resumed.is_set() else "paused"
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled
+
+    def pause(self) -> None:
+        if not self._cancelled:
+            self._resumed.clear()
+
+    def resume(self) -> None:
+        self._resumed.set()
+
+    def cancel(self) -> None:
+        self._cancelled = True
+        self._resumed.set()
+        for task in list(self._tasks):
+            task.cancel()
+
+    def track(self, task: "asyncio.Task[object]") -> None:
+        """Cancel ``task`` together with the run (until it finishes)."""
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def checkpoint(self) -> None:
+        """Wait while paused; raise RunCancelled once cancelled."""
+        if self._cancelled:
+            raise RunCancelled()
+        await self._resumed.wait()
+        if self._cancelled:
+            raise RunCancelled()
+
+    async def gather(self, coros: Sequence[Awaitable[T]]) -> List[Optional[T]]:
+        """
+        Run coroutines as tracked tasks. Entries for work stopped by cancellation are
+        None; any other exception propagates as with asyncio.gather.
+        """
+        token = current_run_control.set(self)
+        try:
+            tasks = [asyncio.ensure_future(coro) for coro in coros]
+        finally:
+            current_run_control.reset(token)
+        self._tasks.update(tasks)
+        try:
+            if tasks:
+                await asyncio.wait(tasks)
+        except asyncio.CancelledError:
+            for task in tasks:
+                task.cancel()
+            raise
+        finally:
+            self._tasks.difference_update(tasks)
+        results: List[Optional[T]] = []
+        for task in tasks:
+            if task.cancelled():
+                results.append(None)
+                continue
+            exc = task.exception()
+            if isinstance(exc, RunCancelled):
+                results.append(None)
+            elif exc is not None:
+                raise exc
+            else:
+                results.append(task.result())
+        return results
+
+
+async def checkpoint() -> None:
+    """Checkpoint of the current run, if it has a control."""
+    control = current_run_control.get()
+    if control is not None:
+        await control.checkpoint()
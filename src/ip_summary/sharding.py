@@ -0,0 +1,165 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import shutil
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from .models import ExtractionResult
+from .prompts import PROMPT_VERSION
+from .storage import ensure_directories, intermediate_path
+
+SHARD_MANIFEST_DIR = "_shards"
+MERGED_MANIFEST_NAME = "manifest.json"
+
+
+def parse_shard(spec: str) -> Tuple[int, int]:
+    """Parse ``"i/N"`` (0 <= i < N) into ``(i, N)``."""
+    try:
+        index_text, count_text = spec.split("/")
+        index, count = int(index_text), int(count_text)
+    except ValueError:
+        raise ValueError(f"Shard must look like i/N, got {spec!r}")
+    if count < 1 or not 0 <= index < count:
+        raise ValueError(f"Shard index must satisfy 0 <= i < N, got {spec!r}")
+    return index, count
+
+
+def _source_key(path: Path, input_dir: Path) -> str:
+    try:
+        return path.resolve().relative_to(input_dir.resolve()).as_posix()
+    except ValueError:
+        return path.as_posix()
+
+
+def shard_of(path: Path, input_dir: Path, count: int) -> int:
+    """
+    Stable shard number for a contract, from its path relative to the input folder,
+    so every host computes the same partition regardless of scan order.
+    """
+    digest = hashlib.sha1(_source_key(path, input_dir).encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") % count
+
+
+def select_shard(
+    paths: Sequence[Path], input_dir: Path, index: int, count: int
+) -> List[Path]:
+    return [p for p in paths if shard_of(p, input_dir, count) == index]
+
+
+def shard_manifest_path(intermediate_dir: Path, index: int, count: int) -> Path:
+    return intermediate_dir / SHARD_MANIFEST_DIR / f"shard-{index}-of-{count}.json"
+
+
+def write_shard_manifest(
+    results: Sequence[ExtractionResult],
+    intermediate_dir: Path,
+    input_dir: Path,
+    index: int,
+    count: int,
+) -> Path:
+    """Record which contracts this shard processed and where their results are."""
+    manifest = {
+        "shard": index,
+        "count": count,
+        "prompt_version": PROMPT_VERSION,
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "contracts": [
+            {
+                "source": _source_key(r.contract_path, input_dir),
+                "result": intermediate_path(r, Path()).as_posix(),
+                "direction": r.direction,
+                "content_hash": r.content_hash,
+            }
+            for r in results
+        ],
+    }
+    path = shard_manifest_path(intermediate_dir, index, count)
+    ensure_directories(path.parent)
+    path.write_text(json.dumps(manifest, ensure_ascii=False, indent=2), encoding="utf-8")
+    return path
+
+
+def merge_shards(
+    intermediate_dir: Path,
+    input_dir: Path,
+    shard_dirs: Optional[Sequence[Path]] = None,
+) -> Dict[str, object]:
+    """
+    Combine shard outputs into ``intermediate_dir`` and verify completeness.
+
+    Args:
+        intermediate_dir: Target folder; also searched for shard manifests.
+        input_dir: Input folder the shards partitioned (to compute the expected set).
+        shard_dirs: Extra intermediate folders written by other hosts; their result
+            JSON files and manifests are copied into ``intermediate_dir``.
+
+    Returns:
+        Summary with shard count, found/missing shards, per-direction counts,
+        contracts missing or processed twice, and the merged manifest path.
+    """
+    from .document_loader import scan_documents
+
+    manifests: Dict[int, Dict[str, object]] = {}
+    counts = set()
+    for folder in [intermediate_dir, *(shard_dirs or [])]:
+        for manifest_path in sorted((folder / SHARD_MANIFEST_DIR).glob("shard-*-of-*.json")):
+            manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+            counts.add(manifest["count"])
+            manifests[manifest["shard"]] = manifest
+            if folder != intermediate_dir:
+                for entry in manifest["contracts"]:
+                    target = intermediate_dir / entry["result"]
+                    ensure_directories(target.parent)
+                    shutil.copy2(folder / entry["result"], target)
+                target = intermediate_dir / SHARD_MANIFEST_DIR / manifest_path.name
+                ensure_directories(target.parent)
+                shutil.copy2(manifest_path, target)
+    if len(counts) > 1:
+        raise ValueError(f"Shard manifests disagree on the shard count: {sorted(counts)}")
+    count = counts.pop() if counts else 0
+
+    seen: Dict[str, int] = {}
+    duplicated: List[str] = []
+    by_direction = {"upstream": 0, "downstream": 0}
+    contracts = []
+    missing_results: List[str] = []
+    for index in sorted(manifests):
+        for entry in manifests[index]["contracts"]:
+            if entry["source"] in seen:
+                duplicated.append(entry["source"])
+                continue
+            seen[entry["source"]] = index
+            if not (intermediate_dir / entry["result"]).exists():
+                missing_results.append(entry["result"])
+            by_direction[entry["direction"]] += 1
+            contracts.append({**entry, "shard": index})
+
+    expected = {_source_key(p, input_dir) for p in scan_documents(input_dir)}
+    missing = sorted(expected - set(seen))
+    missing_shards = [i for i in range(count) if i not in manifests]
+    complete = bool(count) and not (missing_shards or missing or duplicated or missing_results)
+
+    merged_path = intermediate_dir / MERGED_MANIFEST_NAME
+    merged = {
+        "count": count,
+        "complete": complete,
+        "prompt_versions": sorted({m["prompt_version"] for m in manifests.values()}),
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "summary": by_direction,
+        "contracts": contracts,
+    }
+    merged_path.write_text(json.dumps(merged, ensure_ascii=False, indent=2), encoding="utf-8")
+    return {
+        "count": count,
+        "found_shards": sorted(manifests),
+        "missing_shards": missing_shards,
+        "summary": by_direction,
+        "missing_contracts": missing,
+        "duplicated_contracts": duplicated,
+        "missing_results": missing_results,
+        "complete": complete,
+        "manifest": merged_path,
+    }
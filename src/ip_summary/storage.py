@@ -1,19 +1,31 @@
 from __future__ import annotations
 
+import asyncio
+import hashlib
 import json
+import os
+import sqlite3
+import uuid
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Sequence, Tuple
 
-import pandas as pd
+from .models import DirectionLiteral, ExtractionResult, encode_compact
+from .exports import write_outputs
+from .field_converter import FieldConverter, get_field_converter
+from .history_store import HISTORY_KEY_COLUMNS, HistoryStore
+from .results_index import ResultsIndex
+from .tracing import traced
 
-from .models import DirectionLiteral, ExtractionResult
-from .field_converter import FieldConverter
+if TYPE_CHECKING:
+    import pandas as pd
 
 
 def load_header_columns(path: Path) -> List[str]:
     """
     Read header names from the provided Excel file.
     """
+    import pandas as pd
+
     df = pd.read_excel(path)
     return list(df.columns)
 
@@ -23,77 +35,249 @@ def ensure_directories(*paths: Path) -> None:
         p.mkdir(parents=True, exist_ok=True)
 
 
-def save_intermediate(result: ExtractionResult, intermediate_dir: Path) -> Path:
-    target_dir = intermediate_dir / result.direction
-    ensure_directories(target_dir)
-    output_path = target_dir / f"{result.contract_path.stem}.json"
-    with output_path.open("w", encoding="utf-8") as f:
-        json.dump(
-            result.model_dump(mode="json"),
-            f,
-            ensure_ascii=False,
-            indent=2,
+def result_key(contract_path: Path, input_dir: Optional[Path] = None) -> str:
+    """
+    Intermediate file name (without .json) for a contract: its stem plus a digest
+    of its path relative to ``input_dir``, so contracts with the same name in
+    different subfolders get separate results.
+    """
+    path = Path(contract_path)
+    if input_dir is not None:
+        try:
+            path = path.relative_to(input_dir)
+        except ValueError:
+            pass
+    digest = hashlib.sha1(path.as_posix().encode("utf-8")).hexdigest()[:10]
+    return f"{path.stem}-{digest}"
+
+
+def intermediate_path(result: ExtractionResult, intermediate_dir: Path) -> Path:
+    stem = result.storage_key or result.contract_path.stem
+    return intermediate_dir / result.direction / f"{stem}.json"
+
+
+def result_payload(result: ExtractionResult, compact: bool = False) -> Dict[str, Any]:
+    """
+    JSON payload of a result; ``compact`` stores the raw LLM answers (read only by
+    the pipeline) zlib-compressed.
+    """
+    payload = result.model_dump(mode="json")
+    if compact:
+        payload["raw_extraction"] = encode_compact(payload["raw_extraction"])
+        payload["classification"]["raw_response"] = encode_compact(
+            payload["classification"]["raw_response"]
         )
+    return payload
+
+
+def stage_json(path: Path, payload: Any, compact: bool = False) -> Path:
+    """
+    Write ``payload`` to a temporary sibling of ``path`` and fsync it; the caller
+    renames it into place (``os.replace``) and calls ``sync_directory``.
+    """
+    if compact:
+        text = json.dumps(payload, ensure_ascii=False, separators=(",", ":"))
+    else:
+        text = json.dumps(payload, ensure_ascii=False, indent=2)
+    tmp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex[:8]}.tmp")
+    try:
+        with tmp_path.open("w", encoding="utf-8") as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+    return tmp_path
+
+
+def sync_directory(folder: Path) -> None:
+    """Persist renames in ``folder`` (not possible on Windows, where it is skipped)."""
+    try:
+        fd = os.open(folder, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def write_json_atomic(path: Path, payload: Any, compact: bool = False) -> Path:
+    """Replace ``path`` so that readers and crashes only ever see the old or the new file."""
+    tmp_path = stage_json(path, payload, compact)
+    try:
+        os.replace(tmp_path, path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+    sync_directory(path.parent)
+    return path
+
+
+@traced("save_intermediate")
+def _write_result(
+    output_path: Path, direction: DirectionLiteral, payload: Dict[str, Any], compact: bool
+) -> Path:
+    ensure_directories(output_path.parent)
+    write_json_atomic(output_path, payload, compact)
+    index_updates = [(output_path.name, payload)]
+    removed: List[str] = []
+    legacy = output_path.with_name(f"{Path(payload['contract_path']).stem}.json")
+    if payload.get("storage_key") and legacy != output_path and legacy.exists():
+        # A result of the same contract from before keyed names existed.
+        try:
+            previous = json.loads(legacy.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            previous = None
+        if (
+            previous
+            and not previous.get("storage_key")
+            and previous.get("contract_path") == payload["contract_path"]
+        ):
+            legacy.unlink(missing_ok=True)
+            removed.append(legacy.name)
+    try:
+        index = ResultsIndex(output_path.parent.parent)
+        index.upsert_many(direction, index_updates)
+        for name in removed:
+            index.remove(direction, name)
+    except sqlite3.Error:
+        # The index is derived; the next refresh picks the file up.
+        pass
     return output_path
 
 
+def save_intermediate(result: ExtractionResult, intermediate_dir: Path, compact: bool = False) -> Path:
+    """Write a result atomically (blocking; async code uses ``IntermediateWriter``)."""
+    return _write_result(
+        intermediate_path(result, intermediate_dir),
+        result.direction,
+        result_payload(result, compact),
+        compact,
+    )
+
+
+class IntermediateWriter:
+    """
+    Saves results from async code in worker threads, off the event loop.
+
+    The payload is captured when ``submit`` is called. Writes of the same file
+    never overlap or reorder: while one is in flight, further submissions for
+    that file collapse into the newest payload.
+    """
+
+    def __init__(self, intermediate_dir: Path, compact: bool = False):
+        self.intermediate_dir = intermediate_dir
+        self.compact = compact
+        self._pending: Dict[Path, Tuple[DirectionLiteral, Dict[str, Any]]] = {}
+        self._drains: Dict[Path, asyncio.Task] = {}
+
+    def submit(self, result: ExtractionResult) -> "asyncio.Task[None]":
+        """Queue a write without waiting for it (e.g. from a sync callback)."""
+        path = intermediate_path(result, self.intermediate_dir)
+        self._pending[path] = (result.direction, result_payload(result, self.compact))
+        drain = self._drains.get(path)
+        if drain is None or drain.done():
+            drain = asyncio.ensure_future(self._drain(path))
+            self._drains[path] = drain
+        return drain
+
+    async def save(self, result: ExtractionResult) -> Path:
+        """Write a result and wait until it (or a newer version of it) is on disk."""
+        path = intermediate_path(result, self.intermediate_dir)
+        await self.submit(result)
+        return path
+
+    async def flush(self) -> None:
+        """Wait for every queued write; raises the first write error."""
+        await asyncio.gather(*self._drains.values())
+
+    async def _drain(self, path: Path) -> None:
+        while path in self._pending:
+            direction, payload = self._pending.pop(path)
+            await asyncio.to_thread(_write_result, path, direction, payload, self.compact)
+        # Finished drains are dropped; failed ones stay for ``flush`` to report.
+        if self._drains.get(path) is asyncio.current_task():
+            del self._drains[path]
+
+
+def load_intermediate(path: Path) -> ExtractionResult:
+    with path.open("r", encoding="utf-8") as f:
+        payload = json.load(f)
+    return ExtractionResult.model_validate(payload)
+
+
 def load_intermediate_folder(
     folder: Path, direction: DirectionLiteral
 ) -> List[ExtractionResult]:
     files = sorted(folder.glob("*.json"))
     results: List[ExtractionResult] = []
     for path in files:
-        with path.open("r", encoding="utf-8") as f:
-            payload = json.load(f)
-        results.append(ExtractionResult.model_validate(payload))
+        results.append(load_intermediate(path))
     return [r for r in results if r.direction == direction]
 
 
+def _base_columns(item: Dict[str, Any], direction: DirectionLiteral) -> Dict[str, object]:
+    classification = item["classification"]
+    return {
+        "合同源文件": item["contract_path"],
+        "合同方向": direction,
+        "LLM置信度": classification.get("confidence"),
+        "LLM判定理由": classification.get("reason"),
+    }
+
+
 def aggregate_results(
     intermediate_dir: Path,
     headers: List[str],
     direction: DirectionLiteral,
+    with_history_keys: bool = False,
 ) -> pd.DataFrame:
     """
-    Load user-edited JSON files for the given direction and assemble into a DataFrame.
+    Load user-edited results for the given direction and assemble into a DataFrame.
+
+    Rows come from the task's results index, which re-reads only the JSON files
+    changed since the last call. ``with_history_keys`` adds the
+    ``HISTORY_KEY_COLUMNS`` used by ``append_history``.
     """
-    folder = intermediate_dir / direction
-    results = load_intermediate_folder(folder, direction)
     rows: List[Dict[str, object]] = []
-    for res in results:
-        base = {
-            "合同源文件": str(res.contract_path),
-            "合同方向": direction,
-            "LLM置信度": res.classification.confidence,
-            "LLM判定理由": res.classification.reason,
-        }
-        fields = {h: res.fields.get(h) for h in headers}
-        base.update(fields)
+    for item in ResultsIndex(intermediate_dir).items(direction):
+        base = _base_columns(item, direction)
+        fields = item["fields"]
+        base.update({h: fields.get(h) for h in headers})
+        if with_history_keys:
+            base.update(zip(HISTORY_KEY_COLUMNS, (item["content_hash"], item["prompt_version"])))
         rows.append(base)
     columns = ["合同源文件", "合同方向", "LLM置信度", "LLM判定理由"] + headers
+    if with_history_keys:
+        columns += list(HISTORY_KEY_COLUMNS)
+    import pandas as pd
+
     df = pd.DataFrame(rows, columns=columns)
     return df
 
 
 def write_tabular_outputs(
-    df: pd.DataFrame, output_dir: Path, basename: str
+    df: pd.DataFrame,
+    output_dir: Path,
+    basename: str,
+    formats: Sequence[str] = ("csv", "excel"),
 ) -> Dict[str, Path]:
-    ensure_directories(output_dir)
-    csv_path = output_dir / f"{basename}.csv"
-    excel_path = output_dir / f"{basename}.xlsx"
-    df.to_csv(csv_path, index=False)
-    df.to_excel(excel_path, index=False)
-    return {"csv": csv_path, "excel": excel_path}
-
-
-def append_history(df: pd.DataFrame, history_file: Path) -> None:
-    ensure_directories(history_file.parent)
-    if history_file.exists():
-        existing = pd.read_csv(history_file)
-        combined = pd.concat([existing, df], ignore_index=True)
-    else:
-        combined = df
-    combined.to_csv(history_file, index=False)
+    """
+    Save the rows as a snapshot and stream the requested formats from it; formats
+    left out are rendered on first download (see ``exports.render``).
+    """
+    return write_outputs(df, output_dir, basename, formats)
+
+
+def append_history(
+    df: pd.DataFrame, history_dir: Path, direction: DirectionLiteral
+) -> Dict[str, int]:
+    """Record rows in the direction's history store (see ``HistoryStore.append``)."""
+    return HistoryStore(history_dir, direction).append(df)
 
 
 def aggregate_results_for_database(
@@ -109,44 +293,29 @@ def aggregate_results_for_database(
         intermediate_dir: 中间结果目录
         headers: 表头字段列表
         direction: 合同方向
-        converter: 字段转换器，如果为None则创建默认转换器
+        converter: 字段转换器，如果为None则使用进程内共享的默认转换器
 
     Returns:
-        转换后的DataFrame，文字值已替换为编号
+        转换后的DataFrame，文字值已替换为编号；有映射但未能转换的文字值
+        记录在 ``df.attrs["unmapped"]``（字段名 -> 值列表）
     """
     if converter is None:
-        converter = FieldConverter()
+        converter = get_field_converter()
 
-    folder = intermediate_dir / direction
-    results = load_intermediate_folder(folder, direction)
-    rows: List[Dict[str, object]] = []
-
-    for res in results:
-        base = {
-            "合同源文件": str(res.contract_path),
-            "合同方向": direction,
-            "LLM置信度": res.classification.confidence,
-            "LLM判定理由": res.classification.reason,
-        }
-        # 转换字段值为编号
-        fields = {h: converter.convert(h, res.fields.get(h)) for h in headers}
-        base.update(fields)
-        rows.append(base)
-
-    columns = ["合同源文件", "合同方向", "LLM置信度", "LLM判定理由"] + headers
-    df = pd.DataFrame(rows, columns=columns)
+    df = aggregate_results(intermediate_dir, headers, direction)
+    # 按列转换，每个不同取值只匹配一次
+    df, unmapped = converter.convert_frame(df, headers)
+    df.attrs["unmapped"] = unmapped
     return df
 
 
 def write_database_outputs(
-    df: pd.DataFrame, output_dir: Path, basename: str
+    df: pd.DataFrame,
+    output_dir: Path,
+    basename: str,
+    formats: Sequence[str] = ("csv", "excel"),
 ) -> Dict[str, Path]:
     """
     Write outputs formatted for database import (with codes instead of text).
     """
-    ensure_directories(output_dir)
-    csv_path = output_dir / f"{basename}_db.csv"
-    excel_path = output_dir / f"{basename}_db.xlsx"
-    df.to_csv(csv_path, index=False)
-    df.to_excel(excel_path, index=False)
-    return {"csv": csv_path, "excel": excel_path}
+    return write_outputs(df, output_dir, f"{basename}_db", formats)
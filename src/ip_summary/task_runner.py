@@ -0,0 +1,231 @@
+from __future__ import annotations
+
+import asyncio
+import os
+import socket
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from .config import Settings, get_settings
+from .job_queue import Job, JobQueue
+from .pipeline import ProgressCallback, load_headers, process_contracts, reextract_fields, reprocess_stale
+from .run_control import RunControl
+from .tasks import Task, TaskManager
+
+JOB_KINDS = ("run", "reprocess", "reextract")
+# Seconds between checks for pause/resume/cancel requests while a job runs.
+CONTROL_POLL_SECONDS = 2.0
+
+
+def settings_for_task(config_path: Path, task: Task, concurrency: Optional[int] = None) -> Settings:
+    settings = get_settings(config_path)
+    update: Dict[str, Any] = {
+        "input_dir": task.input_dir,
+        "intermediate_dir": task.intermediate_dir,
+        "final_dir": task.final_dir,
+    }
+    if concurrency:
+        update["concurrent_requests"] = concurrency
+    return Settings(llm=settings.llm, pipeline=settings.pipeline.model_copy(update=update))
+
+
+async def execute_task_job(
+    task_manager: TaskManager,
+    task_id: str,
+    kind: str,
+    params: Dict[str, Any],
+    config_path: Path,
+    upstream_header_path: Path,
+    downstream_header_path: Path,
+    on_event: Optional[ProgressCallback] = None,
+    control: Optional[RunControl] = None,
+) -> None:
+    """
+    Run one task job and record its outcome on the task.
+
+    Shared by the API (in-process mode) and ``main.py worker``; exceptions are
+    recorded as a failed task status and re-raised for the caller. A run stopped
+    through ``control`` ends with status ``cancelled`` and keeps finished results.
+    Per-file outcomes (``reextract``) are stored in the task's ``last_result``.
+    """
+    control = control or RunControl()
+    task = task_manager.get_task(task_id)
+    settings = settings_for_task(config_path, task, params.get("concurrency"))
+    if task.last_result is not None:
+        task_manager.update_result(task_id, None)
+    try:
+        if kind == "run":
+            task_manager.update_status(task_id, "running", "LLM处理中")
+            force_direction = params.get("force_direction")
+            results = await process_contracts(
+                settings=settings,
+                my_party=params.get("my_party") or task.my_party,
+                upstream_header_path=upstream_header_path,
+                downstream_header_path=downstream_header_path,
+                force_direction=force_direction if force_direction in {"upstream", "downstream"} else None,
+                on_event=on_event,
+                control=control,
+            )
+            summary = {"upstream": 0, "downstream": 0}
+            for r in results:
+                summary[r.direction] += 1
+            task_manager.update_summary(task_id, summary)
+            if control.cancelled:
+                task_manager.update_status(task_id, "cancelled", f"已取消，保留 {len(results)} 份已完成结果")
+            else:
+                task_manager.update_status(task_id, "completed", f"处理完成 {len(results)} 份合同")
+        elif kind == "reprocess":
+            task_manager.update_status(task_id, "running", "按提示词版本重新处理中")
+            headers = load_headers(upstream_header_path, downstream_header_path)
+            rerun = await reprocess_stale(settings, headers, control=control)
+            summary = {
+                d: len(list((Path(task.intermediate_dir) / d).glob("*.json")))
+                for d in ("upstream", "downstream")
+            }
+            task_manager.update_summary(task_id, summary)
+            if control.cancelled:
+                task_manager.update_status(task_id, "cancelled", f"已取消，已重新处理 {len(rerun)} 份合同")
+            else:
+                task_manager.update_status(task_id, "completed", f"重新处理 {len(rerun)} 份合同")
+        elif kind == "reextract":
+            task_manager.update_status(task_id, "running", "按字段重新提取中")
+            headers = load_headers(upstream_header_path, downstream_header_path)
+            updated = await reextract_fields(
+                settings,
+                headers,
+                params["direction"],
+                params["filenames"],
+                params["headers"],
+                include_reviewed=bool(params.get("include_reviewed")),
+                control=control,
+            )
+            task_manager.update_result(
+                task_id, {"kind": "reextract", "direction": params["direction"], "updated": updated}
+            )
+            changed = sum(1 for fields in updated.values() if fields)
+            if control.cancelled:
+                task_manager.update_status(task_id, "cancelled", f"已取消，已重新提取 {changed} 份合同")
+            else:
+                task_manager.update_status(task_id, "completed", f"重新提取 {changed} 份合同")
+        else:
+            raise ValueError(f"Unknown job kind: {kind}")
+    except Exception as exc:
+        task_manager.update_status(task_id, "failed", str(exc))
+        raise
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+async def run_worker(
+    queue: JobQueue,
+    task_manager: TaskManager,
+    config_path: Path,
+    upstream_header_path: Path,
+    downstream_header_path: Path,
+    worker_id: Optional[str] = None,
+    poll_interval: float = 2.0,
+    lease_seconds: float = 60.0,
+    exit_when_idle: bool = False,
+) -> int:
+    """
+    Claim and execute queued jobs until stopped (or until the queue is empty when
+    ``exit_when_idle``). Returns the number of jobs processed.
+    """
+    worker_id = worker_id or default_worker_id()
+    processed = 0
+    while True:
+        job = queue.claim(worker_id, lease_seconds)
+        if job is None:
+            if exit_when_idle:
+                return processed
+            await asyncio.sleep(poll_interval)
+            continue
+        await _run_claimed_job(
+            job,
+            queue,
+            task_manager,
+            config_path,
+            upstream_header_path,
+            downstream_header_path,
+            worker_id,
+            lease_seconds,
+        )
+        processed += 1
+
+
+async def _run_claimed_job(
+    job: Job,
+    queue: JobQueue,
+    task_manager: TaskManager,
+    config_path: Path,
+    upstream_header_path: Path,
+    downstream_header_path: Path,
+    worker_id: str,
+    lease_seconds: float,
+) -> None:
+    print(f"[{worker_id}] job {job.id}: {job.kind} task {job.task_id} (attempt {job.attempts})")
+    control = RunControl()
+    work = asyncio.create_task(
+        execute_task_job(
+            task_manager,
+            job.task_id,
+            job.kind,
+            job.params,
+            config_path,
+            upstream_header_path,
+            downstream_header_path,
+            control=control,
+        )
+    )
+
+    def _apply(action: Optional[str]) -> None:
+        if action == "cancel" and not control.cancelled:
+            control.cancel()
+        elif action == "pause" and control.state == "running":
+            control.pause()
+            task_manager.update_status(job.task_id, "paused", "已暂停")
+        elif action == "resume" and control.state == "paused":
+            control.resume()
+            task_manager.update_status(job.task_id, "running", "继续处理中")
+
+    _apply(job.control)
+
+    async def _heartbeat() -> None:
+        # Poll for pause/cancel requests more often than the lease needs renewing.
+        interval = min(lease_seconds / 3, CONTROL_POLL_SECONDS)
+        renewed = time.monotonic()
+        while True:
+            await asyncio.sleep(interval)
+            _apply(await asyncio.to_thread(queue.requested_control, job.id))
+            if time.monotonic() - renewed < lease_seconds / 3:
+                continue
+            renewed = time.monotonic()
+            if not await asyncio.to_thread(queue.heartbeat, job.id, worker_id, lease_seconds):
+                # Lease lost: another worker owns the job now, stop duplicating work.
+                work.cancel()
+                return
+
+    beat = asyncio.create_task(_heartbeat())
+    try:
+        await work
+    except asyncio.CancelledError:
+        if work.cancelled() and not beat.done():
+            # This worker is shutting down; let another worker pick the job up.
+            queue.release(job.id, worker_id)
+            raise
+        print(f"[{worker_id}] job {job.id}: lease lost, abandoned")
+    except Exception as exc:
+        queue.fail(job.id, worker_id, str(exc))
+        print(f"[{worker_id}] job {job.id}: failed: {exc}")
+    else:
+        if control.cancelled:
+            queue.mark_cancelled(job.id, worker_id)
+            print(f"[{worker_id}] job {job.id}: cancelled")
+        else:
+            queue.complete(job.id, worker_id)
+            print(f"[{worker_id}] job {job.id}: done")
+    finally:
+        beat.cancel()
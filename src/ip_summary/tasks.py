@@ -1,14 +1,43 @@
 from __future__ import annotations
 
 import json
+import os
 import uuid
+from contextlib import contextmanager
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Any, Dict, Iterator, List, Optional
 
 from pydantic import BaseModel, Field
 
 
+if os.name == "nt":
+    import msvcrt
+
+    def _lock_file(fd: int) -> None:
+        os.lseek(fd, 0, os.SEEK_SET)
+        while True:
+            try:
+                # LK_LOCK gives up after ~10 s of retries; keep waiting.
+                msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+                return
+            except OSError:
+                continue
+
+    def _unlock_file(fd: int) -> None:
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+
+else:
+    import fcntl
+
+    def _lock_file(fd: int) -> None:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+
+    def _unlock_file(fd: int) -> None:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+
+
 class Task(BaseModel):
     id: str
     name: str
@@ -17,6 +46,9 @@ class Task(BaseModel):
     status: str = Field(default="created")
     message: Optional[str] = None
     summary: Optional[Dict[str, int]] = None
+    # Details of the last job beyond the counts, e.g. {"kind": "reextract",
+    # "updated": {filename: [headers]}}; cleared when a job starts.
+    last_result: Optional[Dict[str, Any]] = None
     input_dir: Path
     intermediate_dir: Path
     final_dir: Path
@@ -27,6 +59,19 @@ class TaskManager:
         self.root = root
         self.root.mkdir(parents=True, exist_ok=True)
         self.index_path = self.root / "index.json"
+        self.lock_path = self.root / "index.lock"
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        # API and worker processes share index.json; serialize read-modify-write
+        # cycles with an OS lock on a file that is never removed. The kernel drops
+        # the lock when its holder exits, so a crashed process cannot leave it stale.
+        with open(self.lock_path, "a+b") as f:
+            _lock_file(f.fileno())
+            try:
+                yield
+            finally:
+                _unlock_file(f.fileno())
 
     def _load_index(self) -> Dict[str, Task]:
         if not self.index_path.exists():
@@ -37,31 +82,34 @@ class TaskManager:
     def _save_index(self, data: Dict[str, Task]) -> None:
         # Use mode="json" to ensure Path objects are serialized as strings
         payload = {k: v.model_dump(mode="json") for k, v in data.items()}
-        self.index_path.write_text(json.dumps(payload, ensure_ascii=False, indent=2), encoding="utf-8")
+        tmp_path = self.index_path.with_suffix(f".{os.getpid()}.tmp")
+        tmp_path.write_text(json.dumps(payload, ensure_ascii=False, indent=2), encoding="utf-8")
+        os.replace(tmp_path, self.index_path)
 
     def create_task(self, name: str, my_party: str) -> Task:
-        data = self._load_index()
-        task_id = uuid.uuid4().hex[:8]
-        task_dir = self.root / task_id
-        input_dir = task_dir / "input"
-        intermediate_dir = task_dir / "intermediate"
-        final_dir = task_dir / "final"
-        for p in (input_dir, intermediate_dir, final_dir):
-            p.mkdir(parents=True, exist_ok=True)
-        task = Task(
-            id=task_id,
-            name=name,
-            my_party=my_party,
-            created_at=datetime.utcnow().isoformat(),
-            status="created",
-            message=None,
-            input_dir=input_dir,
-            intermediate_dir=intermediate_dir,
-            final_dir=final_dir,
-        )
-        data[task_id] = task
-        self._save_index(data)
-        return task
+        with self._locked():
+            data = self._load_index()
+            task_id = uuid.uuid4().hex[:8]
+            task_dir = self.root / task_id
+            input_dir = task_dir / "input"
+            intermediate_dir = task_dir / "intermediate"
+            final_dir = task_dir / "final"
+            for p in (input_dir, intermediate_dir, final_dir):
+                p.mkdir(parents=True, exist_ok=True)
+            task = Task(
+                id=task_id,
+                name=name,
+                my_party=my_party,
+                created_at=datetime.utcnow().isoformat(),
+                status="created",
+                message=None,
+                input_dir=input_dir,
+                intermediate_dir=intermediate_dir,
+                final_dir=final_dir,
+            )
+            data[task_id] = task
+            self._save_index(data)
+            return task
 
     def list_tasks(self) -> List[Task]:
         return list(self._load_index().values())
@@ -73,22 +121,41 @@ class TaskManager:
         return data[task_id]
 
     def update_status(self, task_id: str, status: str, message: Optional[str] = None) -> Task:
-        data = self._load_index()
-        if task_id not in data:
-            raise KeyError(f"Task {task_id} not found")
-        task = data[task_id]
-        task.status = status
-        task.message = message
-        data[task_id] = task
-        self._save_index(data)
-        return task
-
-    def update_summary(self, task_id: str, summary: Dict[str, int]) -> Task:
-        data = self._load_index()
-        if task_id not in data:
-            raise KeyError(f"Task {task_id} not found")
-        task = data[task_id]
-        task.summary = summary
-        data[task_id] = task
-        self._save_index(data)
-        return task
+        with self._locked():
+            data = self._load_index()
+            if task_id not in data:
+                raise KeyError(f"Task {task_id} not found")
+            task = data[task_id]
+            task.status = status
+            task.message = message
+            data[task_id] = task
+            self._save_index(data)
+            return task
+
+    def update_summary(self, task_id: str, summary: Optional[Dict[str, int]]) -> Task:
+        with self._locked():
+            data = self._load_index()
+            if task_id not in data:
+                raise KeyError(f"Task {task_id} not found")
+            task = data[task_id]
+            task.summary = summary
+            data[task_id] = task
+            self._save_index(data)
+            return task
+
+    def update_result(self, task_id: str, result: Optional[Dict[str, Any]]) -> Task:
+        with self._locked():
+            data = self._load_index()
+            if task_id not in data:
+                raise KeyError(f"Task {task_id} not found")
+            task = data[task_id]
+            task.last_result = result
+            data[task_id] = task
+            self._save_index(data)
+            return task
+
+    def delete_task(self, task_id: str) -> None:
+        with self._locked():
+            data = self._load_index()
+            data.pop(task_id, None)
+            self._save_index(data)
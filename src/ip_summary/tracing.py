@@ -0,0 +1,376 @@
+from __future__ import annotations
+
+import functools
+import inspect
+import json
+import math
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, TypeVar
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+TRACE_FILE = "_traces.jsonl"
+# A trace file above this size is moved to ``{name}.1`` when the next run starts.
+MAX_TRACE_BYTES = 20 * 1024 * 1024
+# Buffered spans are appended to the file in batches of this size.
+FLUSH_EVERY = 200
+SERVICE_NAME = "ip_summary"
+# OTLP status codes.
+_STATUS_OK = 1
+_STATUS_ERROR = 2
+
+# Tracer of the run the current coroutine (or worker thread) belongs to, and the
+# span it is inside; both are inherited by tasks and asyncio.to_thread calls.
+current_tracer: ContextVar[Optional["Tracer"]] = ContextVar("current_tracer", default=None)
+current_span: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+
+
+class Span:
+    """One timed operation; ``end`` hands it to the tracer it was started with."""
+
+    __slots__ = (
+        "tracer",
+        "name",
+        "trace_id",
+        "span_id",
+        "parent_id",
+        "start_ns",
+        "end_ns",
+        "attributes",
+        "error",
+    )
+
+    def __init__(
+        self, tracer: "Tracer", name: str, parent: Optional["Span"], attributes: Dict[str, Any]
+    ):
+        self.tracer = tracer
+        self.name = name
+        self.trace_id = parent.trace_id if parent is not None else uuid.uuid4().hex
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent.span_id if parent is not None else None
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.attributes = attributes
+        self.error: Optional[str] = None
+
+    def set(self, **attributes: Any) -> None:
+        self.attributes.update(attributes)
+
+    def end(self, error: Optional[BaseException] = None) -> None:
+        if self.end_ns is not None:
+            return
+        self.end_ns = time.time_ns()
+        if error is not None:
+            self.error = f"{type(error).__name__}: {error}"
+        self.tracer.record(self)
+
+    def to_otlp(self) -> Dict[str, Any]:
+        span: Dict[str, Any] = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": 1,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [_otlp_attribute(k, v) for k, v in self.attributes.items()],
+            "status": {"code": _STATUS_OK},
+        }
+        if self.error:
+            span["status"] = {"code": _STATUS_ERROR, "message": self.error}
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+
+def _otlp_attribute(key: str, value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+
+def _attribute_value(value: Dict[str, Any]) -> Any:
+    if "intValue" in value:
+        return int(value["intValue"])
+    for kind in ("boolValue", "doubleValue", "stringValue"):
+        if kind in value:
+            return value[kind]
+    return None
+
+
+class Tracer:
+    """
+    Collects the spans of one pipeline run and appends them to a trace file.
+
+    Each line of the file is an OTLP/JSON ``ExportTraceServiceRequest`` (the
+    format of the OpenTelemetry collector's file exporter), so it can be loaded
+    into any OTLP-capable viewer; ``read_spans`` reads it back. The run id and
+    kind are resource attributes of every line.
+    """
+
+    def __init__(self, path: Path, kind: str):
+        self.path = path
+        self.run_id = uuid.uuid4().hex[:12]
+        self.kind = kind
+        self._buffer: List[Span] = []
+        self._lock = threading.Lock()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            if path.stat().st_size > MAX_TRACE_BYTES:
+                os.replace(path, path.with_name(f"{path.name}.1"))
+        except FileNotFoundError:
+            pass
+
+    def record(self, span: Span) -> None:
+        with self._lock:
+            self._buffer.append(span)
+            full = len(self._buffer) >= FLUSH_EVERY
+        if full:
+            self.flush()
+
+    def flush(self) -> None:
+        with self._lock:
+            spans, self._buffer = self._buffer, []
+            if not spans:
+                return
+            request = {
+                "resourceSpans": [
+                    {
+                        "resource": {
+                            "attributes": [
+                                _otlp_attribute("service.name", SERVICE_NAME),
+                                _otlp_attribute("run.id", self.run_id),
+                                _otlp_attribute("run.kind", self.kind),
+                            ]
+                        },
+                        "scopeSpans": [
+                            {"scope": {"name": SERVICE_NAME}, "spans": [s.to_otlp() for s in spans]}
+                        ],
+                    }
+                ]
+            }
+            with self.path.open("a", encoding="utf-8") as f:
+                f.write(json.dumps(request, ensure_ascii=False) + "\n")
+
+
+@contextmanager
+def trace_run(path: Optional[Path], kind: str) -> Iterator[Optional[Tracer]]:
+    """Trace everything started inside the block to ``path`` (no-op when None)."""
+    if path is None:
+        yield None
+        return
+    tracer = Tracer(path, kind)
+    token = current_tracer.set(tracer)
+    try:
+        yield tracer
+    finally:
+        current_tracer.reset(token)
+        tracer.flush()
+
+
+def start_span(name: str, **attributes: Any) -> Optional[Span]:
+    """
+    Start a child of the current span without making it current (for work that
+    spans yields of an async generator); call ``end`` on it. None when not tracing.
+    """
+    tracer = current_tracer.get()
+    if tracer is None:
+        return None
+    return Span(tracer, name, current_span.get(), attributes)
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Optional[Span]]:
+    """Time the block as a child of the current span; no-op when not tracing."""
+    started = start_span(name, **attributes)
+    if started is None:
+        yield None
+        return
+    token = current_span.set(started)
+    try:
+        yield started
+    except BaseException as exc:
+        started.end(exc)
+        raise
+    finally:
+        current_span.reset(token)
+        started.end()
+
+
+def annotate(**attributes: Any) -> None:
+    """Add attributes to the current span, if any."""
+    current = current_span.get()
+    if current is not None:
+        current.set(**attributes)
+
+
+def traced(name: str) -> Callable[[F], F]:
+    """Run every call of the (sync or async) function inside ``span(name)``."""
+
+    def decorate(fn: F) -> F:
+        if inspect.iscoroutinefunction(fn):
+
+            @functools.wraps(fn)
+            async def async_wrapper(*args: Any, **kwargs: Any) -> Any:
+                with span(name):
+                    return await fn(*args, **kwargs)
+
+            return async_wrapper  # type: ignore[return-value]
+
+        @functools.wraps(fn)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            with span(name):
+                return fn(*args, **kwargs)
+
+        return wrapper  # type: ignore[return-value]
+
+    return decorate
+
+
+def read_spans(path: Path, run_id: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Spans of one run from a trace file (the latest run when ``run_id`` is None,
+    every run for ``"*"``), as flat dicts ordered by start time.
+    """
+    if not path.exists():
+        return []
+    lines: List[Dict[str, Any]] = []
+    with path.open(encoding="utf-8") as f:
+        for line in f:
+            try:
+                lines.append(json.loads(line))
+            except ValueError:
+                # Partial line of a run that was killed mid-write.
+                continue
+    spans: List[Dict[str, Any]] = []
+    for request in lines:
+        for resource in request.get("resourceSpans", []):
+            meta = {a["key"]: _attribute_value(a["value"]) for a in resource["resource"]["attributes"]}
+            for scope in resource.get("scopeSpans", []):
+                for raw in scope.get("spans", []):
+                    start, end = int(raw["startTimeUnixNano"]), int(raw["endTimeUnixNano"])
+                    spans.append(
+                        {
+                            "run_id": meta.get("run.id"),
+                            "run_kind": meta.get("run.kind"),
+                            "name": raw["name"],
+                            "trace_id": raw["traceId"],
+                            "span_id": raw["spanId"],
+                            "parent_id": raw.get("parentSpanId"),
+                            "start": start / 1e9,
+                            "duration_ms": round((end - start) / 1e6, 3),
+                            "attributes": {
+                                a["key"]: _attribute_value(a["value"]) for a in raw.get("attributes", [])
+                            },
+                            "error": raw.get("status", {}).get("message"),
+                        }
+                    )
+    if run_id is None and spans:
+        run_id = max(spans, key=lambda s: s["start"])["run_id"]
+    if run_id != "*":
+        spans = [s for s in spans if s["run_id"] == run_id]
+    spans.sort(key=lambda s: s["start"])
+    return spans
+
+
+def _percentile(values: List[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(fraction * len(ordered)) - 1))]
+
+
+def summarize(spans: List[Dict[str, Any]], top: int = 10) -> Dict[str, Any]:
+    """
+    Where the time went: per stage (span name) count, total, mean, p95 and max
+    milliseconds, and the ``top`` slowest contracts with their time per stage.
+
+    Stages nest (``call_llm`` contains ``llm.queue`` and ``llm.request``, and
+    ``extract`` contains ``call_llm``), so stage totals overlap. A contract's time
+    is its ``contract`` span plus the parsing of its file (``load_document``).
+    """
+    stages: Dict[str, List[float]] = {}
+    errors: Dict[str, int] = {}
+    for s in spans:
+        stages.setdefault(s["name"], []).append(s["duration_ms"])
+        if s["error"]:
+            errors[s["name"]] = errors.get(s["name"], 0) + 1
+
+    roots = {s["trace_id"]: s for s in spans if s["name"] == "contract"}
+    contracts: Dict[str, Dict[str, Any]] = {}
+    for trace_id, root in roots.items():
+        key = str(root["attributes"].get("contract"))
+        entry = contracts.setdefault(key, {"contract": key, "total_ms": 0.0, "stages": {}, "errors": 0})
+        entry.update({k: v for k, v in root["attributes"].items() if k != "contract"})
+        entry["total_ms"] += root["duration_ms"]
+    for s in spans:
+        if s["name"] == "contract":
+            continue
+        root = roots.get(s["trace_id"])
+        if root is not None:
+            key = str(root["attributes"].get("contract"))
+        elif s["name"] == "load_document" and "contract" in s["attributes"]:
+            key = str(s["attributes"]["contract"])
+            if key not in contracts:
+                continue
+            contracts[key]["total_ms"] += s["duration_ms"]
+        else:
+            continue
+        entry = contracts[key]
+        entry["stages"][s["name"]] = round(entry["stages"].get(s["name"], 0.0) + s["duration_ms"], 3)
+        entry["errors"] += 1 if s["error"] else 0
+
+    slowest = sorted(contracts.values(), key=lambda c: c["total_ms"], reverse=True)[:top]
+    for entry in slowest:
+        entry["total_ms"] = round(entry["total_ms"], 3)
+    return {
+        "run_id": spans[-1]["run_id"] if spans else None,
+        "spans": len(spans),
+        "contracts": len(contracts),
+        "stages": sorted(
+            (
+                {
+                    "name": name,
+                    "count": len(values),
+                    "total_ms": round(sum(values), 3),
+                    "mean_ms": round(sum(values) / len(values), 3),
+                    "p95_ms": round(_percentile(values, 0.95), 3),
+                    "max_ms": round(max(values), 3),
+                    "errors": errors.get(name, 0),
+                }
+                for name, values in stages.items()
+            ),
+            key=lambda stage: stage["total_ms"],
+            reverse=True,
+        ),
+        "slowest_contracts": slowest,
+    }
+
+
+def list_runs(spans: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Runs among ``spans`` (from ``read_spans(path, "*")``), oldest first."""
+    runs: Dict[str, Dict[str, Any]] = {}
+    for s in spans:
+        run = runs.setdefault(
+            s["run_id"], {"run_id": s["run_id"], "kind": s["run_kind"], "start": s["start"], "spans": 0}
+        )
+        run["start"] = min(run["start"], s["start"])
+        run["spans"] += 1
+    return sorted(runs.values(), key=lambda r: r["start"])
+
+
+def contract_spans(spans: List[Dict[str, Any]], contract: str) -> List[Dict[str, Any]]:
+    """Spans of the contracts whose path contains ``contract``, including their parsing."""
+    traces = {
+        s["trace_id"]
+        for s in spans
+        if s["name"] in ("contract", "load_document") and contract in str(s["attributes"].get("contract", ""))
+    }
+    return [s for s in spans if s["trace_id"] in traces]
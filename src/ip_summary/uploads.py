@@ -0,0 +1,191 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import shutil
+import tempfile
+import zipfile
+import zlib
+from pathlib import Path, PurePosixPath
+from typing import List, Optional, Protocol, Tuple
+
+from .document_loader import SUPPORTED_EXTENSIONS
+
+CHUNK_SIZE = 1024 * 1024
+# Defaults for extracted archives: total uncompressed size, entry count, and the
+# compression ratio above which an entry is treated as a zip bomb.
+MAX_ARCHIVE_BYTES = 2 * 1024 * 1024 * 1024
+MAX_ARCHIVE_FILES = 5000
+MAX_COMPRESSION_RATIO = 200
+# Zip flag bit 11: entry names are UTF-8. Archives made on Chinese Windows
+# leave it unset and store names in GBK.
+_UTF8_FLAG = 0x800
+# Zip flag bit 0: the entry is encrypted.
+_ENCRYPTED_FLAG = 0x1
+
+
+class UploadRejected(ValueError):
+    """Raised when an upload or archive exceeds a limit or is unsafe to extract."""
+
+
+class AsyncReader(Protocol):
+    async def read(self, size: int = -1) -> bytes: ...
+
+
+def safe_filename(filename: Optional[str]) -> str:
+    """Last path component of a client-supplied name (browsers may send folders)."""
+    name = PurePosixPath((filename or "").replace("\\", "/")).name
+    if name in {"", ".", ".."}:
+        raise UploadRejected(f"Invalid file name: {filename!r}")
+    return name
+
+
+async def stream_to_file(
+    source: AsyncReader,
+    dest: Path,
+    max_bytes: int,
+    chunk_size: int = CHUNK_SIZE,
+    display_name: Optional[str] = None,
+) -> Tuple[int, str]:
+    """
+    Copy an upload to ``dest`` chunk by chunk, hashing as it goes.
+
+    The file is written under a temporary name and renamed once complete, so a
+    failed or oversized upload never leaves a partial contract in the input folder.
+
+    Returns:
+        ``(size_in_bytes, sha256_hex)``.
+    """
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = dest.with_name(f".{dest.name}.part")
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with tmp_path.open("wb") as out:
+            while True:
+                chunk = await source.read(chunk_size)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadRejected(
+                        f"{display_name or dest.name} exceeds the upload limit of {max_bytes} bytes"
+                    )
+                digest.update(chunk)
+                out.write(chunk)
+        os.replace(tmp_path, dest)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+    return size, digest.hexdigest()
+
+
+def _entry_name(info: zipfile.ZipInfo) -> str:
+    if info.flag_bits & _UTF8_FLAG:
+        return info.filename
+    try:
+        return info.filename.encode("cp437").decode("gbk")
+    except (UnicodeEncodeError, UnicodeDecodeError):
+        return info.filename
+
+
+def _safe_member_path(dest_dir: Path, name: str) -> Optional[Path]:
+    """Target path inside ``dest_dir``, or None for entries that would escape it."""
+    parts = PurePosixPath(name.replace("\\", "/")).parts
+    if not parts or parts[0] == "/" or ".." in parts or ":" in parts[0]:
+        return None
+    target = dest_dir.joinpath(*parts).resolve()
+    root = dest_dir.resolve()
+    if target != root and root not in target.parents:
+        return None
+    return target
+
+
+def extract_archive(
+    archive: Path,
+    dest_dir: Path,
+    max_total_bytes: int = MAX_ARCHIVE_BYTES,
+    max_files: int = MAX_ARCHIVE_FILES,
+    max_ratio: float = MAX_COMPRESSION_RATIO,
+    display_name: Optional[str] = None,
+) -> Tuple[List[Path], List[str]]:
+    """
+    Extract the supported contracts of a zip archive into ``dest_dir``.
+
+    Entries are streamed to disk one at a time, keeping their folder structure.
+    Paths escaping ``dest_dir`` (zip slip) and unsupported or hidden files are
+    skipped; archives whose declared or actual size breaks the limits, or with
+    encrypted or corrupt entries, are rejected. Everything is extracted into a
+    staging folder first and moved into ``dest_dir`` only once the whole archive
+    has succeeded, so a rejected archive leaves existing files untouched.
+    Blocking, so run it in a thread from async code.
+
+    Returns:
+        ``(extracted_paths, skipped_entry_names)``.
+    """
+    label = display_name or archive.name
+    try:
+        zf = zipfile.ZipFile(archive)
+    except zipfile.BadZipFile as exc:
+        raise UploadRejected(f"{label} is not a valid zip archive: {exc}")
+
+    extracted: List[Path] = []
+    skipped: List[str] = []
+    with zf:
+        members = [info for info in zf.infolist() if not info.is_dir()]
+        if len(members) > max_files:
+            raise UploadRejected(f"{label} holds {len(members)} files (limit {max_files})")
+        declared = sum(info.file_size for info in members)
+        if declared > max_total_bytes:
+            raise UploadRejected(f"{label} expands to {declared} bytes (limit {max_total_bytes})")
+        for info in members:
+            if info.compress_size and info.file_size / info.compress_size > max_ratio:
+                raise UploadRejected(f"{_entry_name(info)} in {label} has a suspicious compression ratio")
+
+        for info in members:
+            if info.flag_bits & _ENCRYPTED_FLAG:
+                raise UploadRejected(f"{_entry_name(info)} in {label} is encrypted")
+
+        dest_dir.mkdir(parents=True, exist_ok=True)
+        staging = Path(tempfile.mkdtemp(prefix=".extract-", dir=dest_dir.parent))
+        try:
+            staged: List[Tuple[Path, Path]] = []
+            written = 0
+            for info in members:
+                name = _entry_name(info)
+                pure = PurePosixPath(name.replace("\\", "/"))
+                target = _safe_member_path(dest_dir, name)
+                if (
+                    target is None
+                    or pure.suffix.lower() not in SUPPORTED_EXTENSIONS
+                    or any(part.startswith((".", "__MACOSX", "~$")) for part in pure.parts)
+                ):
+                    skipped.append(name)
+                    continue
+                staged_path = staging / target.relative_to(dest_dir.resolve())
+                staged_path.parent.mkdir(parents=True, exist_ok=True)
+                try:
+                    with zf.open(info) as src, staged_path.open("wb") as out:
+                        # The declared sizes can lie: count what is actually inflated.
+                        remaining = info.file_size
+                        while True:
+                            chunk = src.read(CHUNK_SIZE)
+                            if not chunk:
+                                break
+                            remaining -= len(chunk)
+                            written += len(chunk)
+                            if remaining < 0 or written > max_total_bytes:
+                                raise UploadRejected(f"{name} in {label} inflates beyond its declared size")
+                            out.write(chunk)
+                except (RuntimeError, zipfile.BadZipFile, zlib.error, NotImplementedError) as exc:
+                    raise UploadRejected(f"{name} in {label} cannot be extracted: {exc}")
+                staged.append((staged_path, target))
+
+            for staged_path, target in staged:
+                target.parent.mkdir(parents=True, exist_ok=True)
+                os.replace(staged_path, target)
+                extracted.append(target)
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+    return extracted, skipped
+
@@ -0,0 +1,254 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .config import Settings
+from .document_loader import scan_documents
+from .models import DirectionLiteral
+from .pipeline import aggregate_to_outputs, load_headers, process_contracts
+
+WATCH_STATE_NAME = "_watch_state.json"
+# Editor lock files and partial downloads that share a supported suffix.
+_IGNORED_PREFIXES = ("~$", ".")
+
+
+@dataclass
+class _Pending:
+    signature: Tuple[int, float]
+    stable_since: float
+
+
+@dataclass
+class WatchState:
+    """Per-file record of what the watcher already processed (persisted across restarts)."""
+
+    path: Path
+    files: Dict[str, Dict[str, object]] = field(default_factory=dict)
+
+    @classmethod
+    def load(cls, path: Path) -> "WatchState":
+        if path.exists():
+            return cls(path=path, files=json.loads(path.read_text(encoding="utf-8")))
+        return cls(path=path)
+
+    def save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(self.files, ensure_ascii=False, indent=2), encoding="utf-8")
+        tmp_path.replace(self.path)
+
+    def is_current(self, key: str, signature: Tuple[int, float]) -> bool:
+        entry = self.files.get(key)
+        return entry is not None and (entry["size"], entry["mtime"]) == signature
+
+    def record(self, key: str, signature: Tuple[int, float], error: Optional[str] = None) -> None:
+        self.files[key] = {
+            "size": signature[0],
+            "mtime": signature[1],
+            "processed_at": datetime.now().isoformat(timespec="seconds"),
+            "error": error,
+        }
+
+
+def _signature(path: Path) -> Optional[Tuple[int, float]]:
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return None
+    return stat.st_size, stat.st_mtime
+
+
+class StabilityTracker:
+    """
+    Debounce files that are still being copied: a file is ready once its size and
+    mtime have not changed for ``settle_seconds``.
+    """
+
+    def __init__(self, settle_seconds: float):
+        self.settle_seconds = settle_seconds
+        self._pending: Dict[Path, _Pending] = {}
+
+    def ready(
+        self, candidates: List[Path], now: Optional[float] = None
+    ) -> List[Tuple[Path, Tuple[int, float]]]:
+        now = time.time() if now is None else now
+        ready = []
+        seen = set()
+        for path in candidates:
+            signature = _signature(path)
+            if signature is None or signature[0] == 0:
+                continue
+            seen.add(path)
+            pending = self._pending.get(path)
+            if pending is None or pending.signature != signature:
+                self._pending[path] = _Pending(signature=signature, stable_since=now)
+                continue
+            if now - pending.stable_since >= self.settle_seconds:
+                ready.append((path, signature))
+        for path in list(self._pending):
+            if path not in seen:
+                del self._pending[path]
+        return ready
+
+    def forget(self, path: Path) -> None:
+        self._pending.pop(path, None)
+
+
+def _start_file_events(folder: Path, wake: asyncio.Event) -> Optional[object]:
+    """Wake the loop on filesystem events when the optional watchdog package exists."""
+    try:
+        from watchdog.events import FileSystemEventHandler
+        from watchdog.observers import Observer
+    except ImportError:
+        return None
+
+    loop = asyncio.get_running_loop()
+
+    class _Handler(FileSystemEventHandler):
+        def on_any_event(self, event) -> None:  # noqa: ANN001 - watchdog callback
+            loop.call_soon_threadsafe(wake.set)
+
+    observer = Observer()
+    observer.schedule(_Handler(), str(folder), recursive=True)
+    observer.start()
+    return observer
+
+
+async def watch_folder(
+    settings: Settings,
+    my_party: str,
+    upstream_header_path: Path,
+    downstream_header_path: Path,
+    force_direction: Optional[DirectionLiteral] = None,
+    settle_seconds: float = 5.0,
+    poll_interval: float = 10.0,
+    aggregate_every: Optional[float] = 60.0,
+    aggregate_after: Optional[int] = None,
+    stop: Optional[asyncio.Event] = None,
+) -> None:
+    """
+    Process contracts as they appear in ``settings.pipeline.input_dir``.
+
+    Files are picked up once stable, processed in batches, and remembered in
+    ``{intermediate_dir}/_watch_state.json`` so restarts skip finished work; a file
+    is processed again when its size or mtime changes. Final tables are written
+    every ``aggregate_every`` seconds (by default a minute) or after
+    ``aggregate_after`` new results, whichever comes first; None disables either
+    trigger (history is left to the ``aggregate`` command).
+    """
+    input_dir = settings.pipeline.input_dir
+    state = WatchState.load(settings.pipeline.intermediate_dir / WATCH_STATE_NAME)
+    tracker = StabilityTracker(settle_seconds)
+    headers = load_headers(upstream_header_path, downstream_header_path)
+    wake = asyncio.Event()
+    observer = _start_file_events(input_dir, wake)
+    mode = "filesystem events" if observer else f"polling every {poll_interval}s"
+    print(f"Watching {input_dir} ({mode})")
+
+    unaggregated = 0
+    last_aggregate = time.time()
+
+    def _key(path: Path) -> str:
+        return path.relative_to(input_dir).as_posix()
+
+    try:
+        while stop is None or not stop.is_set():
+            candidates = [
+                p
+                for p in scan_documents(input_dir)
+                if not p.name.startswith(_IGNORED_PREFIXES)
+                and not state.is_current(_key(p), _signature(p) or (0, 0.0))
+            ]
+            ready = tracker.ready(candidates)
+            if ready:
+                unaggregated += await _process_ready(
+                    settings,
+                    my_party,
+                    upstream_header_path,
+                    downstream_header_path,
+                    force_direction,
+                    ready,
+                    state,
+                    _key,
+                )
+                for path, _ in ready:
+                    tracker.forget(path)
+
+            due = aggregate_every is not None and time.time() - last_aggregate >= aggregate_every
+            full = aggregate_after is not None and unaggregated >= aggregate_after
+            if unaggregated and (due or full):
+                stamp = f"{datetime.now():%Y%m%d_%H%M%S}"
+                for direction in ("upstream", "downstream"):
+                    outputs = await asyncio.to_thread(
+                        aggregate_to_outputs,
+                        settings,
+                        headers,
+                        direction,
+                        f"{direction}_{stamp}",
+                        append_to_history=False,
+                    )
+                    print(f"Wrote outputs: {outputs}")
+                unaggregated = 0
+                last_aggregate = time.time()
+
+            # Re-check sooner while files are settling.
+            timeout = min(poll_interval, settle_seconds) if candidates else poll_interval
+            try:
+                await asyncio.wait_for(wake.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+            wake.clear()
+    finally:
+        if observer is not None:
+            observer.stop()
+            observer.join()
+
+
+async def _process_ready(
+    settings: Settings,
+    my_party: str,
+    upstream_header_path: Path,
+    downstream_header_path: Path,
+    force_direction: Optional[DirectionLiteral],
+    ready: List[Tuple[Path, Tuple[int, float]]],
+    state: WatchState,
+    key: Callable[[Path], str],
+) -> int:
+    """Run the pipeline on a batch; on failure retry file by file so one bad file cannot block the rest."""
+
+    async def _run(paths: List[Path]) -> int:
+        results = await process_contracts(
+            settings,
+            my_party,
+            upstream_header_path,
+            downstream_header_path,
+            force_direction=force_direction,
+            paths=paths,
+        )
+        return len(results)
+
+    signatures = dict(ready)
+    try:
+        done = await _run(list(signatures))
+        for path, signature in ready:
+            state.record(key(path), signature)
+    except Exception as exc:
+        print(f"Batch of {len(ready)} failed ({exc}); retrying one by one")
+        done = 0
+        for path, signature in ready:
+            try:
+                done += await _run([path])
+                state.record(key(path), signature)
+            except Exception as file_exc:
+                # Remembered with its signature: retried only once the file changes.
+                state.record(key(path), signature, error=str(file_exc))
+                print(f"  failed: {path.name}: {file_exc}")
+    state.save()
+    print(f"Processed {done} new contracts")
+    return done
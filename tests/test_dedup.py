@@ -0,0 +1,60 @@
+import random
+
+from ip_summary import dedup
+from ip_summary.dedup import find_duplicates
+
+
+def _template(rng, length=400):
+    return "".join(chr(0x4E00 + rng.randrange(3000)) for _ in range(length))
+
+
+def _variant(rng, template, edits=3):
+    chars = list(template)
+    for _ in range(edits):
+        chars[rng.randrange(len(chars))] = chr(0x4E00 + rng.randrange(3000))
+    return "".join(chars)
+
+
+def test_exact_duplicates_ignore_whitespace():
+    report = find_duplicates(["甲方 乙方\n合同", "甲方乙方合同", "完全不同的内容"], threshold=None)
+    assert report.exact_duplicate_of == {1: 0}
+    assert report.cluster_ids[0] == report.cluster_ids[1]
+    assert 2 not in report.cluster_ids
+
+
+def test_templates_form_separate_clusters():
+    rng = random.Random(7)
+    first, second = _template(rng), _template(rng)
+    texts = [_variant(rng, first) for _ in range(5)] + [_variant(rng, second) for _ in range(5)]
+    texts.append(_template(rng))
+    report = find_duplicates(texts)
+
+    assert len({report.cluster_ids[i] for i in range(5)}) == 1
+    assert len({report.cluster_ids[i] for i in range(5, 10)}) == 1
+    assert report.cluster_ids[0] != report.cluster_ids[5]
+    assert 10 not in report.cluster_ids
+    # Cluster names do not depend on the order of the batch.
+    again = find_duplicates(list(reversed(texts)))
+    assert again.cluster_ids[10] == report.cluster_ids[0]
+
+
+def test_large_cluster_needs_linear_comparisons(monkeypatch):
+    calls = 0
+    original = dedup.estimate_jaccard
+
+    def _counting(sig_a, sig_b):
+        nonlocal calls
+        calls += 1
+        return original(sig_a, sig_b)
+
+    monkeypatch.setattr(dedup, "estimate_jaccard", _counting)
+    rng = random.Random(11)
+    template = _template(rng)
+    n = 600
+    report = find_duplicates([_variant(rng, template) for _ in range(n)], bands=16)
+
+    assert len(set(report.cluster_ids.values())) == 1
+    assert len(report.cluster_ids) == n
+    # All pairs would be ~180k comparisons; one representative per bucket keeps it
+    # below one comparison per contract and band.
+    assert calls < n * 16
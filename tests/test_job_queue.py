@@ -0,0 +1,156 @@
+import threading
+
+import pytest
+
+from ip_summary import job_queue as job_queue_module
+from ip_summary.job_queue import JobActive, JobQueue
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 1_000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float) -> None:
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(job_queue_module.time, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def queue(tmp_path, clock):
+    return JobQueue(tmp_path / "jobs.sqlite3", max_attempts=2)
+
+
+def _enqueue(queue, clock, task_id, kind="run"):
+    job = queue.enqueue(task_id, kind)
+    clock.advance(1)
+    return job
+
+
+def test_claims_oldest_job_first(queue, clock):
+    first = _enqueue(queue, clock, "a")
+    second = _enqueue(queue, clock, "b")
+
+    claimed = queue.claim("w1", lease_seconds=30)
+    assert claimed.id == first.id
+    assert claimed.status == "running"
+    assert claimed.worker_id == "w1"
+    assert claimed.attempts == 1
+    assert queue.claim("w2", lease_seconds=30).id == second.id
+    assert queue.claim("w3", lease_seconds=30) is None
+
+
+def test_enqueue_rejects_task_with_active_job(queue, clock):
+    job = _enqueue(queue, clock, "a")
+    with pytest.raises(JobActive) as excinfo:
+        queue.enqueue("a", "reprocess")
+    assert excinfo.value.job.id == job.id
+
+    queue.claim("w1", lease_seconds=30)
+    with pytest.raises(JobActive):
+        queue.enqueue("a", "run")
+
+    assert queue.complete(job.id, "w1")
+    assert queue.enqueue("a", "run").status == "queued"
+    assert len(queue.list_jobs("a")) == 2
+
+
+def test_expired_lease_is_taken_over(queue, clock):
+    job = _enqueue(queue, clock, "a")
+    queue.claim("w1", lease_seconds=30)
+    assert queue.claim("w2", lease_seconds=30) is None
+
+    clock.advance(31)
+    taken = queue.claim("w2", lease_seconds=30)
+    assert taken.id == job.id
+    assert taken.worker_id == "w2"
+    assert taken.attempts == 2
+    # The first worker lost the job: it can neither extend nor finish it.
+    assert not queue.heartbeat(job.id, "w1", lease_seconds=30)
+    assert not queue.complete(job.id, "w1")
+    assert queue.complete(job.id, "w2")
+    assert queue.get(job.id).status == "done"
+
+
+def test_heartbeat_keeps_the_lease(queue, clock):
+    job = _enqueue(queue, clock, "a")
+    queue.claim("w1", lease_seconds=30)
+    for _ in range(5):
+        clock.advance(20)
+        assert queue.heartbeat(job.id, "w1", lease_seconds=30)
+        assert queue.claim("w2", lease_seconds=30) is None
+
+
+def test_job_out_of_attempts_fails_and_next_is_claimed(queue, clock):
+    dead = _enqueue(queue, clock, "a")
+    for worker in ("w1", "w2"):
+        assert queue.claim(worker, lease_seconds=10).id == dead.id
+        clock.advance(11)
+    waiting = _enqueue(queue, clock, "b")
+
+    claimed = queue.claim("w3", lease_seconds=10)
+    assert claimed.id == waiting.id
+    failed = queue.get(dead.id)
+    assert failed.status == "failed"
+    assert "lease expired" in failed.error
+
+
+def test_release_returns_job_without_using_an_attempt(queue, clock):
+    job = _enqueue(queue, clock, "a")
+    queue.claim("w1", lease_seconds=30)
+    assert queue.release(job.id, "w1")
+
+    released = queue.get(job.id)
+    assert released.status == "queued"
+    assert released.worker_id is None
+    assert released.attempts == 0
+    assert queue.claim("w2", lease_seconds=30).attempts == 1
+
+
+def test_control_cancels_queued_and_flags_running(queue, clock):
+    running = _enqueue(queue, clock, "a")
+    queue.claim("w1", lease_seconds=30)
+    queued = _enqueue(queue, clock, "b")
+
+    queue.request_control("a", "pause")
+    assert queue.requested_control(running.id) == "pause"
+    queue.request_control("b", "cancel")
+    assert queue.get(queued.id).status == "cancelled"
+    assert queue.claim("w2", lease_seconds=30) is None
+    with pytest.raises(ValueError):
+        queue.request_control("a", "explode")
+
+
+def test_concurrent_workers_claim_each_job_once(tmp_path):
+    db_path = tmp_path / "jobs.sqlite3"
+    queue = JobQueue(db_path)
+    job_ids = {queue.enqueue(f"task-{i}", "run").id for i in range(40)}
+    claimed = []
+    lock = threading.Lock()
+
+    def _work(worker_id):
+        own_queue = JobQueue(db_path)
+        while True:
+            job = own_queue.claim(worker_id, lease_seconds=60)
+            if job is None:
+                return
+            with lock:
+                claimed.append(job.id)
+            own_queue.complete(job.id, worker_id)
+
+    workers = [threading.Thread(target=_work, args=(f"w{i}",)) for i in range(6)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    assert sorted(claimed) == sorted(job_ids)
+    assert {job.status for job in queue.list_jobs()} == {"done"}
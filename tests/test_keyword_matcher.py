@@ -0,0 +1,56 @@
+import random
+
+from ip_summary.keyword_matcher import KeywordHit, KeywordMatcher
+
+
+def _naive_hits(keywords, text):
+    hits = set()
+    for keyword in set(k for k in keywords if k):
+        start = text.find(keyword)
+        while start != -1:
+            hits.add((keyword, start))
+            start = text.find(keyword, start + 1)
+    return hits
+
+
+def test_matches_naive_search_on_random_inputs():
+    rng = random.Random(20240601)
+    alphabet = "授权许可合同ab"
+    for _ in range(300):
+        keywords = [
+            "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 4)))
+            for _ in range(rng.randint(0, 12))
+        ]
+        text = "".join(rng.choice(alphabet + "，。x") for _ in range(rng.randint(0, 80)))
+        matcher = KeywordMatcher(keywords)
+
+        hits = matcher.find_all(text)
+        assert {(h.keyword, h.start) for h in hits} == _naive_hits(keywords, text)
+        assert len(hits) == len(set(hits))
+        assert [h.end for h in hits] == sorted(h.end for h in hits)
+        assert matcher.first_positions(text) == {
+            k: text.find(k) for k in set(keywords) if k and k in text
+        }
+
+
+def test_overlapping_and_nested_keywords():
+    matcher = KeywordMatcher(["授权", "独家授权", "授权书", "权"])
+    hits = matcher.find_all("独家授权书")
+    assert set(hits) == {
+        KeywordHit("独家授权", 0),
+        KeywordHit("授权", 2),
+        KeywordHit("权", 3),
+        KeywordHit("授权书", 2),
+    }
+
+
+def test_empty_and_duplicate_keywords_are_ignored():
+    matcher = KeywordMatcher(["", "合同", "合同"])
+    assert matcher.keywords == ["合同"]
+    assert matcher.find_all("合同合同") == [KeywordHit("合同", 0), KeywordHit("合同", 2)]
+    assert KeywordMatcher([]).find_all("合同") == []
+
+
+def test_regex_metacharacters_are_literal():
+    matcher = KeywordMatcher(["a.b", "(c)", "d*"])
+    assert matcher.first_positions("axb a.b (c) dd*") == {"a.b": 4, "(c)": 8, "d*": 13}
@@ -0,0 +1,144 @@
+import asyncio
+
+from ip_summary.config import LLMSettings
+from ip_summary.llm_client import LLMClient, single_flight_stats
+
+
+class FakeClient(LLMClient):
+    """LLMClient whose API call waits for ``release`` instead of the network."""
+
+    def __init__(self, api_key="key-a"):
+        super().__init__(LLMSettings(api_key=api_key))
+        self.calls = 0
+        self.cancelled = 0
+        self.release = asyncio.Event()
+        self.error = None
+
+    async def _complete(self, params):
+        self.calls += 1
+        try:
+            await self.release.wait()
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if self.error is not None:
+            raise self.error
+        return "answer:" + params["messages"][-1]["content"]
+
+
+def _messages(text="合同"):
+    return [{"role": "user", "content": text}]
+
+
+async def _settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_identical_requests_share_one_call():
+    async def _main():
+        client = FakeClient()
+        before = single_flight_stats()
+        waiters = [asyncio.create_task(client.chat(_messages())) for _ in range(5)]
+        await _settle()
+        client.release.set()
+        assert await asyncio.gather(*waiters) == ["answer:合同"] * 5
+        assert client.calls == 1
+        after = single_flight_stats()
+        assert after["coalesced"] - before["coalesced"] == 4
+        assert after["in_flight"] == 0
+
+    asyncio.run(_main())
+
+
+def test_different_requests_or_keys_are_not_shared():
+    async def _main():
+        client, other_key = FakeClient(), FakeClient(api_key="key-b")
+        waiters = [
+            asyncio.create_task(client.chat(_messages("甲"))),
+            asyncio.create_task(client.chat(_messages("乙"))),
+            asyncio.create_task(client.chat(_messages("甲"), temperature=0.7)),
+            asyncio.create_task(other_key.chat(_messages("甲"))),
+        ]
+        await _settle()
+        client.release.set()
+        other_key.release.set()
+        await asyncio.gather(*waiters)
+        assert client.calls == 3
+        assert other_key.calls == 1
+
+    asyncio.run(_main())
+
+
+def test_one_cancelled_waiter_does_not_cancel_the_shared_call():
+    async def _main():
+        client = FakeClient()
+        leaving = asyncio.create_task(client.chat(_messages()))
+        staying = asyncio.create_task(client.chat(_messages()))
+        await _settle()
+        leaving.cancel()
+        await _settle()
+        client.release.set()
+        assert await staying == "answer:合同"
+        assert leaving.cancelled()
+        assert client.calls == 1
+        assert client.cancelled == 0
+
+    asyncio.run(_main())
+
+
+def test_call_is_cancelled_when_every_waiter_leaves():
+    async def _main():
+        client = FakeClient()
+        waiters = [asyncio.create_task(client.chat(_messages())) for _ in range(3)]
+        await _settle()
+        for waiter in waiters:
+            waiter.cancel()
+        await _settle()
+        assert client.cancelled == 1
+        assert single_flight_stats()["in_flight"] == 0
+
+        # A later identical request starts a fresh call instead of joining the dead one.
+        client.release.set()
+        assert await client.chat(_messages()) == "answer:合同"
+        assert client.calls == 2
+
+    asyncio.run(_main())
+
+
+def test_errors_reach_every_waiter_and_are_not_cached():
+    async def _main():
+        client = FakeClient()
+        client.error = RuntimeError("rate limited")
+        waiters = [asyncio.create_task(client.chat(_messages())) for _ in range(2)]
+        await _settle()
+        client.release.set()
+        results = await asyncio.gather(*waiters, return_exceptions=True)
+        assert all(isinstance(r, RuntimeError) for r in results)
+
+        client.error = None
+        assert await client.chat(_messages()) == "answer:合同"
+        assert client.calls == 2
+
+    asyncio.run(_main())
+
+
+def test_coalesced_callers_do_not_take_a_gate_slot():
+    async def _main():
+        client = FakeClient()
+        gate = asyncio.Semaphore(1)
+        first = asyncio.create_task(client.chat(_messages(), gate=gate))
+        await _settle()
+        assert gate.locked()
+        joined = asyncio.create_task(client.chat(_messages(), gate=gate))
+        other = asyncio.create_task(client.chat(_messages("乙"), gate=gate))
+        await _settle()
+        # The identical request joined the running call; the other one waits for the slot.
+        assert client.calls == 1
+        client.release.set()
+        assert await asyncio.gather(first, joined, other) == ["answer:合同", "answer:合同", "answer:乙"]
+        assert client.calls == 2
+        assert not gate.locked()
+
+    asyncio.run(_main())
+
@@ -0,0 +1,153 @@
+import json
+import os
+import shutil
+
+import pytest
+
+from ip_summary.results_index import ResultsIndex, search_indexes
+
+
+def _payload(name, direction="upstream", confidence=0.9, fields=None, **extra):
+    return {
+        "contract_path": f"/contracts/{name}.md",
+        "direction": direction,
+        "fields": {"合同标题": name, "对方名称": "某公司"} if fields is None else fields,
+        "classification": {"direction": direction, "confidence": confidence, "reason": "", "raw_response": ""},
+        **extra,
+    }
+
+
+def _write(folder, filename, payload, mtime=None):
+    folder.mkdir(parents=True, exist_ok=True)
+    path = folder / filename
+    path.write_text(json.dumps(payload, ensure_ascii=False), encoding="utf-8")
+    if mtime is not None:
+        os.utime(path, ns=(mtime, mtime))
+    return path
+
+
+@pytest.fixture
+def inter(tmp_path):
+    return tmp_path / "intermediate"
+
+
+def _names(items):
+    return [item["filename"] for item in items]
+
+
+def test_refresh_tracks_added_changed_and_removed_files(inter):
+    up = inter / "upstream"
+    for i in range(3):
+        _write(up, f"c{i}.json", _payload(f"c{i}"))
+    index = ResultsIndex(inter)
+    assert index.refresh("upstream") == 3
+    assert index.refresh("upstream") == 0
+    generation = index.generation()
+
+    _write(up, "c1.json", _payload("c1", fields={"合同标题": "改过的标题"}), mtime=1_700_000_000_000_000_000)
+    (up / "c2.json").unlink()
+    _write(up, "c3.json", _payload("c3"))
+    assert index.refresh("upstream") == 3
+    assert index.generation() > generation
+
+    items = index.items("upstream")
+    assert _names(items) == ["c0.json", "c1.json", "c3.json"]
+    assert items[1]["fields"]["合同标题"] == "改过的标题"
+
+
+def test_pages_follow_the_cursor_without_gaps_or_repeats(inter):
+    up = inter / "upstream"
+    names = [f"r{i:02d}.json" for i in range(23)]
+    for name in names:
+        _write(up, name, _payload(name))
+    index = ResultsIndex(inter)
+    index.refresh("upstream")
+
+    seen, cursor = [], None
+    while True:
+        page, total, cursor = index.query("upstream", cursor=cursor, limit=5)
+        assert total == 23
+        seen.extend(_names(page))
+        if cursor is None:
+            break
+    assert seen == names
+
+    # A result added behind the cursor between two pages is not returned twice.
+    first, _, cursor = index.query("upstream", limit=5)
+    _write(up, "a00.json", _payload("a00"))
+    index.refresh("upstream")
+    rest, total, _ = index.query("upstream", cursor=cursor)
+    assert total == 24
+    assert _names(first) + _names(rest) == names
+
+
+def test_filters(inter):
+    up = inter / "upstream"
+    _write(up, "low.json", _payload("low", confidence=0.4))
+    _write(up, "empty.json", _payload("empty", fields={"合同标题": "x", "对方名称": " "}))
+    _write(up, "draft.json", _payload("draft", completed=False, cluster_id="k1"))
+    # Moved by hand into the other folder: its own direction wins.
+    _write(up, "moved.json", _payload("moved", direction="downstream"))
+    index = ResultsIndex(inter)
+    index.refresh("upstream")
+
+    assert _names(index.query("upstream")[0]) == ["draft.json", "empty.json", "low.json"]
+    assert _names(index.query("upstream", max_confidence=0.5)[0]) == ["low.json"]
+    assert _names(index.query("upstream", empty_field="对方名称")[0]) == ["empty.json"]
+    assert _names(index.query("upstream", empty_field="*")[0]) == ["empty.json"]
+    assert _names(index.query("upstream", completed=False)[0]) == ["draft.json"]
+    assert _names(index.query("upstream", cluster_id="k1")[0]) == ["draft.json"]
+
+
+def test_invalid_cursor_is_rejected(inter):
+    index = ResultsIndex(inter)
+    with pytest.raises(ValueError):
+        index.query("upstream", cursor="not base64!")
+
+
+def test_upsert_uses_the_written_payload(inter):
+    up = inter / "upstream"
+    path = _write(up, "c.json", _payload("c"))
+    index = ResultsIndex(inter)
+    index.refresh("upstream")
+
+    edited = _payload("c", fields={"合同标题": "新标题", "对方名称": "某公司"})
+    _write(up, "c.json", edited)
+    index.upsert("upstream", "c.json", edited)
+    assert index.refresh("upstream") == 0
+    assert index.items("upstream")[0]["fields"]["合同标题"] == "新标题"
+
+    path.unlink()
+    index.upsert("upstream", "c.json")
+    assert index.items("upstream") == []
+
+
+def test_index_is_set_up_again_after_its_folder_is_removed(inter):
+    _write(inter / "upstream", "c.json", _payload("c"))
+    ResultsIndex(inter).ensure_populated()
+    shutil.rmtree(inter)
+
+    _write(inter / "upstream", "d.json", _payload("d"))
+    index = ResultsIndex(inter)
+    index.ensure_populated()
+    assert _names(index.query("upstream")[0]) == ["d.json"]
+
+
+def test_search_pages_across_indexes(tmp_path):
+    indexes = []
+    for task in ("t1", "t2", "t3"):
+        inter = tmp_path / task
+        for i in range(4):
+            title = f"授权合同{task}-{i}" if i % 2 == 0 else f"采购协议{task}-{i}"
+            _write(inter / "upstream", f"{task}-{i}.json", _payload(title, fields={"合同标题": title}))
+        indexes.append((task, ResultsIndex(inter)))
+
+    seen, cursor = [], None
+    while True:
+        items, total, cursor = search_indexes(indexes, cursor=cursor, limit=2, text="授权合同")
+        assert total == 6
+        seen.extend((item["source"], item["filename"]) for item in items)
+        if cursor is None:
+            break
+    assert seen == [(task, f"{task}-{i}.json") for task in ("t1", "t2", "t3") for i in (0, 2)]
+    assert search_indexes(indexes, text="授权", fields={"合同标题": "t2"})[1] == 2
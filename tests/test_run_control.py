@@ -0,0 +1,157 @@
+import asyncio
+
+import pytest
+
+from ip_summary.run_control import RunCancelled, RunControl, checkpoint, current_run_control
+
+
+def test_states():
+    async def _main():
+        control = RunControl()
+        assert control.state == "running"
+        control.pause()
+        assert control.state == "paused"
+        control.resume()
+        assert control.state == "running"
+        control.cancel()
+        assert control.state == "cancelled"
+        # Pausing a cancelled run must not block the checkpoints that end it.
+        control.pause()
+        assert control.state == "cancelled"
+
+    asyncio.run(_main())
+
+
+def test_pause_holds_checkpoint_until_resume():
+    async def _main():
+        control = RunControl()
+        control.pause()
+        passed = asyncio.Event()
+
+        async def _worker():
+            await control.checkpoint()
+            passed.set()
+
+        task = asyncio.create_task(_worker())
+        await asyncio.sleep(0.05)
+        assert not passed.is_set()
+        control.resume()
+        await asyncio.wait_for(task, 1)
+        assert passed.is_set()
+
+    asyncio.run(_main())
+
+
+def test_cancel_releases_paused_checkpoints():
+    async def _main():
+        control = RunControl()
+        control.pause()
+        task = asyncio.create_task(control.checkpoint())
+        await asyncio.sleep(0)
+        control.cancel()
+        with pytest.raises(RunCancelled):
+            await asyncio.wait_for(task, 1)
+
+    asyncio.run(_main())
+
+
+def test_gather_returns_results_and_none_for_cancelled_work():
+    async def _main():
+        control = RunControl()
+
+        async def _quick(value):
+            return value
+
+        async def _slow():
+            await asyncio.sleep(30)
+            return "never"
+
+        async def _cancel_soon():
+            await asyncio.sleep(0.05)
+            control.cancel()
+
+        asyncio.create_task(_cancel_soon())
+        results = await asyncio.wait_for(
+            control.gather([_quick(1), _slow(), _quick(2), _slow()]), 5
+        )
+        assert results == [1, None, 2, None]
+
+    asyncio.run(_main())
+
+
+def test_gather_maps_run_cancelled_to_none_and_propagates_other_errors():
+    async def _main():
+        control = RunControl()
+
+        async def _stopped():
+            raise RunCancelled()
+
+        async def _broken():
+            raise KeyError("boom")
+
+        assert await control.gather([_stopped()]) == [None]
+        with pytest.raises(KeyError):
+            await control.gather([_broken()])
+        assert await control.gather([]) == []
+
+    asyncio.run(_main())
+
+
+def test_gather_sets_current_control_for_module_checkpoint():
+    async def _main():
+        control = RunControl()
+        seen = []
+
+        async def _worker():
+            seen.append(current_run_control.get())
+            await checkpoint()
+            return "done"
+
+        assert await control.gather([_worker(), _worker()]) == ["done", "done"]
+        assert seen == [control, control]
+        assert current_run_control.get() is None
+
+        control.cancel()
+        assert await control.gather([_worker()]) == [None]
+
+    asyncio.run(_main())
+
+
+def test_cancelling_the_gather_cancels_its_tasks():
+    async def _main():
+        control = RunControl()
+        started = asyncio.Event()
+        cancelled = []
+
+        async def _worker():
+            started.set()
+            try:
+                await asyncio.sleep(30)
+            except asyncio.CancelledError:
+                cancelled.append(True)
+                raise
+
+        outer = asyncio.create_task(control.gather([_worker()]))
+        await started.wait()
+        outer.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await outer
+        await asyncio.sleep(0)
+        assert cancelled == [True]
+
+    asyncio.run(_main())
+
+
+def test_tracked_task_is_cancelled_with_the_run():
+    async def _main():
+        control = RunControl()
+        task = asyncio.create_task(asyncio.sleep(30))
+        control.track(task)
+        finished = asyncio.create_task(asyncio.sleep(0))
+        control.track(finished)
+        await finished
+        control.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(_main())
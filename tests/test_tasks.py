@@ -0,0 +1,51 @@
+import multiprocessing
+import threading
+
+import pytest
+
+from ip_summary.tasks import TaskManager
+
+
+def _create_many(root, prefix, count):
+    manager = TaskManager(root)
+    for i in range(count):
+        task = manager.create_task(f"{prefix}-{i}", "我方")
+        manager.update_status(task.id, "running", prefix)
+
+
+@pytest.mark.skipif(
+    "fork" not in multiprocessing.get_all_start_methods(), reason="needs the fork start method"
+)
+def test_processes_do_not_lose_index_updates(tmp_path):
+    context = multiprocessing.get_context("fork")
+    workers = [
+        context.Process(target=_create_many, args=(tmp_path, f"p{n}", 15)) for n in range(4)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(60)
+        assert worker.exitcode == 0
+
+    tasks = TaskManager(tmp_path).list_tasks()
+    assert len(tasks) == 60
+    assert {task.status for task in tasks} == {"running"}
+
+
+def test_threads_do_not_lose_index_updates(tmp_path):
+    threads = [
+        threading.Thread(target=_create_many, args=(tmp_path, f"t{n}", 10)) for n in range(4)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(TaskManager(tmp_path).list_tasks()) == 40
+
+
+def test_lock_file_left_by_a_dead_process_does_not_block(tmp_path):
+    manager = TaskManager(tmp_path)
+    manager.lock_path.write_text("stale")
+    task = manager.create_task("x", "我方")
+    assert manager.update_status(task.id, "completed").status == "completed"
+    assert manager.lock_path.exists()
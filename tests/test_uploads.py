@@ -0,0 +1,68 @@
+import zipfile
+
+import pytest
+
+from ip_summary.uploads import UploadRejected, extract_archive
+
+
+def _write_zip(path, entries):
+    with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_STORED) as zf:
+        for name, data in entries:
+            zf.writestr(name, data)
+
+
+def _corrupt(path, marker):
+    raw = path.read_bytes()
+    index = raw.index(marker)
+    path.write_bytes(raw[:index] + b"X" + raw[index + 1:])
+
+
+def test_extracts_supported_entries(tmp_path):
+    archive = tmp_path / "a.zip"
+    _write_zip(archive, [("合同/a.txt", "甲方"), ("notes.xyz", "x"), ("../evil.txt", "x")])
+    dest = tmp_path / "input"
+
+    extracted, skipped = extract_archive(archive, dest)
+
+    assert extracted == [(dest / "合同" / "a.txt").resolve()]
+    assert (dest / "合同" / "a.txt").read_text(encoding="utf-8") == "甲方"
+    assert sorted(skipped) == ["../evil.txt", "notes.xyz"]
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["a.zip", "input"]
+
+
+def test_encrypted_entry_is_rejected(tmp_path):
+    archive = tmp_path / "a.zip"
+    _write_zip(archive, [("secret.txt", "ciphertext")])
+    # zipfile cannot write encrypted entries: set the flag bit in both headers.
+    raw = bytearray(archive.read_bytes())
+    raw[raw.index(b"PK\x03\x04") + 6] |= 0x1
+    raw[raw.index(b"PK\x01\x02") + 8] |= 0x1
+    archive.write_bytes(bytes(raw))
+
+    with pytest.raises(UploadRejected, match="encrypted"):
+        extract_archive(archive, tmp_path / "input")
+
+
+def test_corrupt_entry_is_rejected(tmp_path):
+    archive = tmp_path / "a.zip"
+    _write_zip(archive, [("a.txt", "PAYLOAD-CONTENT")])
+    _corrupt(archive, b"PAYLOAD")
+
+    with pytest.raises(UploadRejected, match="cannot be extracted"):
+        extract_archive(archive, tmp_path / "input")
+
+
+def test_rejected_archive_keeps_existing_files(tmp_path):
+    dest = tmp_path / "input"
+    dest.mkdir()
+    (dest / "a.txt").write_text("original", encoding="utf-8")
+    archive = tmp_path / "a.zip"
+    _write_zip(archive, [("a.txt", "replacement"), ("b.txt", "PAYLOAD-CONTENT")])
+    _corrupt(archive, b"PAYLOAD")
+
+    with pytest.raises(UploadRejected):
+        extract_archive(archive, dest)
+
+    assert (dest / "a.txt").read_text(encoding="utf-8") == "original"
+    assert sorted(p.name for p in dest.iterdir()) == ["a.txt"]
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["a.zip", "input"]